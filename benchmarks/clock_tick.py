@@ -0,0 +1,85 @@
+"""
+Measures how long it takes to draw the screen when only the minute changed.
+
+Compares rasterizing the whole document with the layered compositor, and the clock alone rasterized
+by cairosvg with the clock drawn from the glyph atlas.  Needs cairo, so run it on the Pi.
+
+    python3 benchmarks/clock_tick.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.chdir(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import compositor  # noqa: E402
+import glyph_atlas  # noqa: E402
+from rasterize import rasterize, rasterize_drawn_area  # noqa: E402
+from svg_template import load_template  # noqa: E402
+
+template_svg_filename = "screen-template.6.svg"
+svg_filename = "screen-output-weather.svg"
+width, height = 800, 480
+
+
+def get_output_dict(minute):
+    output_dict = {
+        'LOW_ONE': "4°C", 'HIGH_ONE': "12°C", 'ICON_ONE': "mostly_cloudy",
+        'WEATHER_DESC_1': "Light rain", 'WEATHER_DESC_2': "showers",
+        'TIME_NOW_FONT_SIZE': "100px", 'TIME_NOW': "12:{:02d}".format(minute), 'HOUR_NOW': "12:{:02d}".format(minute),
+        'DAY_ONE': "Oct 18", 'DAY_NAME': "Sunday",
+        'ALERT_MESSAGE_VISIBILITY': "hidden", 'ALERT_MESSAGE': "",
+        'MONTH_CAL': "",
+    }
+    for i in range(1, 5):
+        output_dict['CAL_DATETIME_' + str(i)] = "Tomorrow 09:00 - 10:00"
+        output_dict['CAL_DESC_' + str(i)] = "Event number {}".format(i)
+    return output_dict
+
+
+def main():
+    number = 20
+    template = compositor.load_layered_template(template_svg_filename)
+    outputs = [get_output_dict(minute) for minute in range(60)]
+    documents = [load_template(template_svg_filename).render(output_dict) for output_dict in outputs]
+
+    # The clock's layer, with and without the time filled in
+    clock_layer = next(layer for layer in template.layers if "TIME_NOW" in layer.names)
+    values = {key: value for key, value in outputs[0].items() if key != "TIME_NOW"}
+    clock_text = glyph_atlas.get_clock_text(template.get_document(values, clock_layer.render(values)),
+                                            "TIME_NOW", svg_filename, width, height)
+    clock_documents = [template.get_document(output_dict, clock_layer.render(output_dict)) for output_dict in outputs]
+
+    ticks = iter(range(10 ** 6))
+
+    def whole():
+        rasterize(documents[next(ticks) % 60], svg_filename, width, height)
+
+    def layered():
+        compositor.render(template, svg_filename, width, height, outputs[next(ticks) % 60])
+
+    def cairosvg_clock():
+        rasterize_drawn_area(clock_documents[next(ticks) % 60], svg_filename, width, height)
+
+    def atlas_clock():
+        clock_text.get_overlays(outputs[next(ticks) % 60]["TIME_NOW"])
+
+    # Warm up the static layer, the overlays and the atlas
+    for output_dict in outputs:
+        compositor.render(template, svg_filename, width, height, output_dict)
+
+    def report(name, function, runs):
+        print("{:<24} {:8.2f} ms per tick".format(name + ":", timeit.timeit(function, number=runs) / runs * 1e3))
+
+    report("whole document", whole, number)
+    report("layered", layered, number)
+    report("clock with cairosvg", cairosvg_clock, number)
+    if clock_text is None:
+        print("The clock of {} can't be drawn from the atlas".format(template_svg_filename))
+    else:
+        report("clock from the atlas", atlas_clock, number * 50)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Compares framebuffer.pack_image with the Waveshare drivers' getbuffer().
+
+Uses the real driver when it can be imported, otherwise copies of the two getbuffer()
+implementations the drivers have shipped: a loop over every pixel, and a loop over every byte.
+
+    python3 benchmarks/framebuffer_pack.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from PIL import Image, ImageDraw  # noqa: E402
+
+import framebuffer  # noqa: E402
+
+width, height = 800, 480
+
+
+def pixel_loop_getbuffer(image):
+    """getbuffer() of the older epd7in5_V2 drivers"""
+    buf = [0xFF] * (int(width / 8) * height)
+    image_monocolor = image.convert('1')
+    pixels = image_monocolor.load()
+    for y in range(height):
+        for x in range(width):
+            if pixels[x, y] == 0:
+                buf[int((x + y * width) / 8)] &= ~(0x80 >> (x % 8))
+    # the older drivers inverted on the way to the screen instead
+    return bytes(value ^ 0xFF for value in buf)
+
+
+def byte_loop_getbuffer(image):
+    """getbuffer() of the current epd7in5_V2 driver"""
+    buf = bytearray(image.convert('1').tobytes('raw'))
+    for i in range(len(buf)):
+        buf[i] ^= 0xFF
+    return buf
+
+
+def get_driver_getbuffer():
+    try:
+        import display
+        return display.get_epd().getbuffer
+    except Exception:
+        return None
+
+
+def get_image():
+    """Something like a screen: text sized blocks and some greys to dither"""
+    image = Image.new('RGB', (width, height), 'white')
+    draw = ImageDraw.Draw(image)
+    for i in range(40):
+        draw.rectangle((i * 19 % 700, i * 11 % 440, i * 19 % 700 + 90, i * 11 % 440 + 24), fill='black')
+    draw.ellipse((500, 200, 700, 400), fill='grey')
+    return image
+
+
+def main():
+    image = get_image()
+    number = 5
+
+    implementations = [("pixel loop getbuffer", pixel_loop_getbuffer), ("byte loop getbuffer", byte_loop_getbuffer)]
+    driver_getbuffer = get_driver_getbuffer()
+    if driver_getbuffer:
+        implementations.append(("driver getbuffer", driver_getbuffer))
+
+    packed = framebuffer.pack_image(image, width, height, True)
+    for name, getbuffer in implementations:
+        if bytes(getbuffer(image)) != packed:
+            print("{} packs a different buffer".format(name))
+
+    for name, getbuffer in implementations:
+        seconds = timeit.timeit(lambda: getbuffer(image), number=number)
+        print("{:<22} {:8.2f} ms per frame".format(name + ":", seconds / number * 1e3))
+
+    seconds = timeit.timeit(lambda: framebuffer.pack_image(image, width, height, True), number=number * 20)
+    print("{:<22} {:8.2f} ms per frame".format("pack_image:", seconds / number / 20 * 1e3))
+
+    seconds = timeit.timeit(lambda: byte_loop_getbuffer(Image.new('1', (width, height), 255)), number=number)
+    print("{:<22} {:8.2f} ms per frame, now cached".format("blank 2B plane:", seconds / number * 1e3))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Compares reading a Met Eireann forecast by building the whole tree and scanning it with XPath for
+each hour, as MetEireann.get_weather used to, with indexing it in a single streaming pass.
+
+Reports the time and the peak memory of each.  Give it a recorded response, or it makes up a
+10 day forecast shaped like the real one.
+
+    curl -o forecast.xml "http://openaccess.pf.api.met.ie/metno-wdb2ts/locationforecast?lat=53.3;long=-6.2"
+    python3 benchmarks/meteireann_parse.py forecast.xml
+"""
+import datetime
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from weather_providers.meteireann import MetEireann  # noqa: E402
+
+provider = MetEireann("53.3", "-6.2", "metric")
+
+POINT = """<time datatype="forecast" from="{0}" to="{0}"><location altitude="9" latitude="53.3" longitude="-6.2">
+<temperature id="TTT" unit="celsius" value="{1:.1f}"/><windDirection id="dd" deg="235.4" name="SW"/>
+<windSpeed id="ff" mps="5.2" beaufort="3" name="Lett bris"/><globalRadiation value="0.0" unit="W/m^2"/>
+<humidity value="87.3" unit="percent"/><pressure id="pr" unit="hPa" value="1012.4"/>
+<cloudiness id="NN" percent="92.1"/><lowClouds id="LOW" percent="85.0"/><mediumClouds id="MEDIUM" percent="20.3"/>
+<highClouds id="HIGH" percent="0.0"/><dewpointTemperature id="TD" unit="celsius" value="7.9"/></location></time>
+"""
+INTERVAL = """<time datatype="forecast" from="{0}" to="{1}"><location altitude="9" latitude="53.3" longitude="-6.2">
+<precipitation unit="mm" value="0.1" minvalue="0.0" maxvalue="0.3" probability="40"/>
+<symbol id="Cloud" number="{2}"/></location></time>
+"""
+
+
+def hour(start, offset):
+    return (start + datetime.timedelta(hours=offset)).strftime("%Y-%m-%dT%H:00:00Z")
+
+
+def make_forecast(days=10):
+    """Hourly for the first 90 hours, then every 3 hours to day 6 and every 6 hours after, like the real forecast"""
+    start = datetime.datetime.utcnow() - datetime.timedelta(hours=2)
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>\n<weatherdata created="{}"><meta/><product class="pointData">\n'
+             .format(hour(start, 0))]
+    offset = 0
+    while offset < days * 24:
+        step = 1 if offset < 90 else 3 if offset < 144 else 6
+        parts.append(POINT.format(hour(start, offset + step), 8 + (offset % 24) / 3.))
+        parts.append(INTERVAL.format(hour(start, offset), hour(start, offset + step), 3 + offset % 2))
+        offset += step
+    parts.append("</product></weatherdata>\n")
+    return "".join(parts)
+
+
+def scan_with_xpath(text):
+    """The temperatures and symbol MetEireann.get_weather used to look up, from the whole tree"""
+    root = ET.fromstring(text)
+    temps = []
+    for h in range(0, 23):
+        for t in root.findall("./product/time[@from='%s']/location/temperature" % (provider.hour_offset_from_now(h))):
+            temps.append(float(t.get("value")))
+    for sym in root.findall("./product/time[@from='%s']/location/symbol" % (provider.hour_offset_from_now(1))):
+        weather_code = int(sym.get("number"))
+    return min(temps), max(temps), weather_code
+
+
+def scan_index(text):
+    forecast = json.loads(provider.index_forecast(text))
+    temps = [forecast["temperature"][provider.hour_offset_from_now(h)] for h in range(0, 23)
+             if provider.hour_offset_from_now(h) in forecast["temperature"]]
+    return min(temps), max(temps), forecast["symbol"][provider.hour_offset_from_now(1)]
+
+
+def get_peak_memory(function, text):
+    tracemalloc.start()
+    function(text)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], encoding="utf-8") as forecast_file:
+            text = forecast_file.read()
+    else:
+        text = make_forecast()
+    print("Forecast of {} KB, {} times".format(len(text) // 1024, text.count("<time ")))
+
+    if scan_with_xpath(text) != scan_index(text):
+        print("The two disagree: {} and {}".format(scan_with_xpath(text), scan_index(text)))
+
+    number = 100
+    for name, function in (("tree and XPath", scan_with_xpath), ("streaming index", scan_index)):
+        seconds = timeit.timeit(lambda: function(text), number=number) / number
+        print("{:<16} {:8.2f} ms {:8d} KB peak".format(name + ":", seconds * 1e3, get_peak_memory(function, text) // 1024))
+
+    print("Index cached instead of the response: {} KB".format(len(provider.index_forecast(text)) // 1024))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Compares the compiled template engine with the previous update_svg, which
+replaced one key at a time over the whole template.
+
+    python3 benchmarks/template_engine.py
+"""
+import codecs
+import os
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from svg_template import CompiledTemplate, load_template  # noqa: E402
+
+template_svg_filename = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "screen-template.6.svg")
+
+
+def legacy_update_svg(template_svg_filename, output_svg_filename, output_dict):
+    output = codecs.open(template_svg_filename, 'r', encoding='utf-8').read()
+    for output_key in output_dict:
+        output = output.replace(output_key, output_dict[output_key])
+    codecs.open(output_svg_filename, 'w', encoding='utf-8').write(output)
+
+
+def compiled_update_svg(template_svg_filename, output_svg_filename, output_dict):
+    output = load_template(template_svg_filename).render(output_dict)
+    with codecs.open(output_svg_filename, 'w', encoding='utf-8') as output_file:
+        output_file.write(output)
+
+
+def get_output_dict():
+    """Every key the weather, calendar, month and todo stages produce"""
+    output_dict = {
+        'LOW_ONE': "4°C", 'HIGH_ONE': "12°C", 'ICON_ONE': "mostly_cloudy",
+        'WEATHER_DESC_1': "Light rain", 'WEATHER_DESC_2': "showers",
+        'TIME_NOW_FONT_SIZE': "100px", 'TIME_NOW': "12:34", 'HOUR_NOW': "12:34",
+        'DAY_ONE': "Oct 18", 'DAY_NAME': "Sunday",
+        'ALERT_MESSAGE_VISIBILITY': "visible", 'ALERT_MESSAGE': "Yellow warning of wind",
+    }
+    for i in range(1, 11):
+        output_dict['CAL_DATETIME_' + str(i)] = "Tomorrow 09:00 - 10:00 @ Office"
+        output_dict['CAL_DATETIME_START_' + str(i)] = "Tomorrow 09:00 @ Office"
+        output_dict['CAL_DESC_' + str(i)] = "Event number {}".format(i)
+        output_dict['TODO_DATETIME_' + str(i)] = "Oct 20"
+        output_dict['TODO_DESC_' + str(i)] = "Todo number {}".format(i)
+    output_dict['MONTH_CAL'] = "".join(
+        '<text x="{}" y="{}" font-size="26">{}</text>'.format(i % 7 * 40, i // 7 * 30, i) for i in range(1, 32))
+    return output_dict
+
+
+def main():
+    output_dict = get_output_dict()
+    number = 2000
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        output_svg_filename = os.path.join(output_dir, "screen-output-weather.svg")
+
+        legacy = timeit.timeit(lambda: legacy_update_svg(template_svg_filename, output_svg_filename, output_dict), number=number)
+        compiled = timeit.timeit(lambda: compiled_update_svg(template_svg_filename, output_svg_filename, output_dict), number=number)
+
+    with codecs.open(template_svg_filename, 'r', encoding='utf-8') as template_file:
+        text = template_file.read()
+    compile_time = timeit.timeit(lambda: CompiledTemplate(text), number=number)
+    template = load_template(template_svg_filename)
+    render_time = timeit.timeit(lambda: template.render(output_dict), number=number)
+
+    print("{} keys, {} bytes of template, {} runs".format(len(output_dict), len(text), number))
+    print("legacy update_svg:   {:8.1f} µs per call".format(legacy / number * 1e6))
+    print("compiled update_svg: {:8.1f} µs per call".format(compiled / number * 1e6))
+    print("  compile once:      {:8.1f} µs".format(compile_time / number * 1e6))
+    print("  render only:       {:8.1f} µs per call".format(render_time / number * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Compares looking up the current weather in a met.no, SMHI or Met Office DataHub forecast by scanning
+every item, as the providers used to, with bisecting the `TimeSeries` they now cache.
+
+Reports the time of a lookup, and of converting the response to a `TimeSeries` once.  Give it the
+provider and a recorded response, or it makes up a 10 day forecast shaped like the real ones.
+
+    curl -A "you@example.com" -o metno.json "https://api.met.no/weatherapi/locationforecast/2.0/complete?lat=51.5&lon=0"
+    python3 benchmarks/time_series.py metno metno.json
+"""
+import datetime
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from weather_providers.base_provider import TimeSeries, get_current_hour  # noqa: E402
+from weather_providers.metno import MetNo  # noqa: E402
+from weather_providers.smhi import SMHI  # noqa: E402
+from weather_providers.metofficedatahub import MetOffice  # noqa: E402
+
+
+def get_times(step_hours, days=10):
+    """Hourly for the first 2 days, then every `step_hours` hours, as ISO 8601"""
+    start = datetime.datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    offset = 0
+    while offset < days * 24:
+        yield (start + datetime.timedelta(hours=offset)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        offset += 1 if offset < 48 else step_hours
+
+
+def make_metno():
+    details = {"air_pressure_at_sea_level": 1012.4, "air_temperature": 9.1, "cloud_area_fraction": 92.1,
+               "relative_humidity": 87.3, "wind_from_direction": 235.4, "wind_speed": 5.2}
+    summary = {"summary": {"symbol_code": "cloudy"}, "details": {"precipitation_amount": 0.1}}
+    next_6_hours = dict(summary, details={"air_temperature_min": 7.2, "air_temperature_max": 12.8,
+                                          "precipitation_amount": 0.4})
+    return {"properties": {"timeseries": [
+        {"time": time, "data": {"instant": {"details": details}, "next_1_hours": summary,
+                                "next_6_hours": next_6_hours, "next_12_hours": summary}}
+        for time in get_times(6)]}}
+
+
+def make_smhi():
+    names = ("msl", "t", "vis", "wd", "ws", "r", "tstm", "tcc_mean", "gust", "pmean", "Wsymb2")
+    return {"timeSeries": [
+        {"validTime": time, "parameters": [{"name": name, "levelType": "hl", "level": 2, "unit": "",
+                                            "values": [(index + offset) % 27 + 1]}
+                                           for offset, name in enumerate(names)]}
+        for index, time in enumerate(get_times(6))]}
+
+
+def make_metoffice():
+    start = datetime.datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    days = [(start + datetime.timedelta(days=day)).strftime("%Y-%m-%dT%H:%MZ") for day in range(-1, 7)]
+    day = {"midday10MWindSpeed": 5.2, "middayVisibility": 21000, "dayMaxScreenTemperature": 12.8,
+           "nightMinScreenTemperature": 7.2, "daySignificantWeatherCode": 7, "nightSignificantWeatherCode": 2,
+           "dayProbabilityOfRain": 40, "nightProbabilityOfRain": 20, "maxUvIndex": 2}
+    return {"features": [{"properties": {"timeSeries": [dict(day, time=time) for time in days]}}]}
+
+
+def scan_metno(response_data):
+    # The first item used to be taken as the current hour, which it no longer is once the forecast is cached
+    now = datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:00:00Z")
+    for item in response_data["properties"]["timeseries"]:
+        if item["time"] >= now and "next_6_hours" in item["data"]:
+            return item["data"]["next_6_hours"]["summary"]["symbol_code"]
+
+
+def lookup_metno(time_series):
+    return time_series.get_values_at_or_after(get_current_hour())["symbol_code"]
+
+
+def scan_smhi(response_data):
+    temperatures = []
+    for item in response_data["timeSeries"][:12]:
+        for param in item["parameters"]:
+            if param["name"] == "t":
+                temperatures.append(param["values"][0])
+    return min(temperatures), max(temperatures)
+
+
+def lookup_smhi(time_series):
+    hour = get_current_hour()
+    return time_series.get_min_max("t", hour, hour + 12 * 60 * 60)
+
+
+def scan_metoffice(response_data):
+    today = datetime.datetime.utcnow().strftime("%Y-%m-%dT00:00Z")
+    for day_forecast in response_data["features"][0]["properties"]["timeSeries"]:
+        if day_forecast["time"] == today:
+            weather_data = day_forecast
+    return weather_data["dayMaxScreenTemperature"]
+
+
+def lookup_metoffice(time_series):
+    today = datetime.datetime.now(datetime.timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return time_series.get_values_at_or_after(today.timestamp())["dayMaxScreenTemperature"]
+
+
+PROVIDERS = {
+    "metno": (MetNo("self@example.com", "51.5", "0", "metric"), make_metno, scan_metno, lookup_metno),
+    "smhi": (SMHI("self@example.com", "59.3", "18.1", "metric"), make_smhi, scan_smhi, lookup_smhi),
+    "metoffice": (MetOffice("key", "51.5", "0", "metric"), make_metoffice, scan_metoffice, lookup_metoffice),
+}
+
+
+def main():
+    names = [sys.argv[1]] if len(sys.argv) > 1 else list(PROVIDERS)
+    number = 10000
+    for name in names:
+        provider, make_response, scan, lookup = PROVIDERS[name]
+        if len(sys.argv) > 2:
+            with open(sys.argv[2], encoding="utf-8") as response_file:
+                response_data = json.load(response_file)
+        else:
+            response_data = make_response()
+
+        time_series = TimeSeries.from_dict(provider.project_response(response_data))
+        print("{}: {} times".format(name, len(time_series.times)))
+        if scan(response_data) != lookup(time_series):
+            print("  The two disagree: {} and {}".format(scan(response_data), lookup(time_series)))
+
+        seconds = timeit.timeit(lambda: scan(response_data), number=number) / number
+        print("  {:<22} {:8.2f} us".format("scan:", seconds * 1e6))
+        seconds = timeit.timeit(lambda: lookup(time_series), number=number) / number
+        print("  {:<22} {:8.2f} us".format("bisect:", seconds * 1e6))
+        seconds = timeit.timeit(lambda: provider.project_response(response_data), number=100) / 100
+        print("  {:<22} {:8.2f} us".format("convert, once a fetch:", seconds * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+"""
+Everything fetched from the web, and everything the providers work out from it, is cached in one
+SQLite database, cache.db, instead of a file per kind of data.
+
+Web responses are looked up by a hash of the method, the URL and the request headers, so two locations,
+two providers or two configurations running from the same directory each get their own entries.
+Their bodies are stored once per distinct content, along with when they were stored, when they were
+last used, and their ETag and Last-Modified.  Results, such as a provider's list of calendar events,
+are stored under a name of the provider's choosing.  Modules which keep tables of their own in the
+database, such as the literature clock's quotes and frames, register them as an index, which is
+counted, evicted and cleared as a whole along with everything else.
+When everything adds up to more than CACHE_MAX_BYTES, the least recently used entries are removed.
+
+The database is in WAL mode, so a render can read it while the daemon writes to it, and every change
+is a single transaction, so a power cut never leaves a half written cache behind.
+
+    python3 cache_store.py stats
+    python3 cache_store.py clear
+"""
+import argparse
+import hashlib
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Any, NamedTuple
+
+# Headers which only revalidate a response, and don't change what it is
+VALIDATOR_HEADERS = frozenset(("if-none-match", "if-modified-since"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bodies (
+    digest TEXT PRIMARY KEY,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    stored REAL NOT NULL,
+    used REAL NOT NULL,
+    etag TEXT,
+    last_modified TEXT
+);
+CREATE INDEX IF NOT EXISTS responses_digest ON responses (digest);
+CREATE TABLE IF NOT EXISTS results (
+    name TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    stored REAL NOT NULL,
+    used REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS indexes (
+    name TEXT PRIMARY KEY,
+    tables TEXT NOT NULL,
+    size_query TEXT NOT NULL,
+    used REAL NOT NULL
+);
+"""
+
+
+class CachedResponse(NamedTuple):
+    body: str
+    stored: float
+    etag: str
+    last_modified: str
+
+    def is_stale(self, ttl):
+        return time.time() - self.stored > ttl
+
+
+class CachedResult(NamedTuple):
+    value: Any
+    stored: float
+
+    def is_stale(self, ttl):
+        return time.time() - self.stored > ttl
+
+
+def get_key(method, url, headers, projection=""):
+    """
+    The key of a response.  `projection` names what the response was reduced to before it was cached, if anything.
+    """
+    key = hashlib.sha1()
+    key.update("{} {}\n".format(method.upper(), url).encode('utf-8'))
+    for name in sorted(headers, key=str.lower):
+        if name.lower() not in VALIDATOR_HEADERS:
+            key.update("{}: {}\n".format(name.lower(), headers[name]).encode('utf-8'))
+    if projection:
+        key.update("projection: {}\n".format(projection).encode('utf-8'))
+    return key.hexdigest()
+
+
+class CacheStore:
+
+    def __init__(self, filename, max_bytes):
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.connection = None
+        self.lock = threading.Lock()
+        # The indexes whose tables have been created by this process
+        self.index_names = set()
+
+    def connect(self):
+        """The connection to the database, which is opened, and created if needed, on first use"""
+        if self.connection is None:
+            connection = sqlite3.connect(self.filename, timeout=30, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            # In WAL mode a commit is only synced at checkpoints, which is plenty for a cache
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            self.connection = connection
+        return self.connection
+
+    def transaction(self, statements):
+        """Runs `statements(connection)` in one write transaction and returns what it returns"""
+        with self.lock:
+            connection = self.connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                result = statements(connection)
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+            return result
+
+    def get_response(self, key):
+        """The `CachedResponse` for a key, or None if there isn't one"""
+        def statements(connection):
+            row = connection.execute(
+                "SELECT bodies.body, stored, etag, last_modified FROM responses JOIN bodies USING (digest) "
+                "WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                connection.execute("UPDATE responses SET used = ? WHERE key = ?", (time.time(), key))
+            return row
+
+        row = self.transaction(statements)
+        if row is None:
+            return None
+        body, stored, etag, last_modified = row
+        return CachedResponse(body.decode('utf-8'), stored, etag, last_modified)
+
+    def put_response(self, key, url, body, etag=None, last_modified=None):
+        data = body.encode('utf-8')
+        digest = hashlib.sha1(data).hexdigest()
+        now = time.time()
+
+        def statements(connection):
+            connection.execute("INSERT OR IGNORE INTO bodies (digest, body, size) VALUES (?, ?, ?)",
+                               (digest, data, len(data)))
+            connection.execute("INSERT OR REPLACE INTO responses (key, url, digest, stored, used, etag, last_modified) "
+                               "VALUES (?, ?, ?, ?, ?, ?, ?)", (key, url, digest, now, now, etag, last_modified))
+            self.remove_unused_bodies(connection)
+            self.evict(connection)
+
+        self.transaction(statements)
+
+    def touch_response(self, key):
+        """Marks a response as fresh again, after the server said it hasn't changed"""
+        now = time.time()
+        self.transaction(lambda connection: connection.execute(
+            "UPDATE responses SET stored = ?, used = ? WHERE key = ?", (now, now, key)))
+
+    def get_result(self, name):
+        """The `CachedResult` stored under `name`, or None if there isn't one"""
+        def statements(connection):
+            row = connection.execute("SELECT value, stored FROM results WHERE name = ?", (name,)).fetchone()
+            if row is not None:
+                connection.execute("UPDATE results SET used = ? WHERE name = ?", (time.time(), name))
+            return row
+
+        row = self.transaction(statements)
+        if row is None:
+            return None
+        try:
+            return CachedResult(pickle.loads(row[0]), row[1])
+        except Exception as error:
+            logging.warning("Ignoring the unreadable cached {}: {}".format(name, error))
+            return None
+
+    def put_result(self, name, value):
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+
+        def statements(connection):
+            connection.execute("INSERT OR REPLACE INTO results (name, value, size, stored, used) VALUES (?, ?, ?, ?, ?)",
+                               (name, data, len(data), now, now))
+            self.evict(connection)
+
+        self.transaction(statements)
+
+    def add_index(self, name, schema, tables, size_query):
+        """
+        Creates the tables of an index with `schema`, if they haven't been, and registers them so that
+        they're counted, evicted and cleared with the cache.  All of `tables` are emptied together when
+        the index is evicted, and `size_query` selects how many bytes they hold.
+        """
+        if name in self.index_names:
+            return
+        # Outside of a transaction, as executescript commits
+        with self.lock:
+            self.connect().executescript(schema)
+        self.transaction(lambda connection: connection.execute(
+            "INSERT INTO indexes (name, tables, size_query, used) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET tables = excluded.tables, size_query = excluded.size_query",
+            (name, " ".join(tables), size_query, time.time())))
+        self.index_names.add(name)
+
+    def use_index(self, connection, name):
+        """Marks an index as used, in the transaction which reads or writes it"""
+        connection.execute("UPDATE indexes SET used = ? WHERE name = ?", (time.time(), name))
+
+    def empty_index(self, connection, name):
+        for table in connection.execute("SELECT tables FROM indexes WHERE name = ?", (name,)).fetchone()[0].split():
+            connection.execute("DELETE FROM {}".format(table))
+
+    def get_index_sizes(self, connection):
+        """The bytes held by each index, by name"""
+        return {name: connection.execute(size_query).fetchone()[0]
+                for name, size_query in connection.execute("SELECT name, size_query FROM indexes").fetchall()}
+
+    def remove_unused_bodies(self, connection):
+        connection.execute("DELETE FROM bodies WHERE digest NOT IN (SELECT digest FROM responses)")
+
+    def get_total_size(self, connection):
+        return connection.execute("SELECT (SELECT COALESCE(SUM(size), 0) FROM bodies)"
+                                  " + (SELECT COALESCE(SUM(size), 0) FROM results)").fetchone()[0] \
+            + sum(self.get_index_sizes(connection).values())
+
+    def evict(self, connection):
+        """Removes the least recently used entries until everything fits in `max_bytes`"""
+        if self.get_total_size(connection) <= self.max_bytes:
+            return
+        entries = connection.execute("SELECT 'responses', key, url, used FROM responses"
+                                     " UNION ALL SELECT 'results', name, name, used FROM results"
+                                     " UNION ALL SELECT 'indexes', name, 'the ' || name || ' index', used FROM indexes"
+                                     " ORDER BY used").fetchall()
+        for table, key, description, _ in entries:
+            logging.debug("Evicting {} from the cache".format(description))
+            if table == 'responses':
+                connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.remove_unused_bodies(connection)
+            elif table == 'indexes':
+                self.empty_index(connection, key)
+            else:
+                connection.execute("DELETE FROM results WHERE name = ?", (key,))
+            if self.get_total_size(connection) <= self.max_bytes:
+                break
+
+    def clear(self):
+        def statements(connection):
+            for table in ("responses", "bodies", "results"):
+                connection.execute("DELETE FROM {}".format(table))
+            for (name,) in connection.execute("SELECT name FROM indexes").fetchall():
+                self.empty_index(connection, name)
+
+        self.transaction(statements)
+        with self.lock:
+            self.connect().execute("VACUUM")
+
+    def get_stats(self):
+        """Counts and sizes of what's cached, and the entries themselves, most recently used first"""
+        def statements(connection):
+            now = time.time()
+            responses = connection.execute(
+                "SELECT url, size, ? - stored, ? - used, etag IS NOT NULL OR last_modified IS NOT NULL "
+                "FROM responses JOIN bodies USING (digest) ORDER BY used DESC", (now, now)).fetchall()
+            results = connection.execute(
+                "SELECT name, size, ? - stored, ? - used FROM results ORDER BY used DESC", (now, now)).fetchall()
+            body_count, body_bytes = connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM bodies").fetchone()
+            sizes = self.get_index_sizes(connection)
+            indexes = [(name, sizes[name], idle) for name, idle in connection.execute(
+                "SELECT name, ? - used FROM indexes ORDER BY used DESC", (now,)).fetchall()]
+            return responses, results, indexes, body_count, body_bytes
+
+        responses, results, indexes, body_count, body_bytes = self.transaction(statements)
+        return {
+            "responses": responses,
+            "results": results,
+            "body_count": body_count,
+            "body_bytes": body_bytes,
+            "result_bytes": sum(row[1] for row in results),
+            "indexes": indexes,
+            "index_bytes": sum(row[1] for row in indexes),
+            "file_bytes": sum(os.path.getsize(self.filename + suffix)
+                              for suffix in ("", "-wal") if os.path.isfile(self.filename + suffix)),
+        }
+
+
+cache_store = CacheStore(os.getenv("CACHE_DB", "cache.db"), int(os.getenv("CACHE_MAX_BYTES", 20 * 1024 * 1024)))
+
+
+def print_stats():
+    stats = cache_store.get_stats()
+    print("{}: {} bytes on disk, limit {} bytes".format(cache_store.filename, stats["file_bytes"], cache_store.max_bytes))
+    print("{} responses, {} distinct bodies, {} bytes".format(
+        len(stats["responses"]), stats["body_count"], stats["body_bytes"]))
+    for url, size, age, idle, revalidates in stats["responses"]:
+        print("  {:>9} bytes  stored {:>7.0f}s ago  used {:>7.0f}s ago  {}  {}".format(
+            size, age, idle, "revalidates" if revalidates else "           ", url))
+    print("{} results, {} bytes".format(len(stats["results"]), stats["result_bytes"]))
+    for name, size, age, idle in stats["results"]:
+        print("  {:>9} bytes  stored {:>7.0f}s ago  used {:>7.0f}s ago  {}".format(size, age, idle, name))
+    print("{} indexes, {} bytes".format(len(stats["indexes"]), stats["index_bytes"]))
+    for name, size, idle in stats["indexes"]:
+        print("  {:>9} bytes  used {:>7.0f}s ago  {}".format(size, idle, name))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or clear the cache")
+    parser.add_argument("command", choices=("stats", "clear"))
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        print_stats()
+    else:
+        cache_store.clear()
+        print("Cleared {}".format(cache_store.filename))
+
+
+if __name__ == "__main__":
+    main()
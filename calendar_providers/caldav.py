@@ -1,7 +1,15 @@
 import caldav
+import hashlib
 import logging
+from caldav.lib.error import AuthorizationError, DAVError
+from xml.sax.saxutils import escape
+from cache_store import cache_store
 from .base_provider import BaseCalendarProvider, CalendarEvent
 from datetime import datetime, date, time, timezone, timedelta
+from urllib.parse import unquote, urlsplit
+
+# How far past `to_date` recurring events are expanded, so they're only expanded again once that's passed
+expand_margin = timedelta(days=7)
 
 
 class CalDavCalendar(BaseCalendarProvider):
@@ -15,9 +23,7 @@ class CalDavCalendar(BaseCalendarProvider):
         self.to_date = to_date
 
     def get_calendar_events(self):
-
-        events_data = []
-        calendar_events = []
+        expanded_events = []
 
         # ★ 最初のURLを base URL として使う（重要）
         base_url = self.calendar_urls[0]
@@ -31,57 +37,81 @@ class CalDavCalendar(BaseCalendarProvider):
             for url in self.calendar_urls:
                 logging.info(f"Fetching CalDAV calendar: {url}")
 
-                calendar = caldav.Calendar(client, url=url)
-
-                results = calendar.date_search(
-                    start=self.from_date,
-                    end=self.to_date,
-                    expand=True
-                )
+                store_name = "caldav_sync:{}:{}".format(url, self.username)
+                cached = cache_store.get_result(store_name)
+                store = self.sync(client, url, cached and cached.value)
+                if cached is None or store is not cached.value:
+                    cache_store.put_result(store_name, store)
 
-                for result in results:
-                    for component in result.icalendar_instance.subcomponents:
-                        if 'DTSTART' in component:
-                            events_data.append(component)
-
-        def normalize_dt(dt):
-            if isinstance(dt, datetime):
-                return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
-            return datetime.combine(dt, time.min, tzinfo=timezone.utc)
+                expanded_events.extend(self.get_expanded_events(url, store))
 
-        events_data.sort(key=lambda x: normalize_dt(x['DTSTART'].dt))
-
-        for event in events_data[:self.max_event_results]:
-            start = event['DTSTART'].dt
-
-            if 'DTEND' in event:
-                end = event['DTEND'].dt
-            elif 'DURATION' in event:
-                end = start + event['DURATION'].dt
-            else:
-                end = start
+        from_date, to_date = normalize_dt(self.from_date), normalize_dt(self.to_date)
+        expanded_events = [(start, end, event) for start, end, event in expanded_events
+                           if start < to_date and (end > from_date or start >= from_date)]
+        expanded_events.sort(key=lambda expanded_event: expanded_event[0])
+        return [event for _, _, event in expanded_events[:self.max_event_results]]
 
-            all_day = isinstance(start, date) and not isinstance(start, datetime)
-            if all_day:
-                end = end - timedelta(days=1)
-
-            summary = str(event.get('SUMMARY', ''))
-
-            location = ""
-            if 'LOCATION' in event:
-                location = str(event.get('LOCATION'))
-
-            calendar_events.append(
-                CalendarEvent(
-                    summary,
-                    start,
-                    end,
-                    all_day,
-                    location
-                )
-            )
-
-        return calendar_events
+    def get_expanded_events(self, url, store):
+        """
+        The events of a calendar's `store`, with recurring events expanded, from the start of the day
+        to a little past `to_date`, as (start, end, `CalendarEvent`) with a start and end which can be
+        compared.  They're cached, and only expanded again when the calendar changes or they no longer
+        cover `from_date` to `to_date`.
+        """
+        version = get_store_version(store)
+        cache_name = "caldav_events:{}:{}".format(url, self.username)
+        cached = cache_store.get_result(cache_name)
+        if (cached and cached.value["version"] == version and cached.value["time_min"] <= normalize_dt(self.from_date)
+                and normalize_dt(self.to_date) <= cached.value["time_max"]):
+            return cached.value["events"]
+
+        time_min = normalize_dt(datetime.combine(self.from_date.date(), time.min, tzinfo=self.from_date.tzinfo))
+        time_max = normalize_dt(self.to_date + expand_margin)
+        logging.info("Expanding the events of CalDAV calendar: {}".format(url))
+        events = expand_events(store, time_min, time_max)
+        cache_store.put_result(cache_name, {"version": version, "time_min": time_min, "time_max": time_max,
+                                            "events": events})
+        return events
+
+    def sync(self, client, url, store):
+        """
+        Brings the `store` of a calendar's components up to date.  Nothing else is fetched when the
+        calendar's ctag or sync token hasn't changed.  Otherwise only the components which changed
+        are fetched, found with a sync-collection REPORT, or by comparing ETags on servers without one.
+        Returns the `store` itself when nothing changed.
+        """
+        ctag, sync_token = get_collection_tags(client, url)
+        if store is not None and ((ctag and ctag == store["ctag"]) or (sync_token and sync_token == store["sync_token"])):
+            logging.info("CalDAV calendar is unchanged: {}".format(url))
+            return store
+
+        components = dict(store["components"]) if store else {}
+        changes = None
+        if sync_token:
+            changes = sync_collection(client, url, store["sync_token"] or "" if store else "")
+            if changes is None and store and store["sync_token"]:
+                logging.info("CalDAV sync token expired, listing everything again: {}".format(url))
+                changes = sync_collection(client, url, "")
+        if changes is None:
+            # The server has no sync-collection, so every component's ETag is listed instead
+            changes = get_etags(client, url), None, None
+
+        etags, removed, new_sync_token = changes
+        if removed is None:
+            # Everything was listed, so whatever wasn't has been removed
+            removed = [href for href in components if href not in etags]
+        changed = [href for href, etag in etags.items() if components.get(href, {}).get("etag") != etag]
+        logging.info("{} changed and {} removed CalDAV components: {}".format(len(changed), len(removed), url))
+
+        fetched = get_components(client, url, changed)
+        # A component which changed but can't be fetched any more has been removed since
+        missing = [href for href in changed if href not in fetched]
+        if missing:
+            logging.info("{} CalDAV components weren't returned, dropping them: {}".format(len(missing), url))
+        for href in removed + missing:
+            components.pop(href, None)
+        components.update(fetched)
+        return {"ctag": ctag, "sync_token": new_sync_token, "components": components}
 
     def get_calendar_todos(self):
         """
@@ -148,3 +178,178 @@ class CalDavCalendar(BaseCalendarProvider):
 
         return todos
 
+
+DAV = "{DAV:}"
+CALDAV = "{urn:ietf:params:xml:ns:caldav}"
+CALENDARSERVER = "{http://calendarserver.org/ns/}"
+
+COLLECTION_TAGS_QUERY = """<?xml version="1.0" encoding="utf-8"?>
+<d:propfind xmlns:d="DAV:" xmlns:cs="http://calendarserver.org/ns/">
+  <d:prop><cs:getctag/><d:sync-token/></d:prop>
+</d:propfind>"""
+
+ETAGS_QUERY = """<?xml version="1.0" encoding="utf-8"?>
+<d:propfind xmlns:d="DAV:"><d:prop><d:getetag/></d:prop></d:propfind>"""
+
+SYNC_COLLECTION_QUERY = """<?xml version="1.0" encoding="utf-8"?>
+<d:sync-collection xmlns:d="DAV:">
+  <d:sync-token>{}</d:sync-token>
+  <d:sync-level>1</d:sync-level>
+  <d:prop><d:getetag/></d:prop>
+</d:sync-collection>"""
+
+MULTIGET_QUERY = """<?xml version="1.0" encoding="utf-8"?>
+<c:calendar-multiget xmlns:d="DAV:" xmlns:c="urn:ietf:params:xml:ns:caldav">
+  <d:prop><d:getetag/><c:calendar-data/></d:prop>
+  {}
+</c:calendar-multiget>"""
+
+# How many components to fetch with each calendar-multiget REPORT
+multiget_size = 100
+
+
+def normalize_dt(dt):
+    if isinstance(dt, datetime):
+        return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+    return datetime.combine(dt, time.min, tzinfo=timezone.utc)
+
+
+def get_store_version(store):
+    """What changes whenever any of the components in a calendar's `store` do"""
+    if store["ctag"] or store["sync_token"]:
+        return store["ctag"], store["sync_token"]
+    etags = sorted((href, component["etag"] or "") for href, component in store["components"].items())
+    return hashlib.sha1(repr(etags).encode("utf-8")).hexdigest()
+
+
+def expand_events(store, time_min, time_max):
+    """The events of a calendar's `store` from `time_min` to `time_max`, as (start, end, `CalendarEvent`)"""
+    # Only needed for CalDAV, so that the other calendars don't need them installed
+    import icalendar
+    import recurring_ical_events
+
+    events = []
+    for component in store["components"].values():
+        # Recurring events are expanded here, as date_search(expand=True) had the server do
+        calendar = icalendar.Calendar.from_ical(component["data"])
+        for event in recurring_ical_events.of(calendar).between(time_min, time_max):
+            start = event['DTSTART'].dt
+
+            if 'DTEND' in event:
+                end = event['DTEND'].dt
+            elif 'DURATION' in event:
+                end = start + event['DURATION'].dt
+            else:
+                end = start
+
+            all_day = isinstance(start, date) and not isinstance(start, datetime)
+            last_day = end - timedelta(days=1) if all_day else end
+
+            summary = str(event.get('SUMMARY', ''))
+
+            location = ""
+            if 'LOCATION' in event:
+                location = str(event.get('LOCATION'))
+
+            events.append((normalize_dt(start), normalize_dt(end),
+                           CalendarEvent(summary, start, last_day, all_day, location)))
+    return events
+
+
+def get_status(element):
+    """The status code of a response or propstat element, 200 if it hasn't got one"""
+    status = element.findtext(DAV + "status")
+    return int(status.split()[1]) if status else 200
+
+
+def get_prop(response, name):
+    """The text of a property of a response which was found, or None"""
+    for propstat in response.findall(DAV + "propstat"):
+        if get_status(propstat) == 200:
+            value = propstat.findtext(DAV + "prop/" + name)
+            if value:
+                return value.strip()
+    return None
+
+
+def is_same_path(href, url):
+    """Whether an href, which is usually only a path, is the same resource as `url`"""
+    return unquote(urlsplit(href).path).rstrip("/") == unquote(urlsplit(url).path).rstrip("/")
+
+
+def check_response(response, url):
+    if response.status >= 400 or response.tree is None:
+        raise DAVError("{} from {}".format(response.status, url))
+
+
+def get_collection_tags(client, url):
+    """The ctag and the sync token of a calendar, either of which can be None if the server has none"""
+    response = client.propfind(url, COLLECTION_TAGS_QUERY, depth=0)
+    check_response(response, url)
+    collection = response.tree.find(DAV + "response")
+    if collection is None:
+        return None, None
+    return get_prop(collection, CALENDARSERVER + "getctag"), get_prop(collection, DAV + "sync-token")
+
+
+def sync_collection(client, url, sync_token):
+    """
+    The ETags of the components which changed since `sync_token`, by href, the hrefs of those which
+    were removed, and the new sync token.  An empty `sync_token` lists every component, with None
+    for what was removed.  Returns None if the server doesn't accept the token.
+    """
+    etags = {}
+    removed = [] if sync_token else None
+    while True:
+        try:
+            response = client.report(url, SYNC_COLLECTION_QUERY.format(escape(sync_token)), depth=0)
+        except AuthorizationError:
+            # The client raises on a 403, which is what a server answers an invalid sync token with
+            return None
+        if response.status in (403, 409):
+            return None
+        check_response(response, url)
+
+        truncated = False
+        for member in response.tree.findall(DAV + "response"):
+            href = member.findtext(DAV + "href")
+            if get_status(member) == 404:
+                if removed is not None:
+                    removed.append(href)
+            elif get_status(member) == 507:
+                # RFC 6578 section 3.6, the rest of the changes are listed from the new sync token
+                truncated = True
+            elif get_prop(member, DAV + "getetag") is not None:
+                etags[href] = get_prop(member, DAV + "getetag")
+        sync_token = response.tree.findtext(DAV + "sync-token")
+        if not truncated:
+            return etags, removed, sync_token
+
+
+def get_etags(client, url):
+    """The ETag of every component of a calendar, by href"""
+    response = client.propfind(url, ETAGS_QUERY, depth=1)
+    check_response(response, url)
+    etags = {}
+    for member in response.tree.findall(DAV + "response"):
+        href = member.findtext(DAV + "href")
+        etag = get_prop(member, DAV + "getetag")
+        # The listing includes the calendar itself, which some servers give an ETag
+        if etag is not None and not is_same_path(href, url):
+            etags[href] = etag
+    return etags
+
+
+def get_components(client, url, hrefs):
+    """The ETag and iCalendar data of the components at `hrefs`, by href"""
+    components = {}
+    for index in range(0, len(hrefs), multiget_size):
+        query = MULTIGET_QUERY.format("".join("<d:href>{}</d:href>".format(escape(href))
+                                              for href in hrefs[index:index + multiget_size]))
+        response = client.report(url, query, depth=1)
+        check_response(response, url)
+        for member in response.tree.findall(DAV + "response"):
+            data = get_prop(member, CALDAV + "calendar-data")
+            if data is not None:
+                components[member.findtext(DAV + "href")] = {"etag": get_prop(member, DAV + "getetag"), "data": data}
+    return components
@@ -1,15 +1,15 @@
 import datetime
 from calendar_providers.base_provider import BaseCalendarProvider, CalendarEvent
-from utility import is_stale, xor_decode
+from cache_store import cache_store
+from utility import get_cached_result, xor_decode
 import os
 import logging
 import pickle
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
 
 ttl = float(os.getenv("CALENDAR_TTL", 1 * 60 * 60))
 google_calendar_timezone = os.getenv("GOOGLE_CALENDAR_TIME_ZONE_NAME", None)
+# How far past `to_date` a full sync lists events, so it's only needed again once that's passed
+full_sync_margin = datetime.timedelta(days=7)
 
 
 class GoogleCalendar(BaseCalendarProvider):
@@ -18,8 +18,11 @@ class GoogleCalendar(BaseCalendarProvider):
         self.from_date = from_date
         self.to_date = to_date
         self.google_calendar_id = google_calendar_id
+        self.service = None
 
     def get_google_credentials(self):
+        from google_auth_oauthlib.flow import InstalledAppFlow
+        from google.auth.transport.requests import Request
 
         google_token_pickle = 'token.pickle'
 
@@ -59,53 +62,130 @@ class GoogleCalendar(BaseCalendarProvider):
 
         return credentials
 
-    def get_calendar_events(self) -> list[CalendarEvent]:
-        calendar_events = []
-        google_calendar_pickle = 'cache_calendar.pickle'
+    def get_service(self):
+        """
+        The Calendar API service, built with the credentials when it's first needed.
+        Kept around, a long running process can reuse it for later calls.
+        """
+        if self.service is None:
+            # Imported here, as the Google client libraries take a while to import and aren't needed
+            # when the events are cached
+            from googleapiclient.discovery import build
+            self.service = build('calendar', 'v3', credentials=self.get_google_credentials(), cache_discovery=False)
+        return self.service
 
-        service = build('calendar', 'v3', credentials=self.get_google_credentials(), cache_discovery=False)
+    def get_calendar_events(self) -> list[CalendarEvent]:
+        cache_name = "google_calendar:{}:{}".format(self.google_calendar_id, self.max_event_results)
+        calendar_events = get_cached_result(cache_name, ttl, self.fetch_calendar_events)
 
-        events_result = None
+        if len(calendar_events) == 0:
+            logging.info("No upcoming events found.")
 
-        if is_stale(os.getcwd() + "/" + google_calendar_pickle, ttl):
-            logging.debug("Pickle is stale, calling the Calendar API")
+        return calendar_events
 
-            # Call the Calendar API
-            events_result = service.events().list(
+    def list_events(self, **parameters):
+        """
+        Every event the Calendar API lists with `parameters`, following the pages.
+        Returns the events and the token to list the changes since with.
+        """
+        events = []
+        page_token = None
+        while True:
+            events_result = self.get_service().events().list(
                 calendarId=self.google_calendar_id,
-                timeMin=self.from_date.isoformat() + 'Z',
                 timeZone=google_calendar_timezone,
-                maxResults=self.max_event_results,
                 singleEvents=True,
-                orderBy='startTime').execute()
-
-            for event in events_result.get('items', []):
-                if event['start'].get('date'):
-                    is_all_day = True
-                    start_date = datetime.datetime.strptime(event['start'].get('date'), "%Y-%m-%d")
-                    end_date = datetime.datetime.strptime(event['end'].get('date'), "%Y-%m-%d")
-                    # Google Calendar marks the 'end' of all-day-events as
-                    # the day _after_ the last day. eg, Today's all day event ends tomorrow!
-                    # So subtract a day
-                    end_date = end_date - datetime.timedelta(days=1)
-                else:
-                    is_all_day = False
-                    start_date = datetime.datetime.strptime(event['start'].get('dateTime'), "%Y-%m-%dT%H:%M:%S%z")
-                    end_date = datetime.datetime.strptime(event['end'].get('dateTime'), "%Y-%m-%dT%H:%M:%S%z")
-
-                summary = event['summary']
-
-                calendar_events.append(CalendarEvent(summary, start_date, end_date, is_all_day))
-
-            with open(google_calendar_pickle, 'wb') as cal:
-                pickle.dump(calendar_events, cal)
-
-        else:
-            logging.info("Found in cache")
-            with open(google_calendar_pickle, 'rb') as cal:
-                calendar_events = pickle.load(cal)
+                maxResults=2500,
+                pageToken=page_token,
+                **parameters).execute()
+            events.extend(events_result.get('items', []))
+            page_token = events_result.get('nextPageToken')
+            if not page_token:
+                return events, events_result.get('nextSyncToken')
+
+    def full_sync(self):
+        """Lists every event from the start of the day up to a little past `to_date`"""
+        time_min = datetime.datetime.combine(self.from_date.date(), datetime.time.min, tzinfo=self.from_date.tzinfo)
+        time_max = self.to_date + full_sync_margin
+        logging.info("Listing every event of the Google calendar")
+        events, sync_token = self.list_events(timeMin=get_rfc3339(time_min), timeMax=get_rfc3339(time_max))
+        return {"sync_token": sync_token, "time_min": time_min, "time_max": time_max,
+                "events": {event['id']: get_stored_event(event) for event in events}}
+
+    def sync(self, store):
+        """
+        Brings the `store` of events up to date with the changes since its sync token, or lists every
+        event again if there isn't one, it doesn't cover `from_date` to `to_date`, or Google expired it.
+        """
+        from googleapiclient.errors import HttpError
+
+        if (store is None or not store["sync_token"]
+                or self.from_date < store["time_min"] or self.to_date > store["time_max"]):
+            return self.full_sync()
+
+        try:
+            changes, sync_token = self.list_events(syncToken=store["sync_token"])
+        except HttpError as error:
+            if error.resp.status != 410:
+                raise
+            logging.info("The Google calendar sync token has expired")
+            return self.full_sync()
+
+        logging.info("{} changes to the Google calendar".format(len(changes)))
+        events = dict(store["events"])
+        for event in changes:
+            if event.get('status') == 'cancelled':
+                events.pop(event['id'], None)
+            else:
+                events[event['id']] = get_stored_event(event)
+        return dict(store, sync_token=sync_token, events=events)
 
-        if len(calendar_events) == 0:
-            logging.info("No upcoming events found.")
+    def fetch_calendar_events(self) -> list[CalendarEvent]:
+        store_name = "google_calendar_sync:{}:{}".format(self.google_calendar_id, google_calendar_timezone)
+        cached = cache_store.get_result(store_name)
+        store = self.sync(cached and cached.value)
+        cache_store.put_result(store_name, store)
 
-        return calendar_events
+        calendar_events = []
+        for event in store["events"].values():
+            calendar_event = get_calendar_event(event)
+            if calendar_event.start.astimezone() < self.to_date and get_end_time(calendar_event) > self.from_date:
+                calendar_events.append(calendar_event)
+
+        calendar_events.sort(key=lambda calendar_event: calendar_event.start.astimezone())
+        return calendar_events[:self.max_event_results]
+
+
+def get_rfc3339(dt):
+    return dt.isoformat() if dt.tzinfo else dt.isoformat() + 'Z'
+
+
+def get_stored_event(event):
+    """Only the summary, start and end of an event are kept"""
+    return {'summary': event.get('summary', ''), 'start': event['start'], 'end': event['end']}
+
+
+def get_end_time(calendar_event):
+    """When an event ends, as a time which can be compared with `from_date`. All day events are in local time."""
+    if calendar_event.all_day_event:
+        return (calendar_event.end + datetime.timedelta(days=1)).astimezone()
+    return calendar_event.end
+
+
+def get_calendar_event(event) -> CalendarEvent:
+    if event['start'].get('date'):
+        is_all_day = True
+        start_date = datetime.datetime.strptime(event['start'].get('date'), "%Y-%m-%d")
+        end_date = datetime.datetime.strptime(event['end'].get('date'), "%Y-%m-%d")
+        # Google Calendar marks the 'end' of all-day-events as
+        # the day _after_ the last day. eg, Today's all day event ends tomorrow!
+        # So subtract a day
+        end_date = end_date - datetime.timedelta(days=1)
+    else:
+        is_all_day = False
+        start_date = datetime.datetime.strptime(event['start'].get('dateTime'), "%Y-%m-%dT%H:%M:%S%z")
+        end_date = datetime.datetime.strptime(event['end'].get('dateTime'), "%Y-%m-%dT%H:%M:%S%z")
+
+    summary = event['summary']
+
+    return CalendarEvent(summary, start_date, end_date, is_all_day)
@@ -1,10 +1,9 @@
 
 import datetime
 from calendar_providers.base_provider import BaseCalendarProvider, CalendarEvent
-from utility import is_stale
+from utility import get_cached_result, get_text_from_url
 import os
 import logging
-import pickle
 import icalevents.icalevents
 from dateutil import tz
 
@@ -20,36 +19,33 @@ class ICSCalendar(BaseCalendarProvider):
         self.to_date = to_date
 
     def get_calendar_events(self) -> list[CalendarEvent]:
-        calendar_events = []
-        ics_calendar_pickle = 'cache_ics.pickle'
-        if is_stale(os.getcwd() + "/" + ics_calendar_pickle, ttl):
-            logging.debug("Pickle is stale, fetching ICS Calendar")
+        cache_name = "ics_calendar:{}:{}".format(self.ics_calendar_url, self.max_event_results)
+        return get_cached_result(cache_name, ttl, self.fetch_calendar_events)
 
-            ics_events = icalevents.icalevents.events(self.ics_calendar_url, start=self.from_date, end=self.to_date)
-            ics_events.sort(key=lambda x: x.start.replace(tzinfo=None))
+    def fetch_calendar_events(self) -> list[CalendarEvent]:
+        calendar_events = []
 
-            logging.debug(ics_events)
+        # Always revalidated, a calendar which hasn't changed is only downloaded again if the server has no validators
+        ics_url = self.ics_calendar_url.replace("webcal://", "https://", 1)
+        ics_content = get_text_from_url(ics_url, {}, 0, encoding="utf-8")
+        ics_events = icalevents.icalevents.events(string_content=ics_content, start=self.from_date, end=self.to_date)
+        ics_events.sort(key=lambda x: x.start.replace(tzinfo=None))
 
-            for ics_event in ics_events[0:self.max_event_results]:
-                event_end = ics_event.end
+        logging.debug(ics_events)
 
-                # CalDav Calendar marks the 'end' of all-day-events as
-                # the day _after_ the last day. eg, Today's all day event ends tomorrow!
-                # So subtract a day, if the event is an all day event
-                if ics_event.all_day:
-                    event_end = event_end - datetime.timedelta(days=1)
+        for ics_event in ics_events[0:self.max_event_results]:
+            event_end = ics_event.end
 
-                # convert to local timezone
-                event_end = ics_event.end.replace(tzinfo=tz.tzutc()).astimezone(tz.tzlocal())
-                event_start = ics_event.start.replace(tzinfo=tz.tzutc()).astimezone(tz.tzlocal())
+            # CalDav Calendar marks the 'end' of all-day-events as
+            # the day _after_ the last day. eg, Today's all day event ends tomorrow!
+            # So subtract a day, if the event is an all day event
+            if ics_event.all_day:
+                event_end = event_end - datetime.timedelta(days=1)
 
-                calendar_events.append(CalendarEvent(ics_event.summary, event_start, event_end, ics_event.all_day))
+            # convert to local timezone
+            event_end = ics_event.end.replace(tzinfo=tz.tzutc()).astimezone(tz.tzlocal())
+            event_start = ics_event.start.replace(tzinfo=tz.tzutc()).astimezone(tz.tzlocal())
 
-            with open(ics_calendar_pickle, 'wb') as cal:
-                pickle.dump(calendar_events, cal)
-        else:
-            logging.info("Found in cache")
-            with open(ics_calendar_pickle, 'rb') as cal:
-                calendar_events = pickle.load(cal)
+            calendar_events.append(CalendarEvent(ics_event.summary, event_start, event_end, ics_event.all_day))
 
         return calendar_events
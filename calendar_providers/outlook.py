@@ -1,17 +1,22 @@
 
 import datetime
 from calendar_providers.base_provider import BaseCalendarProvider, CalendarEvent
-from utility import is_stale
+from cache_store import cache_store
+from utility import get_cached_result
 import os
 import logging
-import pickle
 import msal
 import requests
+from http_client import session
 import sys
 import json
 from dateutil import tz
 
 ttl = float(os.getenv("CALENDAR_TTL", 1 * 60 * 60))
+# How far past `to_date` a full sync lists events, so it's only needed again once that's passed
+full_sync_margin = datetime.timedelta(days=7)
+# The only fields of an event the screen uses
+selected_fields = ("subject", "start", "end", "isAllDay")
 
 
 class OutlookCalendar(BaseCalendarProvider):
@@ -21,15 +26,26 @@ class OutlookCalendar(BaseCalendarProvider):
         self.from_date = from_date
         self.to_date = to_date
         self.outlook_calendar_id = outlook_calendar_id
+        self.msal_app = None
+
+    def get_msal_app(self):
+        """
+        The MSAL application and its token cache are loaded once, and reused by later calls.
+        """
+        if self.msal_app is None:
+            mscache = msal.SerializableTokenCache()
+            if os.path.exists("outlooktoken.bin"):
+                mscache.deserialize(open("outlooktoken.bin", "r").read())
+
+            self.msal_app = msal.PublicClientApplication("3b49f0d7-201a-4b5d-b2b4-8f4c3e6c8a30",
+                                                         authority="https://login.microsoftonline.com/consumers",
+                                                         token_cache=mscache,
+                                                         http_client=session)
+        return self.msal_app
 
     def get_access_token(self):
-        mscache = msal.SerializableTokenCache()
-        if os.path.exists("outlooktoken.bin"):
-            mscache.deserialize(open("outlooktoken.bin", "r").read())
-
-        app = msal.PublicClientApplication("3b49f0d7-201a-4b5d-b2b4-8f4c3e6c8a30",
-                                           authority="https://login.microsoftonline.com/consumers",
-                                           token_cache=mscache)
+        app = self.get_msal_app()
+        mscache = app.token_cache
 
         result = None
 
@@ -66,63 +82,119 @@ class OutlookCalendar(BaseCalendarProvider):
             logging.error(result.get("correlation_id"))
             raise Exception(result.get("error"))
 
-    def get_outlook_calendar_events(self, calendar_id, from_date, to_date, access_token):
-
-        from_date_iso = from_date.replace(microsecond=0).isoformat()
-        to_date_iso = to_date.isoformat()
-
+    def get_delta(self, url, access_token):
+        """
+        Every change the Graph API lists from a calendar view delta `url`, following `@odata.nextLink`.
+        Returns the changed events and the `@odata.deltaLink` to list the next changes with.
+        """
         headers = {'Authorization': 'Bearer ' + access_token}
-        endpoint_calendar_view = \
-            "https://graph.microsoft.com/v1.0/me/calendars/{0}/calendarview?startdatetime={1}&enddatetime={2}&$orderby=start/dateTime&$top={3}"
-        events_data = requests.get(
-                                  endpoint_calendar_view.format(calendar_id,
-                                                                requests.utils.quote(from_date_iso),
-                                                                requests.utils.quote(to_date_iso),
-                                                                self.max_event_results),
-                                  headers=headers).json()
-        return events_data
+        events = []
+        while True:
+            response = session.get(url, headers=headers)
+            if response.status_code == 410:
+                raise DeltaLinkExpired()
+            response.raise_for_status()
+            events_data = response.json()
+            events.extend(events_data.get("value", []))
+            if "@odata.nextLink" in events_data:
+                url = events_data["@odata.nextLink"]
+            else:
+                return events, events_data["@odata.deltaLink"]
+
+    def full_sync(self, access_token):
+        """Lists every event from the start of the day up to a little past `to_date`"""
+        time_min = datetime.datetime.combine(self.from_date.date(), datetime.time.min, tzinfo=self.from_date.tzinfo)
+        time_max = self.to_date + full_sync_margin
+        endpoint_calendar_view_delta = \
+            "https://graph.microsoft.com/v1.0/me/calendars/{0}/calendarView/delta?startDateTime={1}&endDateTime={2}&$select={3}"
+        logging.info("Listing every event of the Outlook calendar")
+        events, delta_link = self.get_delta(endpoint_calendar_view_delta.format(
+            self.outlook_calendar_id,
+            requests.utils.quote(time_min.replace(microsecond=0).isoformat()),
+            requests.utils.quote(time_max.replace(microsecond=0).isoformat()),
+            ",".join(selected_fields)), access_token)
+        return {"delta_link": delta_link, "time_min": time_min, "time_max": time_max,
+                "events": {event["id"]: get_stored_event(event) for event in events if "@removed" not in event}}
+
+    def sync(self, store, access_token):
+        """
+        Brings the `store` of events up to date with the changes since its delta link, or lists every
+        event again if there isn't one, it doesn't cover `from_date` to `to_date`, or it has expired.
+        """
+        if store is None or self.from_date < store["time_min"] or self.to_date > store["time_max"]:
+            return self.full_sync(access_token)
+
+        try:
+            changes, delta_link = self.get_delta(store["delta_link"], access_token)
+        except DeltaLinkExpired:
+            logging.info("The Outlook calendar delta link has expired")
+            return self.full_sync(access_token)
+
+        logging.info("{} changes to the Outlook calendar".format(len(changes)))
+        events = dict(store["events"])
+        for event in changes:
+            if "@removed" in event:
+                events.pop(event["id"], None)
+            else:
+                events[event["id"]] = get_stored_event(event)
+        return dict(store, delta_link=delta_link, events=events)
 
     def get_calendar_events(self, bypass_cache=False) -> list[CalendarEvent]:
+        if bypass_cache:
+            return self.fetch_calendar_events()
+        cache_name = "outlook_calendar:{}:{}".format(self.outlook_calendar_id, self.max_event_results)
+        return get_cached_result(cache_name, ttl, self.fetch_calendar_events)
+
+    def fetch_calendar_events(self) -> list[CalendarEvent]:
+        """Syncs the events with the Graph API, and returns the upcoming `CalendarEvent`s which are cached"""
+        store_name = "outlook_calendar_sync:{}".format(self.outlook_calendar_id)
+        cached = cache_store.get_result(store_name)
+        store = self.sync(cached and cached.value, self.get_access_token())
+        cache_store.put_result(store_name, store)
+
         calendar_events = []
-        outlook_calendar_pickle = 'cache_outlookcalendar.pickle'
-        if bypass_cache or is_stale(os.getcwd() + "/" + outlook_calendar_pickle, ttl):
-            logging.debug("Cache is stale, calling the Outlook Calendar API")
-
-            access_token = self.get_access_token()
-            events_data = self.get_outlook_calendar_events(
-                self.outlook_calendar_id,
-                self.from_date,
-                self.to_date,
-                access_token)
-            logging.debug(events_data)
-
-            if not bypass_cache:
-                with open(outlook_calendar_pickle, 'wb') as cal:
-                    pickle.dump(events_data, cal)
-        else:
-            logging.info("Found in cache")
-            with open(outlook_calendar_pickle, 'rb') as cal:
-                events_data = pickle.load(cal)
-
-        for event in events_data["value"]:
-            start_date = datetime.datetime.strptime(event["start"]["dateTime"], "%Y-%m-%dT%H:%M:%S.0000000")
-            end_date = datetime.datetime.strptime(event["end"]["dateTime"], "%Y-%m-%dT%H:%M:%S.0000000")
-
-            summary = event["subject"]
-            is_all_day = event['isAllDay']
-
-            # Outlook Calendar marks the 'end' of all-day-events as
-            # the day _after_ the last day. eg, Today's all day event ends tomorrow midnight.
-            # So subtract a day
-            if is_all_day:
-                end_date = end_date - datetime.timedelta(days=1)
-            else:
-                # Convert start/end to local time
-                start_date = start_date.replace(tzinfo=tz.tzutc())
-                start_date = start_date.astimezone(tz.tzlocal())
-                end_date = end_date.replace(tzinfo=tz.tzutc())
-                end_date = end_date.astimezone(tz.tzlocal())
+        for event in store["events"].values():
+            calendar_event = get_calendar_event(event)
+            if calendar_event.start.astimezone() < self.to_date and get_end_time(calendar_event) > self.from_date:
+                calendar_events.append(calendar_event)
+
+        calendar_events.sort(key=lambda calendar_event: calendar_event.start.astimezone())
+        return calendar_events[:self.max_event_results]
+
+
+class DeltaLinkExpired(Exception):
+    """Graph no longer knows the delta link, and every event has to be listed again"""
+
+
+def get_stored_event(event):
+    """Only the fields the screen uses are kept"""
+    return {field: event.get(field) for field in selected_fields}
+
+
+def get_end_time(calendar_event):
+    """When an event ends, as a time which can be compared with `from_date`. All day events are in local time."""
+    if calendar_event.all_day_event:
+        return (calendar_event.end + datetime.timedelta(days=1)).astimezone()
+    return calendar_event.end
+
+
+def get_calendar_event(event) -> CalendarEvent:
+    start_date = datetime.datetime.strptime(event["start"]["dateTime"], "%Y-%m-%dT%H:%M:%S.0000000")
+    end_date = datetime.datetime.strptime(event["end"]["dateTime"], "%Y-%m-%dT%H:%M:%S.0000000")
+
+    summary = event["subject"]
+    is_all_day = event['isAllDay']
 
-            calendar_events.append(CalendarEvent(summary, start_date, end_date, is_all_day))
+    # Outlook Calendar marks the 'end' of all-day-events as
+    # the day _after_ the last day. eg, Today's all day event ends tomorrow midnight.
+    # So subtract a day
+    if is_all_day:
+        end_date = end_date - datetime.timedelta(days=1)
+    else:
+        # Convert start/end to local time
+        start_date = start_date.replace(tzinfo=tz.tzutc())
+        start_date = start_date.astimezone(tz.tzlocal())
+        end_date = end_date.replace(tzinfo=tz.tzutc())
+        end_date = end_date.astimezone(tz.tzlocal())
 
-        return calendar_events
+    return CalendarEvent(summary, start_date, end_date, is_all_day)
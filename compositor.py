@@ -0,0 +1,266 @@
+"""
+Renders a template as layers, so that a refresh only rasterizes the parts of the screen that changed.
+
+The template's top level elements are split into
+  * a static layer, every element before the first one with a value to fill in, rasterized once
+    per template and screen size, and
+  * overlays, every element from there on, each rasterized into just the area it draws on.
+Overlays are composited over the static layer in document order, so the result is the same as
+rasterizing the whole document.  An overlay is only rasterized again when its text, or an SVG file
+it references, changes, so a refresh where only TIME_NOW changed rasterizes only the clock.
+The clock itself is usually drawn from a glyph atlas, see glyph_atlas.py.
+<defs> and <style> elements are part of every layer.
+
+Templates which can't be split this way are rasterized whole, see `can_composite`.
+"""
+import codecs
+import logging
+import os
+import re
+import xml.parsers.expat
+from collections import OrderedDict
+
+import numpy
+from PIL import Image
+
+import glyph_atlas
+import icon_cache
+from rasterize import USE_HREF_PATTERN, draw_document, get_pixels, get_referenced_documents, rasterize, rasterize_drawn_area
+from svg_template import BARE_NAME_PATTERN, CompiledTemplate
+
+SHARED_ELEMENT_PATTERN = re.compile(r"\s*<(?:svg:)?(?:defs|style)\b")
+ID_PATTERN = re.compile(r'\bid="([^"]+)"')
+ID_REFERENCE_PATTERN = re.compile(r'(?:href="|url\()#([^")]+)')
+
+max_overlays = 64
+
+# (overlay text, width, height, referenced documents) -> (((x, y), premultiplied BGRA array) or None, referenced documents)
+overlays = OrderedDict()
+
+
+class LayeredTemplate:
+
+    def __init__(self, text):
+        prefix, elements, suffix = split_elements(text)
+
+        self.prefix = CompiledTemplate(prefix)
+        self.suffix = CompiledTemplate(suffix)
+        self.shared = [CompiledTemplate(element) for element in elements if SHARED_ELEMENT_PATTERN.match(element)]
+
+        self.layer_texts = [element for element in elements if not SHARED_ELEMENT_PATTERN.match(element)]
+        self.layers = [CompiledTemplate(layer) for layer in self.layer_texts]
+        self.references_files = [bool(USE_HREF_PATTERN.search(layer)) for layer in self.layer_texts]
+        self.independent = are_independent(self.layer_texts)
+
+        # (width, height, number of layers) -> premultiplied BGRA array of the static layer
+        self.static_layers = {}
+
+    def get_first_overlay(self, keys):
+        """
+        The index of the first layer which has a value in `keys` or references an SVG file,
+        every layer before it is static.
+        """
+        for i, layer in enumerate(self.layers):
+            if self.references_files[i] or not layer.names.isdisjoint(keys):
+                return i
+        return len(self.layers)
+
+    def get_document(self, output_dict, layer_text):
+        """A document with the template's root element, its shared elements and `layer_text`"""
+        return "".join([self.prefix.render(output_dict)]
+                       + [shared.render(output_dict) for shared in self.shared]
+                       + [layer_text, self.suffix.render(output_dict)])
+
+    def get_static_layer(self, svg_filename, width, height, layer_count):
+        """The first `layer_count` layers, rasterized once"""
+        key = (width, height, layer_count)
+        static_layer = self.static_layers.get(key)
+        if static_layer is None:
+            logging.debug("get_static_layer() - Rasterizing {} static layers at {}x{}".format(layer_count, width, height))
+            document = self.get_document({}, "".join(self.layer_texts[:layer_count]))
+            surface = draw_document(document, svg_filename, width, height)
+            static_layer = get_pixels(surface.cairo)
+            surface.finish()
+            self.static_layers[key] = static_layer
+        return static_layer
+
+
+def split_elements(text):
+    """
+    Splits an SVG document into the text up to its first top level element, the text of each top level
+    element along with whatever follows it, and the root element's closing tag.
+    Raises xml.parsers.expat.ExpatError if the document isn't well formed.
+    """
+    data = text.encode('utf-8')
+    parser = xml.parsers.expat.ParserCreate()
+    starts = []
+    root_end = []
+    depth = [0]
+
+    def start_element(name, attributes):
+        if depth[0] == 1:
+            starts.append(parser.CurrentByteIndex)
+        depth[0] += 1
+
+    def end_element(name):
+        depth[0] -= 1
+        if depth[0] == 0:
+            root_end.append(parser.CurrentByteIndex)
+
+    parser.StartElementHandler = start_element
+    parser.EndElementHandler = end_element
+    parser.Parse(data, True)
+
+    boundaries = starts + root_end
+    elements = [data[start:end].decode('utf-8') for start, end in zip(boundaries, boundaries[1:])]
+    return data[:boundaries[0]].decode('utf-8'), elements, data[boundaries[-1]:].decode('utf-8')
+
+
+def are_independent(layers):
+    """Whether no layer refers to an id defined in another layer"""
+    for i, layer in enumerate(layers):
+        ids = set(ID_PATTERN.findall(layer))
+        others = set(ID_REFERENCE_PATTERN.findall("".join(layers[:i] + layers[i + 1:])))
+        if ids & others:
+            return False
+    return True
+
+
+def can_composite(template, output_dict):
+    """
+    The layers have to be independent, and only the layers can have values.
+    Keys which can't be a placeholder are replaced as text anywhere in the document,
+    so they could change the static layer.
+    """
+    if not template.independent:
+        return False
+    keys = output_dict.keys()
+    if not template.prefix.names.isdisjoint(keys) or not template.suffix.names.isdisjoint(keys):
+        return False
+    if any(not shared.names.isdisjoint(keys) for shared in template.shared):
+        return False
+    return all(BARE_NAME_PATTERN.fullmatch(key) for key in keys)
+
+
+def get_overlay(document, svg_filename, width, height):
+    """
+    Returns the rasterized area of an overlay document and where it goes, reusing the last
+    rasterization if neither the document nor the SVG files it references changed.
+    """
+    base_dir = os.path.dirname(os.path.abspath(svg_filename))
+    referenced_documents = get_referenced_documents(document, base_dir)
+    # The parsed documents are kept in the cache along with their ids, so the ids can't be reused
+    key = (document, width, height, tuple(sorted((href, id(tree)) for href, tree in referenced_documents.items())))
+
+    if key in overlays:
+        overlays.move_to_end(key)
+        return overlays[key][0]
+
+    overlay = rasterize_drawn_area(document, svg_filename, width, height)
+    if overlay is not None:
+        position, area = overlay
+        overlay = position, get_pixels(area)
+
+    overlays[key] = (overlay, referenced_documents)
+    if len(overlays) > max_overlays:
+        overlays.popitem(last=False)
+    return overlay
+
+
+def composite(frame, overlay):
+    """Draws a premultiplied overlay over `frame`, in place, leaving out whatever falls outside it"""
+    (x, y), pixels = overlay
+    frame_height, frame_width = frame.shape[:2]
+    height, width = pixels.shape[:2]
+
+    left, top = max(x, 0), max(y, 0)
+    right, bottom = min(x + width, frame_width), min(y + height, frame_height)
+    if right <= left or bottom <= top:
+        return
+
+    pixels = pixels[top - y:bottom - y, left - x:right - x]
+    target = frame[top:bottom, left:right]
+    transparency = 255 - pixels[:, :, 3:4].astype(numpy.uint16)
+    target[:] = pixels + (target * transparency + 127) // 255
+
+
+def get_layer_overlays(template, layer, svg_filename, width, height, output_dict):
+    """
+    Returns the overlays which draw one layer: the clock from the glyph atlas when it can be,
+    icons from the icon cache, and anything else rasterized as a whole.
+    """
+    clock_names = layer.names & glyph_atlas.CLOCK_NAMES.intersection(output_dict)
+    if len(clock_names) == 1:
+        name = next(iter(clock_names))
+        if glyph_atlas.can_draw(output_dict[name]):
+            # The clock's position and font don't depend on the time, so leave the placeholder in
+            values = {key: value for key, value in output_dict.items() if key != name}
+            document = template.get_document(values, layer.render(values))
+            clock_text = glyph_atlas.get_clock_text(document, name, svg_filename, width, height)
+            if clock_text is not None:
+                return clock_text.get_overlays(output_dict[name])
+
+    document = template.get_document(output_dict, layer.render(output_dict))
+    if icon_cache.is_icon_layer(document):
+        overlay = icon_cache.get_icon_overlay(document, svg_filename, width, height)
+    else:
+        overlay = get_overlay(document, svg_filename, width, height)
+    return [overlay] if overlay is not None else []
+
+
+def render(template, svg_filename, width, height, output_dict):
+    """
+    Returns the `width` x `height` RGBA image of the template filled in with `output_dict`.
+    `svg_filename` is where the document would live, relative references are resolved from there.
+    """
+    first_overlay = template.get_first_overlay(output_dict.keys())
+    frame = template.get_static_layer(svg_filename, width, height, first_overlay).copy()
+
+    for layer in template.layers[first_overlay:]:
+        for overlay in get_layer_overlays(template, layer, svg_filename, width, height, output_dict):
+            composite(frame, overlay)
+
+    return Image.frombuffer("RGBA", (width, height), frame.tobytes(), "raw", "BGRa", 0, 1)
+
+
+# path -> ((mtime, size), LayeredTemplate)
+layered_templates = {}
+
+
+def load_layered_template(template_svg_filename):
+    """
+    Returns the layered template for a file, or None if it isn't well formed.
+    It's split again only when the file's modification time or size changes.
+    """
+    stat = os.stat(template_svg_filename)
+    version = (stat.st_mtime_ns, stat.st_size)
+
+    cached = layered_templates.get(template_svg_filename)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    logging.debug("load_layered_template() - Splitting {}".format(template_svg_filename))
+    with codecs.open(template_svg_filename, 'r', encoding='utf-8') as template_file:
+        text = template_file.read()
+    try:
+        template = LayeredTemplate(text)
+    except xml.parsers.expat.ExpatError as error:
+        logging.warning("{} can't be split into layers: {}".format(template_svg_filename, error))
+        template = None
+    layered_templates[template_svg_filename] = (version, template)
+    return template
+
+
+def rasterize_template(template_svg_filename, svg_text, svg_filename, width, height, output_dict, png_filename=None):
+    """
+    Renders the template filled in with `output_dict`, whose full text is `svg_text`, to a
+    `width` x `height` RGBA image, in layers if it can.  Also writes the PNG to `png_filename`, if given.
+    """
+    template = load_layered_template(template_svg_filename)
+    if template is None or not can_composite(template, output_dict):
+        return rasterize(svg_text, svg_filename, width, height, png_filename)
+
+    image = render(template, svg_filename, width, height, output_dict)
+    if png_filename:
+        image.save(png_filename)
+    return image
@@ -0,0 +1,203 @@
+#!/usr/bin/python3
+"""
+Keeps running and refreshes the screen every minute, instead of a cron job or systemd timer starting run.sh.
+
+Modules, providers, credentials and the screen driver stay loaded between refreshes.
+Each data source is fetched on its own schedule; the clock is redrawn every minute,
+the weather every WEATHER_TTL, alerts every ALERT_TTL and the calendar every CALENDAR_TTL seconds.
+Data which is due is shown from the cache while it's fetched again in the background.
+"""
+import datetime
+import logging
+import os
+import sys
+import time
+
+import pipeline
+from fetch import fetch_all, get_fetch_timeout
+from utility import configure_logging, configure_locale, enable_background_revalidation
+
+
+class Source:
+    """
+    A piece of screen data which is fetched again once it is `interval` seconds old.
+    """
+
+    def __init__(self, name, interval, fetch):
+        self.name = name
+        self.interval = interval
+        self.fetch = fetch
+        self.value = None
+        self.next_fetch = 0
+
+    def is_due(self, now):
+        return now >= self.next_fetch
+
+    def update(self, result, now):
+        """
+        Takes the `fetch.FetchResult` of a fetch.  On failure the previous value is kept and the
+        fetch is retried after a few minutes, or sooner if the interval is shorter.
+        """
+        if result.error is None:
+            self.value = result.value
+            self.next_fetch = now + self.interval
+        else:
+            logging.warning("Keeping the previous value of {}".format(self.name))
+            self.next_fetch = now + min(self.interval, 5 * 60)
+
+
+class ScreenDaemon:
+
+    def __init__(self, template_name):
+        self.template_name = template_name
+        self.month_output = None
+        self.month_date = None
+        self.sources = {}
+
+        calendar_ttl = float(os.getenv("CALENDAR_TTL", 1 * 60 * 60))
+
+        # Imported here, after the locale has been configured
+        from stages import calendar_events
+        self.calendar_events = calendar_events
+
+        if template_name == "7":
+            from stages import noweather, todo
+            self.noweather = noweather
+            self.todo = todo
+
+            todo_provider = todo.get_todo_provider()
+            self.add_source("todo", calendar_ttl, lambda: todo.get_todos(todo_provider))
+        else:
+            from stages import weather
+            from weather_providers.base_provider import BaseWeatherProvider
+            from alert_providers.base_provider import BaseAlertProvider
+            self.weather = weather
+
+            location_lat, location_long = weather.get_location()
+            units, self.degrees = weather.get_units()
+            fetches = weather.get_fetches(location_lat, location_long, units)
+
+            self.add_source("weather", BaseWeatherProvider.ttl, fetches["weather"][0])
+            if "alert" in fetches:
+                self.add_source("alert", BaseAlertProvider.ttl, fetches["alert"][0])
+
+        now = datetime.datetime.now().astimezone()
+        self.calendar_provider = calendar_events.get_calendar_provider(*calendar_events.get_date_range(now))
+        self.add_source("calendar", calendar_ttl, self.fetch_calendar_events)
+
+        # Stale data is shown straight away and fetched again in the background
+        enable_background_revalidation(self.fetch_again)
+
+    def add_source(self, name, interval, fetch):
+        self.sources[name] = Source(name, interval, fetch)
+
+    def fetch_again(self):
+        """
+        Makes every source be fetched on the next refresh, once stale data has been fetched again in the
+        background.  The sources which weren't stale come straight from the cache.
+        """
+        for source in self.sources.values():
+            source.next_fetch = 0
+
+    def fetch_calendar_events(self):
+        """
+        Moves the provider's window along to the current time before fetching.
+        """
+        now = datetime.datetime.now().astimezone()
+        self.calendar_provider.from_date, self.calendar_provider.to_date = self.calendar_events.get_date_range(now)
+        return self.calendar_provider.get_calendar_events()
+
+    def refresh_sources(self, timings):
+        """Fetches every source which is due, at the same time"""
+        now = time.monotonic()
+        due = [source for source in self.sources.values() if source.is_due(now)]
+        if not due:
+            return
+
+        with pipeline.timed_stage("fetch", timings):
+            results = fetch_all({source.name: (source.fetch, get_fetch_timeout(source.name)) for source in due})
+
+        for source in due:
+            source.update(results[source.name], now)
+
+    def get_month_output(self, now):
+        """The month calendar only changes once a day"""
+        if self.month_date != now.date():
+            from stages import calendar_month
+            self.month_output = calendar_month.get_output_dict(now)
+            self.month_date = now.date()
+        return self.month_output
+
+    def build_output_dict(self, timings):
+        """
+        Builds the template values from the latest data of each source.
+        Returns None if there is nothing to show yet.
+        """
+        now = datetime.datetime.now().astimezone()
+        output_dict = {}
+
+        if self.template_name == "7":
+            todos = self.sources["todo"].value or []
+            pipeline.merge_output(output_dict, self.noweather.get_output_dict(now, len(todos)))
+            pipeline.merge_output(output_dict, self.todo.get_output_dict(todos))
+        else:
+            weather = self.sources["weather"].value
+            if not weather:
+                logging.error("No weather data yet. SVG will not be updated.")
+                return None
+            alert_message = self.sources["alert"].value if "alert" in self.sources else ""
+            pipeline.merge_output(output_dict, self.weather.get_weather_output_dict(weather, alert_message or "", self.degrees))
+            pipeline.merge_output(output_dict, self.weather.get_clock_output_dict(now))
+
+        events = self.calendar_events.filter_events(self.sources["calendar"].value or [], now)
+        pipeline.merge_output(output_dict, self.calendar_events.get_output_dict(events))
+
+        # Only layouts 5 and 6 show a calendar
+        if self.template_name in ("5", "6"):
+            pipeline.merge_output(output_dict, self.get_month_output(now))
+
+        with pipeline.timed_stage("custom", timings):
+            pipeline.run_custom_stage()
+
+        return output_dict
+
+    def refresh_screen(self):
+        timings = {}
+        self.refresh_sources(timings)
+
+        output_dict = self.build_output_dict(timings)
+        if output_dict is not None:
+            pipeline.render_screen(self.template_name, output_dict, timings)
+
+        pipeline.log_timings(timings)
+
+    def run(self):
+        while True:
+            try:
+                self.refresh_screen()
+            except Exception:
+                logging.exception("Screen refresh failed")
+
+            # Wake up at the start of the next minute, so that the clock is on time
+            time.sleep(60 - time.time() % 60)
+
+
+def main():
+    if os.getenv("PRIVACY_MODE_XKCD") == "1" or os.getenv("PRIVACY_MODE_LITERATURE_CLOCK") == "1":
+        logging.error("The daemon only draws the regular layouts. Use run.sh for the privacy modes.")
+        return 1
+
+    daemon = ScreenDaemon(os.getenv("SCREEN_LAYOUT", "6"))
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        logging.debug("Keyboard Interrupt - Exit")
+        import display
+        display.get_epd_module().epdconfig.module_exit()
+    return 0
+
+
+if __name__ == "__main__":
+    configure_locale()
+    configure_logging()
+    sys.exit(main())
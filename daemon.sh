@@ -0,0 +1,6 @@
+#!/usr/bin/env bash
+
+# shellcheck source=env.sh
+. env.sh
+
+exec .venv/bin/python3 daemon.py
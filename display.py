@@ -3,53 +3,175 @@ import sys
 import os
 import logging
 import datetime
+import importlib
+from functools import lru_cache
 from PIL import Image
+import frame_diff
+import framebuffer
 from utility import configure_logging
 
 libdir = "./lib/e-Paper/RaspberryPi_JetsonNano/python/lib"
 if os.path.exists(libdir):
     sys.path.append(libdir)
 
-configure_logging()
-
 # Dear future me: consider converting this to a WAVESHARE_VERSION variable instead if you ever intend to support more screen sizes.
 
 waveshare_epd75_version = os.getenv("WAVESHARE_EPD75_VERSION", "2")
 
-if (waveshare_epd75_version == "1"):
-    from waveshare_epd import epd7in5 as epd7in5
-elif (waveshare_epd75_version == "2B"):
-    from waveshare_epd import epd7in5b_V2 as epd7in5
-else:
-    from waveshare_epd import epd7in5_V2 as epd7in5
+# The last frame sent to the screen, packed, to skip refreshes which wouldn't change anything
+# and to find the parts of the screen that need a partial refresh
+last_frame_filename = "cache_display_frame.bin"
+
+# Above this share of the screen changing, do a full refresh rather than a partial one. 0 turns partial refreshes off.
+partial_refresh_max_fraction = float(os.getenv("PARTIAL_REFRESH_MAX_FRACTION", 0.25))
+
+
+def get_epd_module():
+    """
+    Imports the Waveshare driver for WAVESHARE_EPD75_VERSION.
+    Done on first use so that this module can be imported away from the Pi.
+    """
+    if (waveshare_epd75_version == "1"):
+        return importlib.import_module("waveshare_epd.epd7in5")
+    elif (waveshare_epd75_version == "2B"):
+        return importlib.import_module("waveshare_epd.epd7in5b_V2")
+    else:
+        return importlib.import_module("waveshare_epd.epd7in5_V2")
 
-try:
-    epd = epd7in5.EPD()
-    logging.debug("Initialize screen")
-    epd.init()
 
+@lru_cache(maxsize=None)
+def get_epd():
+    """
+    The screen driver, created once per process so that the daemon can keep reusing it.
+    """
+    return get_epd_module().EPD()
+
+
+def is_full_clear_due(now):
     # Full screen refresh at 2 AM
-    if datetime.datetime.now().minute == 0 and datetime.datetime.now().hour == 8:
-        logging.debug("Clear screen")
-        epd.Clear()
+    return now.minute == 0 and now.hour == 8
 
-    filename = sys.argv[1]
 
-    logging.debug("Read image file: " + filename)
-    Himage = Image.open(filename)
-    logging.info("Display image file on screen")
+def read_last_frame():
+    if os.path.isfile(last_frame_filename):
+        with open(last_frame_filename, 'rb') as frame_file:
+            return frame_file.read()
+    return None
 
-    if waveshare_epd75_version == "2B":
-        Limage_Other = Image.new('1', (epd.height, epd.width), 255)  # 255: clear the frame
-        epd.display(epd.getbuffer(Himage), epd.getbuffer(Limage_Other))
+
+def write_last_frame(frame):
+    with open(last_frame_filename, 'wb') as frame_file:
+        frame_file.write(frame)
+
+
+def supports_partial_refresh(epd):
+    """Only some drivers, such as epd7in5_V2, have a partial refresh"""
+    return hasattr(epd, "init_part") and hasattr(epd, "display_Partial")
+
+
+def get_partial_refresh_rectangles(epd, buffers, last_frame):
+    """
+    Returns the rectangles to partially refresh to go from `last_frame` to `buffers`,
+    or None if a full refresh is needed instead.
+    """
+    if len(buffers) != 1 or not supports_partial_refresh(epd) or partial_refresh_max_fraction <= 0:
+        return None
+
+    frame = bytes(buffers[0])
+    if last_frame is None or len(last_frame) != len(frame):
+        return None
+
+    rectangles = frame_diff.get_dirty_rectangles(last_frame, frame, epd.width, epd.height)
+    dirty_fraction = frame_diff.get_dirty_fraction(rectangles, epd.width, epd.height)
+    if dirty_fraction > partial_refresh_max_fraction:
+        logging.debug("{:.0%} of the screen changed, doing a full refresh".format(dirty_fraction))
+        return None
+    return rectangles
+
+
+def refresh_screen(epd, buffers, last_frame, full_clear=False):
+    """
+    Sends the packed `buffers` to `epd`, only redrawing the parts that differ from `last_frame`
+    when the driver can and not much has changed.  Puts the screen to sleep afterwards.
+    """
+    rectangles = None if full_clear else get_partial_refresh_rectangles(epd, buffers, last_frame)
+
+    if rectangles is not None:
+        logging.info("Partially refreshing {} area(s) of the screen".format(len(rectangles)))
+        epd.init_part()
+        for rectangle in rectangles:
+            # The driver reads the rectangle out of the whole frame
+            epd.display_Partial(buffers[0], *rectangle)
     else:
-        epd.display(epd.getbuffer(Himage))
+        logging.debug("Initialize screen")
+        epd.init()
+
+        if full_clear:
+            logging.debug("Clear screen")
+            epd.Clear()
+
+        logging.info("Display image file on screen")
+        epd.display(*buffers)
+
     epd.sleep()
 
-except IOError as e:
-    logging.exception(e)
 
-except KeyboardInterrupt:
-    logging.debug("Keyboard Interrupt - Exit")
-    epd7in5.epdconfig.module_exit()
-    exit()
+def display_image(Himage, force=False):
+    """
+    Show a PIL image on the screen, then put the screen to sleep.
+    Does nothing if the frame is the same as the one already on the screen,
+    unless `force` is set or the daily full clear is due.
+    `force` also makes it a full refresh.
+    Returns whether the screen was refreshed.
+    """
+    epd = get_epd()
+    inverted = framebuffer.is_inverted(waveshare_epd75_version)
+    return display_frame(framebuffer.pack_image(Himage, epd.width, epd.height, inverted), force)
+
+
+def display_frame(frame, force=False):
+    """
+    Show a frame already packed with framebuffer.pack_image on the screen, as `display_image` does.
+    Returns whether the screen was refreshed.
+    """
+    epd = get_epd()
+
+    inverted = framebuffer.is_inverted(waveshare_epd75_version)
+    buffers = [frame]
+    if waveshare_epd75_version == "2B":
+        # Nothing is drawn in red
+        buffers.append(framebuffer.get_blank_plane(epd.width, epd.height, inverted))
+
+    full_clear = is_full_clear_due(datetime.datetime.now())
+    frame = b"".join(bytes(buffer) for buffer in buffers)
+    last_frame = None if force else read_last_frame()
+    if not full_clear and frame == last_frame:
+        logging.info("Frame is unchanged, not refreshing the screen")
+        return False
+
+    refresh_screen(epd, buffers, last_frame, full_clear)
+
+    write_last_frame(frame)
+    return True
+
+
+def main():
+    try:
+        filename = sys.argv[1]
+        force = "--force" in sys.argv[2:]
+
+        logging.debug("Read image file: " + filename)
+        display_image(Image.open(filename), force)
+
+    except IOError as e:
+        logging.exception(e)
+
+    except KeyboardInterrupt:
+        logging.debug("Keyboard Interrupt - Exit")
+        get_epd_module().epdconfig.module_exit()
+        exit()
+
+
+if __name__ == "__main__":
+    configure_logging()
+    main()
@@ -0,0 +1,73 @@
+"""
+Runs the network fetches of a refresh at the same time, so that a refresh takes as long
+as the slowest source instead of the sum of all of them.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Any, NamedTuple
+
+
+class FetchResult(NamedTuple):
+    value: Any
+    error: Exception
+    seconds: float
+
+    def get(self):
+        """
+        Returns the fetched value, or raises the error the fetch failed with.
+        """
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+def get_fetch_timeout(name):
+    """
+    How long, in seconds, to wait for the `name` source.
+    Set with <NAME>_FETCH_TIMEOUT, or FETCH_TIMEOUT for all sources.
+    """
+    return float(os.getenv("{}_FETCH_TIMEOUT".format(name.upper()), os.getenv("FETCH_TIMEOUT", 60)))
+
+
+def fetch_all(fetches):
+    """
+    Calls every fetch function in `fetches`, a dictionary of name to (function, timeout), on its own thread.
+    Waits for each one for at most its timeout, measured from when they all started.
+    Returns a dictionary of name to `FetchResult`.
+    A fetch which times out is left running in the background; its thread won't keep the process alive.
+    """
+    outcomes = {name: {} for name in fetches}
+
+    def run(fetch, outcome):
+        started = time.perf_counter()
+        try:
+            outcome["value"] = fetch()
+        except Exception as error:
+            outcome["error"] = error
+        outcome["seconds"] = time.perf_counter() - started
+
+    threads = {}
+    for name, (fetch, timeout) in fetches.items():
+        threads[name] = threading.Thread(target=run, args=(fetch, outcomes[name]), name="fetch-" + name, daemon=True)
+        threads[name].start()
+
+    started = time.monotonic()
+    results = {}
+    for name, thread in threads.items():
+        timeout = fetches[name][1]
+        thread.join(max(0, started + timeout - time.monotonic()))
+
+        outcome = dict(outcomes[name])
+        if "seconds" not in outcome:
+            error = TimeoutError("Fetching {} took longer than {} seconds".format(name, timeout))
+            results[name] = FetchResult(None, error, time.monotonic() - started)
+        else:
+            results[name] = FetchResult(outcome.get("value"), outcome.get("error"), outcome["seconds"])
+
+        if results[name].error is not None:
+            logging.error("Fetching {} failed: {}".format(name, results[name].error))
+        logging.info("Fetched {} in {:.2f}s".format(name, results[name].seconds))
+
+    return results
@@ -0,0 +1,60 @@
+"""
+Finds which parts of a packed 1-bit frame changed since the previous one.
+
+A packed frame has one bit per pixel, eight pixels to a byte, and rows of `width // 8` bytes,
+which is what the Waveshare drivers' getbuffer() returns.
+Rectangles are (x0, y0, x1, y1) in pixels with exclusive ends.  x0 and x1 are always multiples
+of eight, since the panels can only be partially refreshed a whole byte at a time.
+"""
+
+
+def get_changed_columns(previous_row, current_row):
+    """
+    Returns the (first, last + 1) byte indexes at which two rows differ, or None if they're the same.
+    """
+    difference = int.from_bytes(previous_row, 'big') ^ int.from_bytes(current_row, 'big')
+    if not difference:
+        return None
+    row_bytes = len(current_row)
+    first = row_bytes - 1 - (difference.bit_length() - 1) // 8
+    last = row_bytes - 1 - ((difference & -difference).bit_length() - 1) // 8
+    return first, last + 1
+
+
+def get_dirty_rectangles(previous, current, width, height, merge_gap=16):
+    """
+    Returns the rectangles which cover every pixel that differs between two packed frames.
+    Changed rows which are fewer than `merge_gap` rows apart share a rectangle, so that a
+    line of text becomes one rectangle rather than one per row of pixels.
+    """
+    row_bytes = width // 8
+    rectangles = []
+    band = None  # [first column, top row, last column, bottom row], in bytes and rows
+
+    for y in range(height):
+        start = y * row_bytes
+        previous_row = previous[start:start + row_bytes]
+        current_row = current[start:start + row_bytes]
+        if previous_row == current_row:
+            continue
+
+        first, last = get_changed_columns(previous_row, current_row)
+        if band and y - band[3] <= merge_gap:
+            band[0] = min(band[0], first)
+            band[2] = max(band[2], last)
+            band[3] = y + 1
+        else:
+            if band:
+                rectangles.append(band)
+            band = [first, y, last, y + 1]
+
+    if band:
+        rectangles.append(band)
+
+    return [(x0 * 8, y0, x1 * 8, y1) for x0, y0, x1, y1 in rectangles]
+
+
+def get_dirty_fraction(rectangles, width, height):
+    """The share of the frame, from 0 to 1, that the rectangles cover"""
+    area = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in rectangles)
+    return area / float(width * height)
@@ -0,0 +1,44 @@
+"""
+Packs PIL images into the 1-bit frame buffers the Waveshare 7.5" screens take,
+instead of going through the driver's getbuffer(), which loops over the frame in Python.
+
+The result is the same as getbuffer(): eight pixels to a byte, most significant bit first,
+rows of `width // 8` bytes, and a portrait image is rotated to landscape first.
+The V2 and 2B drivers invert the bits, since a set bit is black on the screen but white in PIL.
+"""
+import logging
+from functools import lru_cache
+
+# WAVESHARE_EPD75_VERSION -> whether that driver's getbuffer() inverts the bits
+inverted_versions = {"1": False, "2": True, "2B": True}
+
+INVERT_TABLE = bytes(255 - value for value in range(256))
+
+
+def is_inverted(version):
+    return inverted_versions.get(version, True)
+
+
+@lru_cache(maxsize=None)
+def get_blank_plane(width, height, inverted):
+    """An all white frame buffer, packed once and reused for every refresh"""
+    return (b"\x00" if inverted else b"\xff") * (width // 8 * height)
+
+
+def pack_image(image, width, height, inverted):
+    """
+    Returns the frame buffer of `image` for a `width` x `height` screen.
+    """
+    image_width, image_height = image.size
+    if (image_width, image_height) == (width, height):
+        image = image.convert('1')
+    elif (image_width, image_height) == (height, width):
+        image = image.rotate(90, expand=True).convert('1')
+    else:
+        logging.warning("Wrong image dimensions: must be {}x{} but is {}x{}".format(width, height, image_width, image_height))
+        return get_blank_plane(width, height, inverted)
+
+    buffer = image.tobytes('raw')
+    if inverted:
+        buffer = buffer.translate(INVERT_TABLE)
+    return buffer
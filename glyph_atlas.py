@@ -0,0 +1,251 @@
+"""
+Draws the clock from a glyph atlas instead of having cairosvg lay out and rasterize its text every minute.
+
+The glyphs 0-9 and : are rasterized once per font, size, weight and colour, at each subpixel offset
+they're needed at, and a time is drawn by placing them one after the other, the same way cairosvg
+places the letters of a text.  This is only done for a clock which is a plain <text>, optionally with
+<tspan>s, whose only text is the clock placeholder; anything else is left to cairosvg.
+"""
+import logging
+import math
+import os
+from collections import OrderedDict
+from functools import lru_cache
+from typing import NamedTuple
+
+import cairocffi
+from cairosvg.colors import color
+from cairosvg.parser import Tree
+
+from rasterize import get_pixels
+
+CLOCK_NAMES = frozenset(("TIME_NOW", "HOUR_NOW"))
+ATLAS_CHARACTERS = frozenset("0123456789:")
+
+# Glyphs are placed to the nearest 1/SUBPIXELS of a pixel
+SUBPIXELS = 16
+
+# Attributes which change how a text is drawn in ways the atlas doesn't, unless they have one of these values
+UNSUPPORTED_ATTRIBUTES = {
+    "transform": ("none",), "dx": ("0",), "dy": ("0",), "rotate": ("0",), "letter-spacing": ("0", "normal"),
+    "stroke": ("none",), "opacity": ("1",), "fill-opacity": ("1",), "filter": ("none",), "mask": ("none",),
+    "clip-path": ("none",), "display-anchor": ("start",), "dominant-baseline": ("auto", "alphabetic"),
+    "alignment-baseline": ("auto", "baseline", "alphabetic"),
+}
+
+# cairosvg's default font size, 12pt at 300 dpi
+DEFAULT_FONT_SIZE = 12 * 300 / 72.
+
+max_clock_texts = 16
+
+# (document, width, height) -> ClockText or None
+clock_texts = OrderedDict()
+
+
+def can_draw(text):
+    return bool(text) and all(character in ATLAS_CHARACTERS for character in text)
+
+
+class GlyphAtlas:
+    """The glyphs of one font, size, weight and colour"""
+
+    def __init__(self, font_family, font_slant, font_weight, font_size, rgba):
+        self.font_family = font_family
+        self.font_slant = font_slant
+        self.font_weight = font_weight
+        self.font_size = font_size
+        self.rgba = rgba
+
+        # Only used to measure text
+        self.context = self.get_context(cairocffi.ImageSurface(cairocffi.FORMAT_ARGB32, 1, 1))
+
+        # (character, x offset, y offset) -> ((x, y), premultiplied BGRA array)
+        self.glyphs = {}
+
+    def get_context(self, surface):
+        context = cairocffi.Context(surface)
+        context.select_font_face(self.font_family, self.font_slant, self.font_weight)
+        context.set_font_size(self.font_size)
+        return context
+
+    def get_glyph(self, character, x_offset, y_offset):
+        """
+        The glyph drawn at (`x_offset`, `y_offset`), which are fractions of a pixel.
+        Returns where its top left corner is relative to the pixel it's drawn at, and its pixels.
+        """
+        key = (character, x_offset, y_offset)
+        glyph = self.glyphs.get(key)
+        if glyph is None:
+            x_bearing, y_bearing, width, height = self.context.text_extents(character)[:4]
+            left = math.floor(x_offset + x_bearing) - 1
+            top = math.floor(y_offset + y_bearing) - 1
+            right = math.ceil(x_offset + x_bearing + width) + 1
+            bottom = math.ceil(y_offset + y_bearing + height) + 1
+
+            surface = cairocffi.ImageSurface(cairocffi.FORMAT_ARGB32, right - left, bottom - top)
+            context = self.get_context(surface)
+            context.move_to(x_offset - left, y_offset - top)
+            context.text_path(character)
+            context.set_source_rgba(*self.rgba)
+            context.fill()
+
+            glyph = (left, top), get_pixels(surface)
+            self.glyphs[key] = glyph
+        return glyph
+
+    def get_overlays(self, text, x, y, text_anchor):
+        """
+        Returns the glyphs of `text` with their baseline starting at (`x`, `y`), as compositor overlays.
+        """
+        x_bearing, _, width = self.context.text_extents(text)[:3]
+        if text_anchor == 'middle':
+            x -= width / 2. + x_bearing
+        elif text_anchor == 'end':
+            x -= width + x_bearing
+
+        overlays = []
+        for character in text:
+            pixel_x, x_offset = split_position(x)
+            pixel_y, y_offset = split_position(y)
+            (left, top), pixels = self.get_glyph(character, x_offset, y_offset)
+            overlays.append(((pixel_x + left, pixel_y + top), pixels))
+            x += self.context.text_extents(character)[4]
+        return overlays
+
+
+def split_position(position):
+    """Splits a position into a whole pixel and the rest, to the nearest 1/SUBPIXELS"""
+    pixel = math.floor(position)
+    offset = round((position - pixel) * SUBPIXELS)
+    if offset == SUBPIXELS:
+        return pixel + 1, 0.
+    return pixel, offset / float(SUBPIXELS)
+
+
+@lru_cache(maxsize=None)
+def get_atlas(font_family, font_slant, font_weight, font_size, rgba):
+    logging.debug("get_atlas() - Glyph atlas for {} {}px".format(font_family, font_size))
+    return GlyphAtlas(font_family, font_slant, font_weight, font_size, rgba)
+
+
+class ClockText(NamedTuple):
+    """Where and how a template draws its clock"""
+    atlas: GlyphAtlas
+    x: float
+    y: float
+    text_anchor: str
+
+    def get_overlays(self, text):
+        return self.atlas.get_overlays(text, self.x, self.y, self.text_anchor)
+
+
+def get_pixel_size(string):
+    """A length in pixels, for the units a template is likely to use, or None"""
+    if not string:
+        return None
+    try:
+        if string.endswith("px"):
+            return float(string[:-2])
+        return float(string)
+    except ValueError:
+        return None
+
+
+def get_position(values):
+    """The last of a list of x or y attributes in pixels, 0 if there are none, or None if it's a list of positions"""
+    if not values:
+        return 0.
+    value = values[-1].strip()
+    if ' ' in value or ',' in value:
+        return None
+    return get_pixel_size(value)
+
+
+def find_clock_node(tree, marker):
+    """
+    Returns the chain of nodes from the top level element down to the text node showing `marker`,
+    or None if the top level element is anything other than a text with only the marker as its text.
+    """
+    elements = [child for child in tree.children if child.tag not in ('defs', 'style')]
+    if len(elements) != 1 or elements[0].tag != 'text':
+        return None
+
+    found = []
+
+    def visit(node, chain):
+        if node.tag not in ('text', 'tspan') or any(
+                attribute in node and node[attribute].strip() not in values
+                for attribute, values in UNSUPPORTED_ATTRIBUTES.items()):
+            return False
+        chain = chain + [node]
+        if node.text:
+            if node.text != marker or found:
+                return False
+            found.append(chain)
+        return all(visit(child, chain) for child in node.children)
+
+    if not visit(elements[0], []) or not found:
+        return None
+    return found[0]
+
+
+def parse_clock_text(document, marker, svg_filename, width, height):
+    """
+    Works out where and how the overlay `document` draws `marker`, as long as that's something the
+    atlas can draw exactly like cairosvg would.
+    """
+    tree = Tree(bytestring=document.encode('utf-8'), url=os.path.abspath(svg_filename), unsafe=True)
+
+    # The template has to be drawn at its own size, without scaling
+    if get_pixel_size(tree.get('width')) != width or get_pixel_size(tree.get('height')) != height:
+        return None
+    if tree.get('viewBox') and tree.get('viewBox').replace(',', ' ').split() != ['0', '0', str(width), str(height)]:
+        return None
+
+    chain = find_clock_node(tree, marker)
+    if chain is None:
+        return None
+
+    node = chain[-1]
+    font_size = get_pixel_size(node.get('font-size')) if node.get('font-size') else DEFAULT_FONT_SIZE
+    fill = node.get('fill', 'black')
+    if font_size is None or fill in ('none', 'transparent') or fill.startswith('url(') or node.get('visibility') == 'hidden':
+        return None
+
+    # A tspan without a position carries on from where its parent, which doesn't draw anything itself, starts
+    x = get_position([ancestor.get('x') for ancestor in chain if 'x' in ancestor])
+    y = get_position([ancestor.get('y') for ancestor in chain if 'y' in ancestor])
+    if x is None or y is None:
+        return None
+
+    # The same choice of font as cairosvg
+    font_family = (node.get('font-family') or 'sans-serif').split(',')[0].strip('"\' ')
+    font_slant = getattr(cairocffi, 'FONT_SLANT_{}'.format(node.get('font-style')).upper(), cairocffi.FONT_SLANT_NORMAL)
+    font_weight = node.get('font-weight')
+    if font_weight and font_weight.isdigit() and int(font_weight) >= 550:
+        font_weight = 'bold'
+    font_weight = getattr(cairocffi, 'FONT_WEIGHT_{}'.format(font_weight).upper(), cairocffi.FONT_WEIGHT_NORMAL)
+    rgba = color(fill)
+
+    atlas = get_atlas(font_family, font_slant, font_weight, font_size, rgba)
+    return ClockText(atlas, x, y, node.get('text-anchor'))
+
+
+def get_clock_text(document, marker, svg_filename, width, height):
+    """
+    Returns the `ClockText` for an overlay document with `marker` where the clock goes, or None if the
+    atlas can't draw it.  Documents are only parsed the first time they're seen.
+    """
+    key = (document, width, height)
+    if key in clock_texts:
+        clock_texts.move_to_end(key)
+        return clock_texts[key]
+
+    clock_text = parse_clock_text(document, marker, svg_filename, width, height)
+    if clock_text is None:
+        logging.debug("get_clock_text() - {} is drawn by cairosvg".format(marker))
+
+    clock_texts[key] = clock_text
+    if len(clock_texts) > max_clock_texts:
+        clock_texts.popitem(last=False)
+    return clock_text
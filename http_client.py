@@ -0,0 +1,58 @@
+"""
+The HTTP session every provider goes through.
+
+Connections are kept alive and pooled per host, so a second request to the same host, like
+weather.gov's points lookup followed by its forecast, doesn't need another TLS handshake.
+Every request has a connect and a read timeout, GET requests which fail to connect or get a
+429 or 5xx are retried a few times with a jittered backoff, and responses are compressed
+with gzip, or brotli when it's installed.
+"""
+import os
+import random
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import make_headers
+from urllib3.util.retry import Retry
+
+connect_timeout = float(os.getenv("HTTP_CONNECT_TIMEOUT", 10))
+read_timeout = float(os.getenv("HTTP_READ_TIMEOUT", 30))
+max_retries = int(os.getenv("HTTP_RETRIES", 3))
+
+
+class JitteredRetry(Retry):
+    """
+    Waits a random time of up to the exponential backoff before retrying,
+    so that many screens which fail at the same time don't all retry together.
+    """
+
+    def get_backoff_time(self):
+        return random.uniform(0, super().get_backoff_time())
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """Uses the default timeouts for requests which don't set their own"""
+
+    def send(self, request, timeout=None, **kwargs):
+        if timeout is None:
+            timeout = (connect_timeout, read_timeout)
+        return super().send(request, timeout=timeout, **kwargs)
+
+
+def create_session():
+    retry = JitteredRetry(total=max_retries,
+                          backoff_factor=1,
+                          status_forcelist=(429, 500, 502, 503, 504),
+                          allowed_methods=frozenset(("GET", "HEAD")),
+                          raise_on_status=False)
+    adapter = TimeoutHTTPAdapter(pool_connections=8, pool_maxsize=8, max_retries=retry)
+
+    new_session = requests.Session()
+    new_session.mount("https://", adapter)
+    new_session.mount("http://", adapter)
+    new_session.headers["Accept-Encoding"] = make_headers(accept_encoding=True)["accept-encoding"]
+    return new_session
+
+
+# Shared between calls so that a long running process keeps its connections alive.
+session = create_session()
@@ -0,0 +1,131 @@
+"""
+Keeps the weather icons rasterized, as 1-bit bitmaps in memory and in cache_icons/, so that an icon
+is only parsed and rasterized the first time it's shown at a given place and screen size.
+
+A layer which only references SVG files in icons/ is looked up by a hash of its text, the screen size
+and the content of the icons, so editing an icon file makes it be rasterized again.
+The bitmap is the layer dithered over white, and its black pixels are drawn over the frame.
+"""
+import hashlib
+import logging
+import os
+import struct
+from collections import OrderedDict
+
+import numpy
+from PIL import Image
+
+from rasterize import USE_HREF_PATTERN, get_pixels, rasterize_drawn_area
+
+icon_dir = "icons"
+cache_dir = "cache_icons"
+
+# x, y, width, height of the bitmap, followed by its rows, eight pixels to a byte
+HEADER = struct.Struct("<iiII")
+
+max_icons = 64
+
+# key -> ((x, y), premultiplied BGRA array) or None
+icons = OrderedDict()
+
+
+def is_icon_layer(document):
+    """Whether the only SVG files a layer document references are icons"""
+    hrefs = USE_HREF_PATTERN.findall(document)
+    return bool(hrefs) and all(os.path.dirname(os.path.normpath(href)) == icon_dir for href in hrefs)
+
+
+def get_key(document, base_dir, width, height):
+    """
+    A hash of everything the rasterized layer depends on, or None if an icon it references doesn't exist.
+    """
+    key = hashlib.sha1()
+    key.update("{}x{}\0{}".format(width, height, document).encode('utf-8'))
+    for href in sorted(set(USE_HREF_PATTERN.findall(document))):
+        filename = os.path.join(base_dir, href)
+        if not os.path.isfile(filename):
+            return None
+        with open(filename, 'rb') as icon_file:
+            key.update(b"\0" + href.encode('utf-8') + b"\0" + hashlib.sha1(icon_file.read()).digest())
+    return key.hexdigest()
+
+
+def pack_overlay(overlay):
+    """Dithers a rasterized layer over white and packs it into a 1-bit bitmap with its position"""
+    (x, y), pixels = overlay
+    height, width = pixels.shape[:2]
+    # Premultiplied, so over white is the colour plus whatever the alpha lets through
+    over_white = pixels[:, :, :3].astype(numpy.uint32) + (255 - pixels[:, :, 3:4])
+    grey = (over_white[:, :, 2] * 299 + over_white[:, :, 1] * 587 + over_white[:, :, 0] * 114) // 1000
+    bitmap = Image.fromarray(grey.astype(numpy.uint8), 'L').convert('1')
+    return HEADER.pack(x, y, width, height) + bitmap.tobytes()
+
+
+def unpack_overlay(data):
+    """
+    The compositor overlay of a packed bitmap: its black pixels, with everything else transparent.
+    None for an empty bitmap.
+    """
+    x, y, width, height = HEADER.unpack_from(data)
+    if not width or not height:
+        return None
+    bitmap = Image.frombytes('1', (width, height), data[HEADER.size:])
+    pixels = numpy.zeros((height, width, 4), numpy.uint8)
+    pixels[:, :, 3] = numpy.where(numpy.array(bitmap), 0, 255)
+    return (x, y), pixels
+
+
+def read_cached_icon(key):
+    """A list of the compositor overlay of a cached icon, which may be None, or None if it isn't cached"""
+    filename = os.path.join(cache_dir, key + ".bin")
+    if not os.path.isfile(filename):
+        return None
+    try:
+        with open(filename, 'rb') as cache_file:
+            return [unpack_overlay(cache_file.read())]
+    except (OSError, ValueError, struct.error) as error:
+        logging.warning("Ignoring the cached icon {}: {}".format(filename, error))
+        return None
+
+
+def write_cached_icon(key, data):
+    os.makedirs(cache_dir, exist_ok=True)
+    filename = os.path.join(cache_dir, key + ".bin")
+    with open(filename + ".tmp", 'wb') as cache_file:
+        cache_file.write(data)
+    os.replace(filename + ".tmp", filename)
+
+
+def get_icon_overlay(document, svg_filename, width, height):
+    """
+    Returns the compositor overlay of an icon layer document, from memory, from disk, or by
+    rasterizing it.  Returns None if nothing is drawn.
+    """
+    base_dir = os.path.dirname(os.path.abspath(svg_filename))
+    key = get_key(document, base_dir, width, height)
+    if key is None:
+        logging.warning("Missing icon in {}".format(", ".join(set(USE_HREF_PATTERN.findall(document)))))
+        return None
+
+    if key in icons:
+        icons.move_to_end(key)
+        return icons[key]
+
+    cached = read_cached_icon(key)
+    if cached is not None:
+        overlay = cached[0]
+    else:
+        logging.debug("get_icon_overlay() - Rasterizing {}".format(", ".join(set(USE_HREF_PATTERN.findall(document)))))
+        drawn = rasterize_drawn_area(document, svg_filename, width, height)
+        if drawn is None:
+            data = HEADER.pack(0, 0, 0, 0)
+        else:
+            position, area = drawn
+            data = pack_overlay((position, get_pixels(area)))
+        write_cached_icon(key, data)
+        overlay = unpack_overlay(data)
+
+    icons[key] = overlay
+    if len(icons) > max_icons:
+        icons.popitem(last=False)
+    return overlay
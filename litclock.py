@@ -0,0 +1,330 @@
+"""
+Draws the literature clock, and renders all of its frames ahead of time.
+
+What the clock shows only depends on the minute and the quotes, so whenever the quotes change every
+minute which has a quote is rendered, with a process pool, and packed for the screen.  The frames are
+kept, compressed, in cache.db, and showing the time is then looking up a frame and sending it to the
+screen.  A minute without a quote shows the frame of the nearest earlier minute.  The frames are
+counted and evicted with the rest of the cache, and rendered again when they've been evicted, unless
+they were evicted as soon as they were rendered, as they don't fit in CACHE_MAX_BYTES.
+
+    python3 litclock.py render
+"""
+import argparse
+import fcntl
+import logging
+import math
+import os
+import re
+import subprocess
+import sys
+import textwrap
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import framebuffer
+from cache_store import cache_store
+from pipeline import get_screen_size
+from quote_index import get_index_version, get_minute, get_quotes, get_quotes_by_minute
+from utility import configure_logging
+
+url = "https://raw.githubusercontent.com/JohannesNE/literature-clock/master/litclock_annotated.csv"
+output_svg_filename = 'screen-literature-clock.svg'
+# Held by the process rendering all the frames, so that only one does
+render_lock_filename = "cache_litclock_render.lock"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS clock_frames (
+    version TEXT NOT NULL,
+    screen TEXT NOT NULL,
+    minute INTEGER NOT NULL,
+    frame BLOB NOT NULL,
+    PRIMARY KEY (version, screen, minute)
+);
+CREATE TABLE IF NOT EXISTS clock_frame_sets (
+    version TEXT NOT NULL,
+    screen TEXT NOT NULL,
+    PRIMARY KEY (version, screen)
+);
+CREATE TABLE IF NOT EXISTS clock_frame_failures (
+    version TEXT NOT NULL,
+    screen TEXT NOT NULL,
+    max_bytes INTEGER NOT NULL,
+    PRIMARY KEY (version, screen)
+);
+"""
+SIZE_QUERY = "SELECT COALESCE(SUM(length(frame)), 0) FROM clock_frames"
+
+
+def choose_quote(time_rows):
+    # return random.choice(time_rows)
+    return min(time_rows, key=lambda x: len(x["full_quote"]))
+
+
+def get_svg(chosen_item):
+    """The SVG document of the clock showing a quote"""
+    quote = chosen_item["full_quote"]
+    book = chosen_item["book_title"]
+    author = chosen_item["author_name"]
+    human_time = chosen_item["time_human"]
+
+    # replace newlines with spaces
+    quote = quote.replace("<br/>", " ")
+    quote = quote.replace("<br />", " ")
+    quote = quote.replace("<br>", " ")
+    quote = quote.replace(u"\u00A0", " ")  # non breaking space
+
+    # replace punctuation with simpler counterparts
+    transl_table = dict([(ord(x), ord(y)) for x, y in zip(u"‘’´“”—–-",  u"'''\"\"---")])
+    quote = quote.translate(transl_table)
+    human_time = human_time.translate(transl_table)
+    quote = quote.encode('ascii', 'ignore').decode('utf-8')
+    human_time = human_time.encode('ascii', 'ignore').decode('utf-8')
+
+    quote_length = len(quote)
+
+    # Try to calculate font size and max chars based on quote length
+    goes_into = (quote_length / 100) if quote_length > 80 else 0
+    font_size = 60 - (goes_into * 8)
+    max_chars_per_line = 23 + (goes_into * 6)
+
+    # Some upper and lower limit adjustments
+    font_size = 25 if font_size < 25 else font_size
+    max_chars_per_line = 55 if max_chars_per_line > 55 else max_chars_per_line
+
+    font_size = math.ceil(font_size)
+    max_chars_per_line = math.floor(max_chars_per_line)
+
+    attribution = f"- {book}, {author}"
+    if len(attribution) > 55:
+        attribution = attribution[:55] + "…"
+
+    logging.debug(f"Quote length: {quote_length}, Font size: {font_size}, Max chars per line: {max_chars_per_line}")
+
+    quote_pattern = re.compile(re.escape(human_time), re.IGNORECASE)
+    # Replace human time by itself but surrounded by pipes for later processing.
+    quote = quote_pattern.sub(lambda x: f"|{x.group()}|", quote, count=1)
+
+    lines = textwrap.wrap(quote, width=max_chars_per_line, break_long_words=True)
+
+    generated_quote = ""
+    time_ends_on_next_line = False
+    for line in lines:
+        start_span = ""
+        end_span = ""
+
+        if line.count("|") == 2:
+            line = line.replace("|", "<tspan style='font-weight:bold;'>", 1)
+            line = line.replace("|", "</tspan>", 1)
+
+        if line.count("|") == 1 and not time_ends_on_next_line:
+            line = line.replace("|", "<tspan style='font-weight:bold;'>", 1)
+            time_ends_on_next_line = True
+            end_span = "</tspan>"
+
+        if line.count("|") == 1 and time_ends_on_next_line:
+            line = line.replace("|", "</tspan>", 1)
+            time_ends_on_next_line = False
+            start_span = "<tspan style='font-weight:bold;'>"
+
+        generated_quote += f"""
+            <tspan x="33" dy="1.2em">{start_span}{line}{end_span}</tspan>
+        """
+    generated_quote += f"""
+            <tspan x="150" dy="1.5em" style="font-size:18px;">{attribution}</tspan>
+    """
+
+    return f"""<?xml version="1.0" encoding="UTF-8" standalone="no"?>
+<svg height="480" width="800" version="1.1">
+        <rect width="800" height="480" id="rect3855" fill="white" />
+
+        <text id="quote" x="33" y="15" style="font-size:{font_size}px;line-height:0%;font-family:'Noto Serif',serif;text-anchor:beginning">
+
+                {generated_quote}
+        </text>
+</svg>
+
+"""
+
+
+def get_screen():
+    """The size of the screen and whether its bits are inverted, which the packed frames depend on"""
+    width, height = get_screen_size()
+    return width, height, framebuffer.is_inverted(os.getenv("WAVESHARE_EPD75_VERSION", "2"))
+
+
+def get_screen_key(screen):
+    width, height, inverted = screen
+    return "{}x{}{}".format(width, height, " inverted" if inverted else "")
+
+
+def render_frame(minute, chosen_item, screen):
+    """
+    Renders the clock showing a quote, packed for the screen and compressed.
+    Runs in the worker processes, so it mustn't use the cache.
+    """
+    from rasterize import rasterize
+    width, height, inverted = screen
+    image = rasterize(get_svg(chosen_item), output_svg_filename, width, height)
+    return minute, zlib.compress(framebuffer.pack_image(image, width, height, inverted))
+
+
+def create_tables():
+    # clock_frame_failures isn't part of the index, so that it outlives the frames being evicted
+    cache_store.add_index("clock_frames", SCHEMA, ("clock_frames", "clock_frame_sets"), SIZE_QUERY)
+
+
+def put_frame(version, screen, minute, frame):
+    def statements(connection):
+        connection.execute("INSERT OR REPLACE INTO clock_frames (version, screen, minute, frame) VALUES (?, ?, ?, ?)",
+                           (version, get_screen_key(screen), minute, frame))
+        cache_store.use_index(connection, "clock_frames")
+        cache_store.evict(connection)
+
+    cache_store.transaction(statements)
+
+
+def get_frame(version, screen, minute):
+    """The packed frame of a minute which has a quote, or None if it hasn't been rendered"""
+    def statements(connection):
+        cache_store.use_index(connection, "clock_frames")
+        return connection.execute("SELECT frame FROM clock_frames WHERE version = ? AND screen = ? AND minute = ?",
+                                  (version, get_screen_key(screen), minute)).fetchone()
+
+    create_tables()
+    row = cache_store.transaction(statements)
+    return None if row is None else zlib.decompress(row[0])
+
+
+def has_all_frames(version, screen):
+    create_tables()
+    return cache_store.transaction(lambda connection: connection.execute(
+        "SELECT 1 FROM clock_frame_sets WHERE version = ? AND screen = ?",
+        (version, get_screen_key(screen))).fetchone()) is not None
+
+
+def has_failed(version, screen):
+    """Whether the frames were evicted as soon as they were rendered, with a CACHE_MAX_BYTES no larger than now"""
+    create_tables()
+    return cache_store.transaction(lambda connection: connection.execute(
+        "SELECT 1 FROM clock_frame_failures WHERE version = ? AND screen = ? AND max_bytes >= ?",
+        (version, get_screen_key(screen), cache_store.max_bytes)).fetchone()) is not None
+
+
+def needs_rendering(version, screen):
+    return not has_all_frames(version, screen) and not has_failed(version, screen)
+
+
+def set_failed(version, screen, failed):
+    def statements(connection):
+        connection.execute("DELETE FROM clock_frame_failures WHERE screen = ?", (get_screen_key(screen),))
+        if failed:
+            connection.execute("INSERT INTO clock_frame_failures (version, screen, max_bytes) VALUES (?, ?, ?)",
+                               (version, get_screen_key(screen), cache_store.max_bytes))
+
+    cache_store.transaction(statements)
+
+
+def render_all_frames(version, screen, processes=None):
+    """
+    Renders the frame of every minute which has a quote with a pool of `processes`, by default
+    one per core, and replaces the frames of older quotes.  If the frames don't fit in the cache,
+    that's recorded so that they aren't rendered again for the same quotes and CACHE_MAX_BYTES.
+    Returns how many frames were rendered.
+    """
+    quotes_by_minute = get_quotes_by_minute(version)
+    processes = processes or os.cpu_count() or 1
+    screen_key = get_screen_key(screen)
+    logging.info("Rendering {} frames for {} with {} processes".format(len(quotes_by_minute), screen_key, processes))
+
+    create_tables()
+    started = time.perf_counter()
+    minutes = list(quotes_by_minute)
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        frames = list(executor.map(render_frame, minutes,
+                                   [choose_quote(quotes_by_minute[minute]) for minute in minutes],
+                                   [screen] * len(minutes), chunksize=8))
+    seconds = time.perf_counter() - started
+
+    def statements(connection):
+        connection.execute("DELETE FROM clock_frames WHERE version != ? AND screen = ?", (version, screen_key))
+        connection.executemany("INSERT OR REPLACE INTO clock_frames (version, screen, minute, frame) VALUES (?, ?, ?, ?)",
+                               [(version, screen_key, minute, frame) for minute, frame in frames])
+        connection.execute("DELETE FROM clock_frame_sets WHERE screen = ?", (screen_key,))
+        connection.execute("INSERT INTO clock_frame_sets (version, screen) VALUES (?, ?)", (version, screen_key))
+        cache_store.use_index(connection, "clock_frames")
+        cache_store.evict(connection)
+
+    cache_store.transaction(statements)
+    frame_bytes = sum(len(frame) for _, frame in frames)
+    failed = not has_all_frames(version, screen)
+    set_failed(version, screen, failed)
+    if failed:
+        logging.warning("The frames were evicted as soon as they were rendered, and won't be rendered again until "
+                        "CACHE_MAX_BYTES is more than {} bytes".format(frame_bytes))
+    logging.info("Rendered {} frames in {:.1f}s: {:.1f} frames/s, {:.2f} frames/s per process, {} KB compressed".format(
+        len(frames), seconds, len(frames) / seconds, len(frames) / seconds / processes, frame_bytes // 1024))
+    return len(frames)
+
+
+def render_all_frames_in_background():
+    """Starts `litclock.py render` on its own, which does nothing if it's already running"""
+    logging.info("Rendering all the frames in the background")
+    subprocess.Popen([sys.executable, os.path.abspath(__file__), "render", "--if-needed"],
+                     start_new_session=True, stdin=subprocess.DEVNULL)
+
+
+def get_current_frame(now):
+    """
+    The packed frame of the clock at `now`, rendering it if it hasn't been yet, or None if there are no quotes.
+    Starts rendering all the frames in the background if the quotes have changed.
+    """
+    version = get_index_version(url, 86400)
+    screen = get_screen()
+
+    # The quotes for this minute, or for the nearest earlier minute that has any
+    time_rows = get_quotes(version, now.hour * 60 + now.minute)
+    if len(time_rows) == 0:
+        logging.error("No quotes found.")
+        return None
+    chosen_item = choose_quote(time_rows)
+    logging.info(chosen_item)
+    minute = get_minute(chosen_item["time"])
+
+    frame = get_frame(version, screen, minute)
+    if frame is None:
+        logging.info("The frame for {} isn't rendered yet, rendering it".format(chosen_item["time"]))
+        minute, compressed = render_frame(minute, chosen_item, screen)
+        put_frame(version, screen, minute, compressed)
+        frame = zlib.decompress(compressed)
+    if needs_rendering(version, screen):
+        render_all_frames_in_background()
+    return frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render all the frames of the literature clock")
+    parser.add_argument("command", choices=("render",))
+    parser.add_argument("--processes", type=int, help="How many processes to render with, by default one per core")
+    parser.add_argument("--if-needed", action="store_true", help="Only render if the quotes have changed")
+    args = parser.parse_args()
+
+    with open(render_lock_filename, 'w') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            logging.info("The frames are already being rendered")
+            return 0
+
+        version = get_index_version(url, 86400)
+        screen = get_screen()
+        if args.if_needed and not needs_rendering(version, screen):
+            return 0
+        render_all_frames(version, screen, args.processes)
+    return 0
+
+
+if __name__ == "__main__":
+    configure_logging()
+    sys.exit(main())
@@ -1,6 +1,6 @@
 import logging
 import datetime
-import requests
+from http_client import session
 from calendar_providers.outlook import OutlookCalendar
 from utility import configure_logging
 
@@ -18,7 +18,7 @@ def main():
 
         headers = {'Authorization': 'Bearer ' + access_token}
 
-        calendars_data = requests.get(endpoint_calendar_list, headers=headers).json()
+        calendars_data = session.get(endpoint_calendar_list, headers=headers).json()
 
         print("")
         print("Here are the available Calendar names and IDs.  Copy the ID of the Calendar you want into env.sh")
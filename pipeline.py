@@ -0,0 +1,187 @@
+#!/usr/bin/python3
+"""
+Runs every stage of a screen refresh in a single process.
+
+This replaces the chain of screen-*-get.py, cairosvg and display.py invocations in run.sh.
+Each stage returns its template values, which are merged and written to the SVG
+with a single call to update_svg.  The individual scripts still work on their own.
+Stages are imported when they are first needed, after the locale has been configured.
+"""
+import datetime
+import importlib.util
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+from fetch import fetch_all, get_fetch_timeout
+from utility import configure_logging, configure_locale, update_svg
+
+output_svg_filename = "screen-output-weather.svg"
+output_png_filename = "screen-output.png"
+custom_script_filename = "screen-custom-get.py"
+custom_svg_filename = "screen-output-custom-temp.svg"
+
+
+@contextmanager
+def timed_stage(name, timings):
+    """Records the wall-clock time of the enclosed block in `timings`"""
+    logging.info("Stage: {}".format(name))
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = time.perf_counter() - started
+
+
+def merge_output(output_dict, stage_output):
+    """
+    Adds a stage's template values to `output_dict`.
+    When two stages set the same key the earlier stage wins, as it did when each
+    script replaced its keys in the SVG before the next script ran.
+    """
+    for key, value in stage_output.items():
+        output_dict.setdefault(key, value)
+
+
+def get_screen_size():
+    """Returns the (width, height) of the panel, as run.sh exports it"""
+    if os.getenv("WAVESHARE_EPD75_VERSION", "2") == "1":
+        default_width, default_height = 640, 384
+    else:
+        default_width, default_height = 800, 480
+    return (int(os.getenv("WAVESHARE_WIDTH", default_width)),
+            int(os.getenv("WAVESHARE_HEIGHT", default_height)))
+
+
+@lru_cache(maxsize=None)
+def load_custom_module():
+    spec = importlib.util.spec_from_file_location("screen_custom_get", custom_script_filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_custom_stage():
+    """
+    Runs the user's screen-custom-get.py, which writes its own SVG that the template references.
+    """
+    if os.path.isfile(custom_script_filename):
+        load_custom_module().main()
+    elif not os.path.isfile(custom_svg_filename):
+        # Create temporary empty svg since the main SVG needs it
+        with open(custom_svg_filename, "w") as custom_svg:
+            custom_svg.write("<svg />\n")
+
+
+def get_fetches(template_name):
+    """
+    The network fetches needed by the layout, for `fetch.fetch_all`.
+    """
+    from stages import calendar_events
+
+    if template_name == "7":
+        from stages import todo
+        fetches = {"todo": (todo.get_todos, get_fetch_timeout("todo"))}
+    else:
+        from stages import weather
+        location_lat, location_long = weather.get_location()
+        units, _ = weather.get_units()
+        fetches = weather.get_fetches(location_lat, location_long, units)
+
+    fetches["calendar"] = (calendar_events.get_calendar_events, get_fetch_timeout("calendar"))
+    return fetches
+
+
+def build_output_dict(template_name, timings):
+    """
+    Fetches the data for the layout and returns the merged template values.
+    Returns None if the weather could not be fetched.
+    """
+    output_dict = {}
+
+    with timed_stage("fetch", timings):
+        results = fetch_all(get_fetches(template_name))
+
+    if template_name == "7":
+        from stages import noweather, todo
+
+        todos = results["todo"].get()
+        merge_output(output_dict, noweather.get_output_dict(datetime.datetime.now(), len(todos)))
+        merge_output(output_dict, todo.get_output_dict(todos))
+    else:
+        from stages import weather
+
+        weather_data = results["weather"].get()
+        if not weather_data:
+            logging.error("Unable to fetch weather. SVG will not be updated.")
+            return None
+        alert_message = results["alert"].get() if "alert" in results else ""
+        _, degrees = weather.get_units()
+        merge_output(output_dict, weather.get_weather_output_dict(weather_data, alert_message, degrees))
+        merge_output(output_dict, weather.get_clock_output_dict(datetime.datetime.now()))
+
+    from stages import calendar_events
+
+    merge_output(output_dict, calendar_events.get_output_dict(results["calendar"].get()))
+
+    # Only layouts 5 and 6 show a calendar, so save a few seconds.
+    if template_name in ("5", "6"):
+        from stages import calendar_month
+
+        with timed_stage("calendar_month", timings):
+            merge_output(output_dict, calendar_month.get_output_dict())
+
+    with timed_stage("custom", timings):
+        run_custom_stage()
+
+    return output_dict
+
+
+def log_timings(timings):
+    logging.info("Stage timings: {} (total {:.2f}s)".format(
+        ", ".join("{}={:.2f}s".format(name, seconds) for name, seconds in timings.items()),
+        sum(timings.values())))
+
+
+def render_screen(template_name, output_dict, timings):
+    """
+    Writes the template values to the SVG, rasterizes it and shows it on the screen.
+    """
+    template_svg_filename = f"screen-template.{template_name}.svg"
+    with timed_stage("svg", timings):
+        logging.info(f"Updating SVG using template {template_name}")
+        svg_text = update_svg(template_svg_filename, output_svg_filename, output_dict)
+
+    with timed_stage("png", timings):
+        from compositor import rasterize_template
+        width, height = get_screen_size()
+        image = rasterize_template(template_svg_filename, svg_text, output_svg_filename, width, height,
+                                   output_dict, output_png_filename)
+
+    with timed_stage("display", timings):
+        import display
+        display.display_image(image)
+
+
+def main():
+    template_name = os.getenv("SCREEN_LAYOUT", "6")
+    timings = {}
+
+    output_dict = build_output_dict(template_name, timings)
+    if output_dict is None:
+        log_timings(timings)
+        return 1
+
+    render_screen(template_name, output_dict, timings)
+
+    log_timings(timings)
+    return 0
+
+
+if __name__ == "__main__":
+    configure_locale()
+    configure_logging()
+    sys.exit(main())
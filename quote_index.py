@@ -0,0 +1,135 @@
+"""
+An index of the literature clock quotes by minute of the day, kept in a table of cache.db, so that
+showing the time is a lookup of the few quotes for that minute instead of reading the whole CSV.
+
+The index is built when the CSV is downloaded: it's the projection of the response, so what's cached
+as the response is only the version of the index, a hash of the CSV it was built from.
+Quotes marked nsfw aren't indexed.  The index is counted and evicted with the rest of the cache,
+and is built again, from a fresh download, when it's been evicted.
+"""
+import csv
+import hashlib
+import io
+import logging
+
+from cache_store import cache_store, get_key as get_cache_key
+from utility import fetch_text_from_url, get_text_from_url
+
+FIELDNAMES = ["time", "time_human", "full_quote", "book_title", "author_name", "sfw"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS quotes (
+    version TEXT NOT NULL,
+    minute INTEGER NOT NULL,
+    time TEXT NOT NULL,
+    time_human TEXT NOT NULL,
+    full_quote TEXT NOT NULL,
+    book_title TEXT NOT NULL,
+    author_name TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS quotes_minute ON quotes (version, minute);
+"""
+SIZE_QUERY = "SELECT COALESCE(SUM(length(time) + length(time_human) + length(full_quote) + length(book_title) " \
+             "+ length(author_name)), 0) FROM quotes"
+
+
+def create_table():
+    cache_store.add_index("quotes", SCHEMA, ("quotes",), SIZE_QUERY)
+
+
+def get_minute(time):
+    """The minute of the day of a time such as 07:32, or None if it isn't one"""
+    try:
+        hours, minutes = time.split(":")
+        minute = int(hours) * 60 + int(minutes)
+    except ValueError:
+        return None
+    return minute if 0 <= minute < 24 * 60 else None
+
+
+def read_quotes(text):
+    """The quotes in the literature clock CSV, as dictionaries of its columns"""
+    with io.StringIO(text) as file:
+        reader = csv.DictReader(file,
+                                fieldnames=FIELDNAMES,
+                                delimiter='|',
+                                lineterminator='\n',
+                                quotechar=None, quoting=csv.QUOTE_NONE)
+        for row in reader:
+            yield row
+
+
+def index_quotes(text):
+    """Replaces the index with one of the CSV `text`, and returns its version"""
+    version = hashlib.sha1(text.encode('utf-8')).hexdigest()
+    rows = []
+    for row in read_quotes(text):
+        minute = get_minute(row["time"] or "")
+        if minute is None or row["sfw"] == "nsfw" or row["full_quote"] is None:
+            continue
+        rows.append((version, minute, row["time"], row["time_human"] or "", row["full_quote"],
+                     row["book_title"] or "", row["author_name"] or ""))
+
+    def statements(connection):
+        connection.execute("DELETE FROM quotes")
+        connection.executemany("INSERT INTO quotes (version, minute, time, time_human, full_quote, book_title, "
+                               "author_name) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        cache_store.use_index(connection, "quotes")
+        cache_store.evict(connection)
+
+    create_table()
+    cache_store.transaction(statements)
+    logging.info("Indexed {} quotes".format(len(rows)))
+    return version
+
+
+def has_index(version):
+    def statements(connection):
+        return connection.execute("SELECT 1 FROM quotes WHERE version = ? LIMIT 1", (version,)).fetchone()
+
+    create_table()
+    return cache_store.transaction(statements) is not None
+
+
+def get_index_version(url, ttl):
+    """
+    Downloads the CSV at `url` and indexes it if it isn't cached or it's older than `ttl` seconds.
+    Returns the version of the index.
+    """
+    version = get_text_from_url(url, {}, ttl, projection=index_quotes)
+    if not has_index(version):
+        logging.warning("The quote index is missing, downloading the quotes again")
+        key = get_cache_key("GET", url, {}, index_quotes.__qualname__)
+        version = fetch_text_from_url(url, {}, key, None, projection=index_quotes)
+    return version
+
+
+def get_quotes(version, minute):
+    """
+    The quotes for a minute of the day, or for the nearest earlier minute which has any,
+    wrapping around to the end of the day before.
+    """
+    def statements(connection):
+        cache_store.use_index(connection, "quotes")
+        row = connection.execute("SELECT minute FROM quotes WHERE version = ? AND minute <= ? "
+                                 "ORDER BY minute DESC LIMIT 1", (version, minute)).fetchone()
+        if row is None:
+            row = connection.execute("SELECT minute FROM quotes WHERE version = ? "
+                                     "ORDER BY minute DESC LIMIT 1", (version,)).fetchone()
+        if row is None:
+            return []
+        return connection.execute("SELECT time, time_human, full_quote, book_title, author_name FROM quotes "
+                                  "WHERE version = ? AND minute = ?", (version, row[0])).fetchall()
+
+    return [dict(zip(FIELDNAMES, row)) for row in cache_store.transaction(statements)]
+
+
+def get_quotes_by_minute(version):
+    """The quotes of every minute of the day which has any, by minute"""
+    rows = cache_store.transaction(lambda connection: connection.execute(
+        "SELECT minute, time, time_human, full_quote, book_title, author_name FROM quotes "
+        "WHERE version = ? ORDER BY minute", (version,)).fetchall())
+    quotes_by_minute = {}
+    for row in rows:
+        quotes_by_minute.setdefault(row[0], []).append(dict(zip(FIELDNAMES, row[1:])))
+    return quotes_by_minute
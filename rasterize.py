@@ -0,0 +1,151 @@
+"""
+Rasterizes SVG documents in-process with cairosvg, instead of starting the cairosvg command.
+
+Documents pulled in with <use href="....svg">, such as the weather icons and the custom SVG,
+are parsed once and kept, keyed by a hash of their content.
+Only the main document, whose text changes on every refresh, is parsed every time.
+"""
+import hashlib
+import logging
+import math
+import os
+import re
+from collections import OrderedDict
+
+import cairocffi
+import numpy
+from cairosvg.parser import Tree
+from cairosvg.surface import PNGSurface
+from PIL import Image
+
+USE_HREF_PATTERN = re.compile(r'<use\b[^>]*?\b(?:xlink:)?href="([^"#]+\.svg)"')
+
+max_parsed_documents = 128
+
+# content hash -> parsed cairosvg Tree
+parsed_documents = OrderedDict()
+
+
+def get_parsed_document(filename):
+    """
+    Returns the parsed Tree of an SVG file, reusing the previous parse if the content hasn't changed.
+    """
+    with open(filename, 'rb') as document_file:
+        content = document_file.read()
+    digest = hashlib.sha1(content).hexdigest()
+
+    tree = parsed_documents.get(digest)
+    if tree is None:
+        logging.debug("get_parsed_document() - Parsing {}".format(filename))
+        tree = Tree(bytestring=content, url=os.path.abspath(filename), unsafe=True)
+        parsed_documents[digest] = tree
+        if len(parsed_documents) > max_parsed_documents:
+            parsed_documents.popitem(last=False)
+    else:
+        parsed_documents.move_to_end(digest)
+    return tree
+
+
+class CachedDocumentSurface(PNGSurface):
+    """
+    A PNG surface which starts with the referenced documents already in its tree cache.
+    cairosvg looks up a <use href> in the tree cache by its href before it fetches and parses the file.
+    """
+
+    def __init__(self, tree, output, dpi, referenced_documents, **kwargs):
+        self.referenced_documents = referenced_documents
+        super().__init__(tree, output, dpi, **kwargs)
+
+    @property
+    def tree_cache(self):
+        return self._tree_cache
+
+    @tree_cache.setter
+    def tree_cache(self, tree_cache):
+        self._tree_cache = dict(self.referenced_documents)
+        self._tree_cache.update(tree_cache)
+
+
+class RecordedDocumentSurface(CachedDocumentSurface):
+    """
+    Records the drawing instead of rasterizing it, so that only the area drawn on needs rasterizing afterwards.
+    """
+
+    def _create_surface(self, width, height):
+        width = int(width)
+        height = int(height)
+        return cairocffi.RecordingSurface(cairocffi.CONTENT_COLOR_ALPHA, (0, 0, width, height)), width, height
+
+
+def get_referenced_documents(svg_text, base_dir):
+    """
+    Returns the tree cache entries for every SVG file the document references with <use href>.
+    """
+    referenced_documents = {}
+    for href in set(USE_HREF_PATTERN.findall(svg_text)):
+        filename = os.path.join(base_dir, href)
+        if os.path.isfile(filename):
+            referenced_documents[(href, '')] = get_parsed_document(filename)
+    return referenced_documents
+
+
+def draw_document(svg_text, svg_filename, width, height, surface_class=CachedDocumentSurface):
+    """
+    Draws `svg_text` onto a new `surface_class` of `width` x `height`, the same as
+    `cairosvg --unsafe --dpi 300 --output-width width --output-height height`.
+    `svg_filename` is where the document lives, relative references are resolved from there.
+    """
+    base_dir = os.path.dirname(os.path.abspath(svg_filename))
+    tree = Tree(bytestring=svg_text.encode('utf-8'), url=os.path.abspath(svg_filename), unsafe=True)
+    return surface_class(tree, None, 300, get_referenced_documents(svg_text, base_dir),
+                         output_width=width, output_height=height)
+
+
+def rasterize(svg_text, svg_filename, width, height, png_filename=None):
+    """
+    Renders `svg_text` to a `width` x `height` RGBA image.
+    Also writes the PNG to `png_filename`, if given.
+    """
+    surface = draw_document(svg_text, svg_filename, width, height)
+
+    cairo_surface = surface.cairo
+    cairo_surface.flush()
+    # cairo's ARGB32 is premultiplied and native endian, which is BGRA in memory on the Pi
+    image = Image.frombuffer("RGBA", (cairo_surface.get_width(), cairo_surface.get_height()),
+                             bytes(cairo_surface.get_data()), "raw", "BGRa", cairo_surface.get_stride(), 1)
+    if png_filename:
+        cairo_surface.write_to_png(png_filename)
+    surface.finish()
+    return image
+
+
+def get_pixels(image_surface):
+    """A copy of a cairo ARGB32 image surface as a height x width x 4 array, BGRA in memory"""
+    image_surface.flush()
+    rows = numpy.frombuffer(image_surface.get_data(), numpy.uint8)
+    rows = rows.reshape(image_surface.get_height(), image_surface.get_stride() // 4, 4)
+    return rows[:, :image_surface.get_width()].copy()
+
+
+def rasterize_drawn_area(svg_text, svg_filename, width, height):
+    """
+    Renders `svg_text` as if onto a transparent `width` x `height` image, but only rasterizes
+    the area which something was drawn on.
+    Returns the (x, y) of that area and a cairo ARGB32 image surface of it, or None if nothing was drawn.
+    """
+    surface = draw_document(svg_text, svg_filename, width, height, RecordedDocumentSurface)
+
+    ink_x, ink_y, ink_width, ink_height = surface.cairo.ink_extents()
+    x0, y0 = max(0, math.floor(ink_x)), max(0, math.floor(ink_y))
+    x1, y1 = min(width, math.ceil(ink_x + ink_width)), min(height, math.ceil(ink_y + ink_height))
+    if x1 <= x0 or y1 <= y0:
+        surface.finish()
+        return None
+
+    area = cairocffi.ImageSurface(cairocffi.FORMAT_ARGB32, x1 - x0, y1 - y0)
+    context = cairocffi.Context(area)
+    context.set_source_surface(surface.cairo, -x0, -y0)
+    context.paint()
+    area.flush()
+    surface.finish()
+    return (x0, y0), area
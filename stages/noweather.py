@@ -0,0 +1,127 @@
+import os
+import logging
+import locale
+
+
+def get_active_locale():
+    try:
+        return locale.getlocale()[0][:2]
+    except Exception:
+        return "en"
+
+
+def get_todo_count():
+    """TODO_COUNT as exported by screen-todo-get.py"""
+    try:
+        return int(os.getenv("TODO_COUNT", "3"))
+    except ValueError:
+        return 0
+
+
+def get_output_dict(now, todo_count):
+    """
+    Lays out `todo_count` todo rows below the calendar events and
+    returns the template values for the clock and the row positions.
+    """
+    lang = get_active_locale()
+
+    # =========================
+    # 支配パラメータ
+    # =========================
+    TOTAL_ITEMS = int(os.getenv("TOTAL_ITEMS", "8"))
+
+    TOP_Y = 30
+    SCREEN_BOTTOM = 480
+
+    EVENT_DATE_TO_DESC = 26
+    TODO_DATE_TO_DESC = 24
+
+    DIVIDER_GAP = 14
+    DIVIDER_OFFSET = 4
+
+    # =========================
+    # TODO 件数（任意）
+    # =========================
+    todo_count = max(0, min(todo_count, TOTAL_ITEMS - 1))
+    event_count = TOTAL_ITEMS - todo_count
+
+    # =========================
+    # 高さ計算（核心）
+    # =========================
+    usable_height = SCREEN_BOTTOM - TOP_Y
+
+    item_heights = (
+        event_count * EVENT_DATE_TO_DESC +
+        todo_count * TODO_DATE_TO_DESC
+    )
+
+    divider_height = (
+        DIVIDER_OFFSET + DIVIDER_GAP if todo_count > 0 else 0
+    )
+
+    flex_height = max(
+        0,
+        usable_height - item_heights - divider_height
+    )
+
+    # EVENT + TODO を同一アイテムとして等間隔配置
+    ITEM_GAP = flex_height // max(TOTAL_ITEMS - 1, 1)
+
+    # =========================
+    # 日付・時刻
+    # =========================
+    date_fmt = "%-m月 %-d日" if lang == "ja" else "%b %-d"
+    time_str = now.strftime("%H:%M")
+
+    output_dict = {
+        "TIME_NOW": time_str,
+        "HOUR_NOW": time_str,
+        "DAY_ONE": now.strftime(date_fmt),
+        "DAY_NAME": now.strftime("%A"),
+    }
+
+    # =========================
+    # EVENT
+    # =========================
+    y = TOP_Y
+
+    for i in range(1, event_count + 1):
+        output_dict[f"EVENT_DATE_Y_{i}"] = str(y)
+        output_dict[f"EVENT_DESC_Y_{i}"] = str(y + EVENT_DATE_TO_DESC)
+        y += EVENT_DATE_TO_DESC + ITEM_GAP
+
+    # 未使用 EVENT スロットを消す
+    for i in range(event_count + 1, TOTAL_ITEMS + 1):
+        output_dict[f"EVENT_DATE_Y_{i}"] = "0"
+        output_dict[f"EVENT_DESC_Y_{i}"] = "0"
+        output_dict[f"CAL_DATETIME_{i}"] = ""
+        output_dict[f"CAL_DESC_{i}"] = ""
+
+    # =========================
+    # Divider / TODO
+    # =========================
+    if todo_count > 0:
+        y += DIVIDER_OFFSET
+        output_dict["DIVIDER_Y"] = str(y)
+        y += DIVIDER_GAP
+
+        for i in range(1, todo_count + 1):
+            output_dict[f"TODO_DATE_Y_{i}"] = str(y)
+            output_dict[f"TODO_DESC_Y_{i}"] = str(y + TODO_DATE_TO_DESC)
+            y += TODO_DATE_TO_DESC + ITEM_GAP
+    else:
+        output_dict["DIVIDER_Y"] = "0"
+
+    # 未使用 TODO スロットを消す
+    for i in range(todo_count + 1, TOTAL_ITEMS + 1):
+        output_dict[f"TODO_DATE_Y_{i}"] = "0"
+        output_dict[f"TODO_DESC_Y_{i}"] = "0"
+        output_dict[f"TODO_DATETIME_{i}"] = ""
+        output_dict[f"TODO_DESC_{i}"] = ""
+
+    logging.info(
+        "Layout TOTAL=%d EVENT=%d TODO=%d",
+        TOTAL_ITEMS, event_count, todo_count
+    )
+
+    return output_dict
@@ -0,0 +1,80 @@
+"""
+Compiled SVG templates.
+
+A template is split once into literal text and placeholders, then rendered in a single pass.
+Placeholders are either written as {{NAME}}, or are bare upper case names like TIME_NOW
+delimited by anything that can't be part of a name, so CAL_DESC_1 never matches inside CAL_DESC_10.
+Values are inserted as they are and never searched for further placeholders.
+"""
+import codecs
+import logging
+import os
+import re
+
+PLACEHOLDER_PATTERN = re.compile(
+    r"\{\{\s*(?P<braced>[A-Za-z_][A-Za-z0-9_]*)\s*\}\}"
+    r"|(?<![A-Za-z0-9_])(?P<bare>[A-Z][A-Z0-9_]+)(?![A-Za-z0-9_])")
+
+BARE_NAME_PATTERN = re.compile(r"[A-Z][A-Z0-9_]+")
+
+
+class CompiledTemplate:
+
+    def __init__(self, text):
+        # literals[i] is the text before placeholders[i]; the last literal follows the last placeholder
+        self.literals = []
+        self.placeholders = []
+        self.originals = []
+
+        position = 0
+        for match in PLACEHOLDER_PATTERN.finditer(text):
+            self.literals.append(text[position:match.start()])
+            self.placeholders.append(match.group("braced") or match.group("bare"))
+            self.originals.append(match.group(0))
+            position = match.end()
+        self.literals.append(text[position:])
+        self.names = frozenset(self.placeholders)
+
+    def render(self, output_dict):
+        """
+        Returns the template text with each placeholder replaced by its value in `output_dict`.
+        Placeholders without a value are left as they are.
+        """
+        parts = [self.literals[0]]
+        for name, original, literal in zip(self.placeholders, self.originals, self.literals[1:]):
+            value = output_dict.get(name)
+            parts.append(original if value is None else value)
+            parts.append(literal)
+        output = "".join(parts)
+
+        # Keys which can't be written as a bare placeholder, such as lower case ones,
+        # are still replaced the old way so that existing custom scripts keep working.
+        for key in output_dict:
+            if key not in self.names and not BARE_NAME_PATTERN.fullmatch(key):
+                logging.debug("render() - {} is not a placeholder name, replacing it as text".format(key))
+                output = output.replace(key, output_dict[key])
+
+        return output
+
+
+# path -> ((mtime, size), CompiledTemplate)
+compiled_templates = {}
+
+
+def load_template(template_svg_filename):
+    """
+    Returns the compiled template for a file.
+    It's compiled again only when the file's modification time or size changes.
+    """
+    stat = os.stat(template_svg_filename)
+    version = (stat.st_mtime_ns, stat.st_size)
+
+    cached = compiled_templates.get(template_svg_filename)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    logging.debug("load_template() - Compiling {}".format(template_svg_filename))
+    with codecs.open(template_svg_filename, 'r', encoding='utf-8') as template_file:
+        template = CompiledTemplate(template_file.read())
+    compiled_templates[template_svg_filename] = (version, template)
+    return template
@@ -0,0 +1,70 @@
+import os
+import tempfile
+import unittest
+
+from cache_store import CacheStore
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (name TEXT PRIMARY KEY, data BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS item_sets (name TEXT PRIMARY KEY);
+"""
+SIZE_QUERY = "SELECT COALESCE(SUM(length(data)), 0) FROM items"
+
+
+class IndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = CacheStore(os.path.join(self.directory.name, "cache.db"), 1000)
+        self.store.add_index("items", SCHEMA, ("items", "item_sets"), SIZE_QUERY)
+
+    def tearDown(self):
+        self.store.connection.close()
+        self.directory.cleanup()
+
+    def put_items(self, size):
+        def statements(connection):
+            connection.execute("INSERT INTO items (name, data) VALUES ('a', ?)", (b"x" * size,))
+            connection.execute("INSERT INTO item_sets (name) VALUES ('a')")
+            self.store.use_index(connection, "items")
+            self.store.evict(connection)
+
+        self.store.transaction(statements)
+
+    def count_items(self):
+        return self.store.transaction(lambda connection: connection.execute(
+            "SELECT (SELECT COUNT(*) FROM items) + (SELECT COUNT(*) FROM item_sets)").fetchone()[0])
+
+    def test_counted_in_stats(self):
+        self.put_items(300)
+        self.store.put_result("result", "value")
+
+        stats = self.store.get_stats()
+        self.assertEqual([(name, size) for name, size, _ in stats["indexes"]], [("items", 300)])
+        self.assertEqual(stats["index_bytes"], 300)
+        self.assertEqual(self.store.transaction(self.store.get_total_size), 300 + stats["result_bytes"])
+
+    def test_evicted_when_least_recently_used(self):
+        self.put_items(300)
+        self.store.put_result("result", b"y" * 800)
+
+        self.assertEqual(self.count_items(), 0)
+        self.assertIsNotNone(self.store.get_result("result"))
+
+    def test_other_entries_evicted_first(self):
+        self.store.put_result("result", b"y" * 800)
+        self.put_items(300)
+
+        self.assertEqual(self.count_items(), 2)
+        self.assertIsNone(self.store.get_result("result"))
+
+    def test_cleared(self):
+        self.put_items(300)
+        self.store.clear()
+
+        self.assertEqual(self.count_items(), 0)
+        self.assertEqual(self.store.get_stats()["index_bytes"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
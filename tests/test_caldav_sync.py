@@ -0,0 +1,237 @@
+import datetime
+import os
+import tempfile
+import unittest
+from unittest import mock
+from xml.sax.saxutils import escape
+
+from caldav.lib.error import AuthorizationError
+from lxml import etree
+
+from cache_store import CacheStore
+from calendar_providers import caldav
+from calendar_providers.caldav import CalDavCalendar, get_etags, sync_collection
+
+URL = "https://dav.example.com/calendars/user/personal/"
+
+
+def get_event(uid):
+    # As it reads after the XML parser has normalized the line endings and get_prop() has stripped it
+    return "BEGIN:VCALENDAR\nBEGIN:VEVENT\nUID:{}\nEND:VEVENT\nEND:VCALENDAR".format(uid)
+
+
+class FakeResponse:
+
+    def __init__(self, body, status=207):
+        self.status = status
+        self.tree = etree.fromstring(body.encode("utf-8"))
+
+
+def get_multistatus(members, sync_token=None):
+    token = "" if sync_token is None else "<d:sync-token>{}</d:sync-token>".format(sync_token)
+    return """<d:multistatus xmlns:d="DAV:" xmlns:c="urn:ietf:params:xml:ns:caldav"
+        xmlns:cs="http://calendarserver.org/ns/">{}{}</d:multistatus>""".format("".join(members), token)
+
+
+def get_member(href, prop):
+    return "<d:response><d:href>{}</d:href><d:propstat><d:prop>{}</d:prop>" \
+           "<d:status>HTTP/1.1 200 OK</d:status></d:propstat></d:response>".format(href, prop)
+
+
+class FakeClient:
+    """
+    A CalDAV server with sync-collection which, like caldav's DAVClient, raises AuthorizationError
+    when it answers 403, as it does for a sync token it no longer accepts.
+    """
+
+    def __init__(self, components, ctag, sync_token, invalid_status=403):
+        self.components = components
+        self.ctag = ctag
+        self.sync_token = sync_token
+        self.invalid_status = invalid_status
+        # Components which are listed, but have gone by the time they're fetched
+        self.gone = set()
+        self.reports = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def propfind(self, url, query, depth=0):
+        if "getctag" in query:
+            prop = "<cs:getctag>{}</cs:getctag>".format(self.ctag)
+            if self.sync_token:
+                prop += "<d:sync-token>{}</d:sync-token>".format(self.sync_token)
+            return FakeResponse(get_multistatus([get_member(url, prop)]))
+        # Like some servers, the calendar itself has an ETag
+        members = [get_member("/calendars/user/personal/", "<d:getetag>\"collection\"</d:getetag>")]
+        return FakeResponse(get_multistatus(members + [get_member(href, "<d:getetag>{}</d:getetag>".format(etag))
+                                                       for href, (etag, _) in self.components.items()]))
+
+    def report(self, url, query, depth=0):
+        tree = etree.fromstring(query.encode("utf-8"))
+        self.reports.append((etree.QName(tree).localname, depth))
+        if etree.QName(tree).localname == "sync-collection":
+            token = tree.findtext("{DAV:}sync-token")
+            if token:
+                if self.invalid_status == 403:
+                    raise AuthorizationError(url=url, reason="403 Forbidden")
+                return FakeResponse(get_multistatus([]), status=self.invalid_status)
+            return FakeResponse(get_multistatus([get_member(href, "<d:getetag>{}</d:getetag>".format(etag))
+                                                 for href, (etag, _) in self.components.items()],
+                                                self.sync_token))
+        hrefs = [href.text for href in tree.iter("{DAV:}href")]
+        return FakeResponse(get_multistatus([
+            get_member(href, "<d:getetag>{}</d:getetag><c:calendar-data>{}</c:calendar-data>".format(
+                self.components[href][0], escape(self.components[href][1])))
+            for href in hrefs if href not in self.gone]))
+
+
+class SyncTest(unittest.TestCase):
+
+    def setUp(self):
+        self.calendar = CalDavCalendar([URL], 10, None, None)
+        self.store = {"ctag": "1", "sync_token": "http://example.com/sync/1", "components": {
+            URL + "kept.ics": {"etag": '"a"', "data": get_event("kept")},
+            URL + "removed.ics": {"etag": '"b"', "data": get_event("removed")},
+        }}
+        self.components = {
+            URL + "kept.ics": ('"a"', get_event("kept")),
+            URL + "added.ics": ('"c"', get_event("added")),
+        }
+
+    def check_synced(self, client, store):
+        self.assertEqual(sorted(store["components"]), [URL + "added.ics", URL + "kept.ics"])
+        self.assertEqual(store["components"][URL + "added.ics"], {"etag": '"c"', "data": get_event("added")})
+        # Only what changed is fetched
+        self.assertEqual(client.reports[-1], ("calendar-multiget", 1))
+
+    def test_expired_sync_token_lists_everything_again(self):
+        client = FakeClient(self.components, "2", "http://example.com/sync/2")
+        store = self.calendar.sync(client, URL, self.store)
+
+        self.check_synced(client, store)
+        self.assertEqual(store["sync_token"], "http://example.com/sync/2")
+        self.assertEqual(client.reports[:2], [("sync-collection", 0), ("sync-collection", 0)])
+
+    def test_conflicting_sync_token_lists_everything_again(self):
+        client = FakeClient(self.components, "2", "http://example.com/sync/2", invalid_status=409)
+        self.check_synced(client, self.calendar.sync(client, URL, self.store))
+
+    def test_invalid_sync_token(self):
+        client = FakeClient(self.components, "2", "http://example.com/sync/2")
+        self.assertIsNone(sync_collection(client, URL, "http://example.com/sync/1"))
+
+    def test_without_sync_collection_the_etags_are_compared(self):
+        client = FakeClient(self.components, "2", None)
+        store = self.calendar.sync(client, URL, self.store)
+
+        self.check_synced(client, store)
+        self.assertIsNone(store["sync_token"])
+        self.assertEqual(client.reports, [("calendar-multiget", 1)])
+
+    def test_calendar_isnt_one_of_its_components(self):
+        client = FakeClient(self.components, "2", None)
+        self.assertEqual(sorted(get_etags(client, URL)), [URL + "added.ics", URL + "kept.ics"])
+
+    def test_components_which_cant_be_fetched_are_dropped(self):
+        self.components[URL + "kept.ics"] = ('"a2"', get_event("kept"))
+        client = FakeClient(self.components, "2", "http://example.com/sync/2")
+        client.gone.add(URL + "kept.ics")
+        store = self.calendar.sync(client, URL, self.store)
+
+        self.assertEqual(sorted(store["components"]), [URL + "added.ics"])
+
+    def test_unchanged_calendar(self):
+        client = FakeClient(self.components, "1", "http://example.com/sync/1")
+        self.assertIs(self.calendar.sync(client, URL, self.store), self.store)
+        self.assertEqual(client.reports, [])
+
+
+WEEKLY = """BEGIN:VCALENDAR
+BEGIN:VEVENT
+UID:weekly
+SUMMARY:Weekly
+DTSTART:20261001T090000Z
+DTEND:20261001T100000Z
+RRULE:FREQ=WEEKLY
+END:VEVENT
+END:VCALENDAR"""
+
+HOLIDAY = """BEGIN:VCALENDAR
+BEGIN:VEVENT
+UID:holiday
+SUMMARY:Holiday
+LOCATION:Home
+DTSTART;VALUE=DATE:20261020
+DTEND;VALUE=DATE:20261022
+END:VEVENT
+END:VCALENDAR"""
+
+
+class ExpandTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = CacheStore(os.path.join(self.directory.name, "cache.db"), 1024 * 1024)
+        patcher = mock.patch.object(caldav, "cache_store", self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(caldav, "expand_events", wraps=caldav.expand_events)
+        self.expand_events = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.from_date = datetime.datetime(2026, 10, 18, 8, 0, tzinfo=datetime.timezone.utc)
+        self.store = {"ctag": "1", "sync_token": None, "components": {
+            URL + "weekly.ics": {"etag": '"a"', "data": WEEKLY},
+            URL + "holiday.ics": {"etag": '"b"', "data": HOLIDAY},
+        }}
+
+    def tearDown(self):
+        self.cache.connection.close()
+        self.directory.cleanup()
+
+    def get_events(self, from_date, days=14):
+        calendar = CalDavCalendar([URL], 10, from_date, from_date + datetime.timedelta(days=days))
+        return calendar.get_expanded_events(URL, self.store)
+
+    def test_recurring_and_all_day_events(self):
+        events = sorted(self.get_events(self.from_date))
+        self.assertEqual([event.summary for _, _, event in events], ["Holiday", "Weekly", "Weekly", "Weekly"])
+        holiday = events[0][2]
+        self.assertEqual((holiday.start, holiday.end, holiday.all_day_event, holiday.location),
+                         (datetime.date(2026, 10, 20), datetime.date(2026, 10, 21), True, "Home"))
+
+    def test_expanded_once_while_the_calendar_is_unchanged(self):
+        self.get_events(self.from_date)
+        self.get_events(self.from_date + datetime.timedelta(hours=1))
+        self.assertEqual(self.expand_events.call_count, 1)
+
+    def test_expanded_again_when_the_calendar_changes(self):
+        self.get_events(self.from_date)
+        self.store = dict(self.store, ctag="2")
+        self.get_events(self.from_date)
+        self.assertEqual(self.expand_events.call_count, 2)
+
+    def test_calendar_events_between_from_and_to_date(self):
+        client = FakeClient({href: (component["etag"], component["data"])
+                             for href, component in self.store["components"].items()}, "1", None)
+        calendar = CalDavCalendar([URL], 3, datetime.datetime(2026, 10, 21, 8, 0, tzinfo=datetime.timezone.utc),
+                                  datetime.datetime(2026, 11, 30, tzinfo=datetime.timezone.utc))
+        with mock.patch.object(caldav.caldav, "DAVClient", return_value=client):
+            events = calendar.get_calendar_events()
+
+        # The holiday's last day is the 21st, and only the first three events are shown
+        self.assertEqual([(event.summary, event.start.day) for event in events],
+                         [("Holiday", 20), ("Weekly", 22), ("Weekly", 29)])
+
+    def test_expanded_again_past_the_end(self):
+        self.get_events(self.from_date)
+        self.get_events(self.from_date + datetime.timedelta(days=8))
+        self.assertEqual(self.expand_events.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import datetime
+import unittest
+
+from calendar_providers.base_provider import CalendarEvent
+from stages.calendar_events import get_output_dict, max_event_results
+from svg_template import CompiledTemplate
+
+TEMPLATE = "".join(
+    '<text id="event{0}"><tspan>CAL_DATETIME_{0}</tspan><tspan>CAL_DATETIME_START_{0}</tspan>'
+    '<tspan>CAL_DESC_{0}</tspan></text>\n'.format(number)
+    for number in range(1, max_event_results + 1))
+
+
+class CalendarTemplateTest(unittest.TestCase):
+
+    def setUp(self):
+        start = datetime.datetime(2026, 10, 20, 9, 0).astimezone()
+        self.events = [CalendarEvent("Event {}".format(number), start + datetime.timedelta(days=number),
+                                     start + datetime.timedelta(days=number, hours=1), False)
+                       for number in range(1, max_event_results + 1)]
+        self.output_dict = get_output_dict(self.events)
+        self.svg = CompiledTemplate(TEMPLATE).render(self.output_dict)
+
+    def get_line(self, number):
+        return next(line for line in self.svg.splitlines() if 'id="event{}"'.format(number) in line)
+
+    def test_ten_events(self):
+        self.assertEqual(max_event_results, 10)
+        self.assertNotIn("CAL_", self.svg)
+
+    def test_cal_desc_1_doesnt_match_cal_desc_10(self):
+        self.assertIn("<tspan>Event 1</tspan>", self.get_line(1))
+        self.assertIn("<tspan>Event 10</tspan>", self.get_line(10))
+        self.assertNotIn("Event 10", self.get_line(1))
+        self.assertNotIn("Event 10", self.svg.replace(self.get_line(10), ""))
+
+    def test_cal_datetime_doesnt_match_cal_datetime_start(self):
+        for number in (1, 10):
+            line = self.get_line(number)
+            self.assertIn("<tspan>{}</tspan><tspan>{}</tspan>".format(
+                self.output_dict["CAL_DATETIME_{}".format(number)],
+                self.output_dict["CAL_DATETIME_START_{}".format(number)]), line)
+            self.assertNotEqual(self.output_dict["CAL_DATETIME_{}".format(number)],
+                                self.output_dict["CAL_DATETIME_START_{}".format(number)])
+
+
+if __name__ == "__main__":
+    unittest.main()
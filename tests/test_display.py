@@ -0,0 +1,95 @@
+import random
+import unittest
+
+import display
+
+
+class FakeEPD:
+    """
+    Stands in for the epd7in5_V2 driver, keeping what the panel shows as a packed frame.
+    display_Partial() reads the rectangle out of the whole frame the way the driver does.
+    """
+
+    def __init__(self, width=800, height=480):
+        self.width = width
+        self.height = height
+        self.panel = bytearray(width // 8 * height)
+        self.partial_refreshes = []
+
+    def init(self):
+        pass
+
+    def init_part(self):
+        pass
+
+    def sleep(self):
+        pass
+
+    def Clear(self):
+        self.panel = bytearray(len(self.panel))
+
+    def display(self, image):
+        self.panel = bytearray(image)
+
+    def display_Partial(self, Image, Xstart, Ystart, Xend, Yend):
+        self.partial_refreshes.append((Xstart, Ystart, Xend, Yend))
+        Xstart = Xstart // 8 * 8
+        Xend = Xend // 8 * 8 if Xend % 8 == 0 else Xend // 8 * 8 + 1
+        Width = (Xend - Xstart) // 8
+        Height = Yend - Ystart
+        for j in range(Height):
+            for i in range(Width):
+                index = i + (j + Ystart) * self.width // 8 + Xstart // 8
+                self.panel[index] = Image[index]
+
+
+def change_area(frame, width, x0, y0, x1, y1):
+    """A copy of a packed frame with random bytes in a rectangle, in bytes and rows"""
+    frame = bytearray(frame)
+    for y in range(y0, y1):
+        for x in range(x0, x1):
+            frame[y * width // 8 + x] = random.randrange(256)
+    return bytes(frame)
+
+
+class PartialRefreshTest(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(7)
+        self.epd = FakeEPD()
+        self.first = bytes(random.randrange(256) for _ in range(self.epd.width // 8 * self.epd.height))
+        display.refresh_screen(self.epd, [self.first], None)
+
+    def test_full_refresh_without_a_last_frame(self):
+        self.assertEqual(bytes(self.epd.panel), self.first)
+        self.assertEqual(self.epd.partial_refreshes, [])
+
+    def test_partial_refresh_away_from_the_top_left(self):
+        frame = change_area(self.first, self.epd.width, 40, 200, 52, 230)
+        display.refresh_screen(self.epd, [frame], self.first)
+
+        self.assertEqual(len(self.epd.partial_refreshes), 1)
+        x0, y0, x1, y1 = self.epd.partial_refreshes[0]
+        self.assertGreaterEqual(x0, 40 * 8)
+        self.assertGreaterEqual(y0, 200)
+        self.assertEqual(bytes(self.epd.panel), frame)
+
+    def test_partial_refresh_of_several_areas(self):
+        frame = change_area(self.first, self.epd.width, 0, 0, 4, 10)
+        frame = change_area(frame, self.epd.width, 90, 300, 100, 320)
+        frame = change_area(frame, self.epd.width, 20, 460, 30, 480)
+        display.refresh_screen(self.epd, [frame], self.first)
+
+        self.assertEqual(len(self.epd.partial_refreshes), 3)
+        self.assertEqual(bytes(self.epd.panel), frame)
+
+    def test_full_refresh_when_most_of_the_screen_changed(self):
+        frame = change_area(self.first, self.epd.width, 0, 0, 100, 400)
+        display.refresh_screen(self.epd, [frame], self.first)
+
+        self.assertEqual(self.epd.partial_refreshes, [])
+        self.assertEqual(bytes(self.epd.panel), frame)
+
+
+if __name__ == "__main__":
+    unittest.main()
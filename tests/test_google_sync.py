@@ -0,0 +1,87 @@
+import datetime
+import unittest
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from calendar_providers.google import GoogleCalendar
+
+
+def get_event(event_id, day, summary=None):
+    start = datetime.datetime(2026, 10, day, 9, 0, tzinfo=datetime.timezone.utc)
+    return {"id": event_id, "summary": summary or event_id,
+            "start": {"dateTime": start.strftime("%Y-%m-%dT%H:%M:%S%z")},
+            "end": {"dateTime": (start + datetime.timedelta(hours=1)).strftime("%Y-%m-%dT%H:%M:%S%z")}}
+
+
+class FakeRequest:
+
+    def __init__(self, execute):
+        self.execute = execute
+
+
+class FakeService:
+    """
+    The events().list() of the Calendar API, for a calendar of `events`, which answers 410 Gone to
+    any sync token other than its current one.
+    """
+
+    def __init__(self, events, sync_token):
+        self.events_list = events
+        self.sync_token = sync_token
+        self.calls = []
+
+    def events(self):
+        return self
+
+    def list(self, **parameters):
+        self.calls.append(parameters)
+
+        def execute():
+            if parameters.get("syncToken") and parameters["syncToken"] != self.sync_token:
+                raise HttpError(httplib2.Response({"status": 410, "reason": "Gone"}), b"Sync token is no longer valid")
+            items = [] if parameters.get("syncToken") else self.events_list
+            return {"items": items, "nextSyncToken": self.sync_token}
+
+        return FakeRequest(execute)
+
+
+class SyncTest(unittest.TestCase):
+
+    def setUp(self):
+        from_date = datetime.datetime(2026, 10, 18, 8, 0, tzinfo=datetime.timezone.utc)
+        self.calendar = GoogleCalendar("primary", 10, from_date, from_date + datetime.timedelta(days=365))
+        self.service = FakeService([get_event("kept", 20), get_event("added", 21)], "token-2")
+        self.calendar.service = self.service
+        self.store = {"sync_token": "token-1",
+                      "time_min": datetime.datetime(2026, 10, 18, tzinfo=datetime.timezone.utc),
+                      "time_max": from_date + datetime.timedelta(days=400),
+                      "events": {"kept": {"summary": "kept", "start": {}, "end": {}},
+                                 "removed": {"summary": "removed", "start": {}, "end": {}}}}
+
+    def test_expired_sync_token_lists_every_event_again(self):
+        store = self.calendar.sync(self.store)
+
+        self.assertEqual(self.service.calls[0]["syncToken"], "token-1")
+        self.assertNotIn("syncToken", self.service.calls[1])
+        self.assertIn("timeMin", self.service.calls[1])
+        self.assertEqual(store["sync_token"], "token-2")
+        self.assertEqual(sorted(store["events"]), ["added", "kept"])
+
+    def test_valid_sync_token_lists_the_changes(self):
+        self.service.sync_token = "token-1"
+        store = self.calendar.sync(self.store)
+
+        self.assertEqual(len(self.service.calls), 1)
+        self.assertEqual(sorted(store["events"]), ["kept", "removed"])
+
+    def test_other_errors_are_raised(self):
+        def execute():
+            raise HttpError(httplib2.Response({"status": 500, "reason": "Server Error"}), b"")
+
+        self.service.list = lambda **parameters: FakeRequest(execute)
+        self.assertRaises(HttpError, self.calendar.sync, self.store)
+
+
+if __name__ == "__main__":
+    unittest.main()
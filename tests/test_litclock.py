@@ -0,0 +1,79 @@
+import os
+import tempfile
+import unittest
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import litclock
+import quote_index
+from cache_store import CacheStore
+
+QUOTES = "".join("{}|{}|It was {} by the clock|Book|Author|sfw\n".format(time, time, time)
+                 for time in ("07:30", "07:31", "07:32"))
+SCREEN = (800, 480, False)
+
+
+def render_frame(minute, chosen_item, screen):
+    """Stands in for rasterizing, with a frame which doesn't compress much"""
+    return minute, zlib.compress(os.urandom(400))
+
+
+class RenderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = CacheStore(os.path.join(self.directory.name, "cache.db"), 1024 * 1024)
+        for module in (litclock, quote_index):
+            patcher = mock.patch.object(module, "cache_store", self.store)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        for name, value in (("render_frame", render_frame), ("ProcessPoolExecutor", ThreadPoolExecutor)):
+            patcher = mock.patch.object(litclock, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.version = quote_index.index_quotes(QUOTES)
+
+    def tearDown(self):
+        self.store.connection.close()
+        self.directory.cleanup()
+
+    def test_frames_which_fit(self):
+        self.assertTrue(litclock.needs_rendering(self.version, SCREEN))
+        self.assertEqual(litclock.render_all_frames(self.version, SCREEN, 2), 3)
+
+        self.assertFalse(litclock.needs_rendering(self.version, SCREEN))
+        self.assertEqual(len(litclock.get_frame(self.version, SCREEN, 7 * 60 + 31)), 400)
+
+    def test_frames_which_dont_fit_arent_rendered_again(self):
+        self.store.max_bytes = 1000
+        litclock.render_all_frames(self.version, SCREEN, 2)
+
+        self.assertFalse(litclock.has_all_frames(self.version, SCREEN))
+        self.assertIsNone(litclock.get_frame(self.version, SCREEN, 7 * 60 + 31))
+        self.assertFalse(litclock.needs_rendering(self.version, SCREEN))
+
+        # Until there's room for them
+        self.store.max_bytes = 1024 * 1024
+        self.assertTrue(litclock.needs_rendering(self.version, SCREEN))
+        litclock.render_all_frames(self.version, SCREEN, 2)
+        self.assertFalse(litclock.needs_rendering(self.version, SCREEN))
+        self.assertFalse(litclock.has_failed(self.version, SCREEN))
+
+    def test_current_frame_doesnt_render_frames_which_dont_fit_again(self):
+        self.store.max_bytes = 1000
+        litclock.render_all_frames(self.version, SCREEN, 2)
+
+        # The quotes were evicted along with the frames, and would be downloaded again
+        quote = {"time": "07:31", "time_human": "07:31", "full_quote": "It was 07:31 by the clock",
+                 "book_title": "Book", "author_name": "Author"}
+        with mock.patch.object(litclock, "get_index_version", return_value=self.version), \
+                mock.patch.object(litclock, "get_screen", return_value=SCREEN), \
+                mock.patch.object(litclock, "get_quotes", return_value=[quote]), \
+                mock.patch.object(litclock, "render_all_frames_in_background") as render_in_background:
+            self.assertEqual(len(litclock.get_current_frame(mock.Mock(hour=7, minute=31))), 400)
+        render_in_background.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
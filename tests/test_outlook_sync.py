@@ -0,0 +1,91 @@
+import datetime
+import unittest
+from unittest import mock
+
+import requests
+
+from calendar_providers import outlook
+from calendar_providers.outlook import OutlookCalendar
+
+DELTA_LINK = "https://graph.microsoft.com/v1.0/me/calendarView/delta?$deltatoken={}"
+
+
+def get_event(event_id, day):
+    return {"id": event_id, "subject": event_id, "isAllDay": False,
+            "start": {"dateTime": "2026-10-{:02}T09:00:00.0000000".format(day), "timeZone": "UTC"},
+            "end": {"dateTime": "2026-10-{:02}T10:00:00.0000000".format(day), "timeZone": "UTC"}}
+
+
+class FakeResponse:
+
+    def __init__(self, status_code, data=None):
+        self.status_code = status_code
+        self.data = data
+
+    def json(self):
+        return self.data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError("{} error".format(self.status_code))
+
+
+class FakeSession:
+    """
+    Graph's calendar view delta for a calendar of `events`, listed two to a page, which answers
+    410 Gone to any delta link other than its current one.
+    """
+
+    def __init__(self, events, delta_token):
+        self.events = events
+        self.delta_token = delta_token
+        self.urls = []
+
+    def get(self, url, headers=None):
+        self.urls.append(url)
+        if "$deltatoken=" in url:
+            if url != DELTA_LINK.format(self.delta_token):
+                return FakeResponse(410, {"error": {"code": "SyncStateNotFound"}})
+            return FakeResponse(200, {"value": [], "@odata.deltaLink": url})
+        page = int(url.split("$skiptoken=")[1]) if "$skiptoken=" in url else 0
+        data = {"value": self.events[page * 2:page * 2 + 2]}
+        if page * 2 + 2 < len(self.events):
+            data["@odata.nextLink"] = "https://graph.microsoft.com/v1.0/me/calendarView/delta?$skiptoken={}".format(page + 1)
+        else:
+            data["@odata.deltaLink"] = DELTA_LINK.format(self.delta_token)
+        return FakeResponse(200, data)
+
+
+class SyncTest(unittest.TestCase):
+
+    def setUp(self):
+        from_date = datetime.datetime(2026, 10, 18, 8, 0, tzinfo=datetime.timezone.utc)
+        self.calendar = OutlookCalendar("calendar", 10, from_date, from_date + datetime.timedelta(days=365))
+        self.session = FakeSession([get_event("kept", 20), get_event("added", 21), get_event("later", 22)], "2")
+        patcher = mock.patch.object(outlook, "session", self.session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.store = {"delta_link": DELTA_LINK.format("1"),
+                      "time_min": datetime.datetime(2026, 10, 18, tzinfo=datetime.timezone.utc),
+                      "time_max": from_date + datetime.timedelta(days=400),
+                      "events": {"kept": outlook.get_stored_event(get_event("kept", 20)),
+                                 "removed": outlook.get_stored_event(get_event("removed", 19))}}
+
+    def test_expired_delta_link_lists_every_event_again(self):
+        store = self.calendar.sync(self.store, "access token")
+
+        self.assertEqual(self.session.urls[0], DELTA_LINK.format("1"))
+        self.assertIn("/calendars/calendar/calendarView/delta?startDateTime=", self.session.urls[1])
+        self.assertEqual(store["delta_link"], DELTA_LINK.format("2"))
+        self.assertEqual(sorted(store["events"]), ["added", "kept", "later"])
+
+    def test_valid_delta_link_lists_the_changes(self):
+        self.session.delta_token = "1"
+        store = self.calendar.sync(self.store, "access token")
+
+        self.assertEqual(self.session.urls, [DELTA_LINK.format("1")])
+        self.assertEqual(sorted(store["events"]), ["kept", "removed"])
+
+
+if __name__ == "__main__":
+    unittest.main()
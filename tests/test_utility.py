@@ -0,0 +1,153 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import requests
+
+import utility
+from cache_store import CacheStore, get_key
+
+URL = "https://api.example.com/forecast"
+
+
+class FakeResponse:
+
+    def __init__(self, status_code, text="", headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+        self.encoding = None
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError("{} error".format(self.status_code))
+
+
+class FakeSession:
+    """Answers every GET with the next of `responses`, raising it if it's an exception"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, headers=None):
+        self.requests.append((url, headers))
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+class CacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = CacheStore(os.path.join(self.directory.name, "cache.db"), 1024 * 1024)
+        patcher = mock.patch.object(utility, "cache_store", self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.key = get_key("GET", URL, {})
+
+    def tearDown(self):
+        self.store.connection.close()
+        self.directory.cleanup()
+
+    def use_session(self, session):
+        patcher = mock.patch.object(utility, "http_session", session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return session
+
+    def put_response(self, body, age, etag=None, last_modified=None):
+        self.store.put_response(self.key, URL, body, etag, last_modified)
+        self.store.transaction(lambda connection: connection.execute(
+            "UPDATE responses SET stored = ? WHERE key = ?", (time.time() - age, self.key)))
+
+
+class RevalidationTest(CacheTest):
+
+    def test_not_modified_uses_the_cached_response(self):
+        self.put_response("cached", 7200, etag='"v1"', last_modified="Sun, 18 Oct 2026 06:00:00 GMT")
+        session = self.use_session(FakeSession(FakeResponse(304)))
+
+        body = utility.fetch_text_from_url(URL, {}, self.key, self.store.get_response(self.key))
+
+        self.assertEqual(body, "cached")
+        self.assertEqual(session.requests[0][1], {"If-None-Match": '"v1"',
+                                                  "If-Modified-Since": "Sun, 18 Oct 2026 06:00:00 GMT"})
+        cached = self.store.get_response(self.key)
+        self.assertEqual((cached.body, cached.etag), ("cached", '"v1"'))
+        # Fresh for another TTL
+        self.assertFalse(cached.is_stale(60))
+
+    def test_modified_replaces_the_cached_response(self):
+        self.put_response("cached", 7200, etag='"v1"')
+        self.use_session(FakeSession(FakeResponse(200, "new", {"ETag": '"v2"'})))
+
+        body = utility.fetch_text_from_url(URL, {}, self.key, self.store.get_response(self.key))
+
+        self.assertEqual(body, "new")
+        cached = self.store.get_response(self.key)
+        self.assertEqual((cached.body, cached.etag), ("new", '"v2"'))
+
+    def test_stale_response_is_revalidated(self):
+        self.put_response("cached", 60 + utility.max_stale + 60, etag='"v1"')
+        session = self.use_session(FakeSession(FakeResponse(304)))
+
+        self.assertEqual(utility.get_text_from_url(URL, {}, 60), "cached")
+        self.assertEqual(len(session.requests), 1)
+        self.assertEqual(utility.get_text_from_url(URL, {}, 60), "cached")
+        self.assertEqual(len(session.requests), 1)
+
+
+class StaleTest(CacheTest):
+
+    def test_fresh_response_when_it_can_be_fetched(self):
+        self.put_response("stale", 3600 + 60)
+        self.use_session(FakeSession(FakeResponse(200, "fresh")))
+        self.assertEqual(utility.get_text_from_url(URL, {}, 3600), "fresh")
+        self.assertEqual(self.store.get_response(self.key).body, "fresh")
+
+    def test_stale_response_when_it_cant_be_fetched(self):
+        self.put_response("stale", 3600 + 60)
+        self.use_session(FakeSession(requests.ConnectionError("offline")))
+        self.assertEqual(utility.get_text_from_url(URL, {}, 3600), "stale")
+
+    def test_max_stale_counts_from_the_ttl(self):
+        self.put_response("stale", 3600 + 300)
+        self.use_session(FakeSession(requests.ConnectionError("offline")))
+        with mock.patch.object(utility, "max_stale", 600):
+            self.assertEqual(utility.get_text_from_url(URL, {}, 3600), "stale")
+
+    def test_too_stale_response_isnt_used(self):
+        self.put_response("stale", 3600 + 900)
+        self.use_session(FakeSession(requests.ConnectionError("offline")))
+        with mock.patch.object(utility, "max_stale", 600):
+            self.assertRaises(requests.ConnectionError, utility.get_text_from_url, URL, {}, 3600)
+
+    def test_stale_result_when_it_cant_be_fetched(self):
+        self.store.put_result("events:calendar", ["stale"])
+        self.store.transaction(lambda connection: connection.execute(
+            "UPDATE results SET stored = ? WHERE name = ?", (time.time() - 3600 - 60, "events:calendar")))
+
+        def fetch():
+            raise requests.ConnectionError("offline")
+
+        self.assertEqual(utility.get_cached_result("events:calendar", 3600, fetch), ["stale"])
+
+    def test_stale_response_refreshed_in_the_background(self):
+        self.put_response("stale", 3600 + 60)
+        self.use_session(FakeSession(FakeResponse(200, "fresh")))
+        revalidated = threading.Event()
+
+        with mock.patch.dict(utility.background_revalidation, {"enabled": True, "on_revalidated": revalidated.set}):
+            self.assertEqual(utility.get_text_from_url(URL, {}, 3600), "stale")
+            self.assertTrue(revalidated.wait(5))
+        self.assertEqual(self.store.get_response(self.key).body, "fresh")
+
+
+if __name__ == "__main__":
+    unittest.main()
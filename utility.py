@@ -2,10 +2,12 @@ import base64
 import codecs
 import logging
 import os
+import threading
 import time
 from http.client import HTTPConnection
-import requests
+from urllib.parse import urlsplit
 import datetime
+import functools
 import pytz
 import json
 import xml.etree.ElementTree as ET
@@ -14,6 +16,10 @@ from astral.sun import sun
 import humanize
 import locale
 from babel.dates import format_time
+from svg_template import load_template
+from http_client import session as http_session
+from fetch import fetch_all
+from cache_store import cache_store, get_key as get_cache_key
 
 
 def configure_locale():
@@ -49,98 +55,225 @@ def configure_logging():
 
 
 # utilize a template svg as a base for output of values
+def render_svg(template_svg_filename, output_dict):
+    """
+    Returns the `template_svg_filename` SVG with its placeholders
+    replaced by the values from `output_dict`
+    """
+    for output_key in output_dict:
+        logging.debug("update_svg() - %s -> %s", output_key, output_dict[output_key])
+
+    return load_template(template_svg_filename).render(output_dict)
+
+
 def update_svg(template_svg_filename, output_svg_filename, output_dict):
     """
     Update the `template_svg_filename` SVG.
     Replaces keys with values from `output_dict`
-    Writes the output to `output_svg_filename`
+    Writes the output to `output_svg_filename`, and returns it
     """
-    # replace tags with values in SVG
-    output = codecs.open(template_svg_filename, 'r', encoding='utf-8').read()
-
-    for output_key in output_dict:
-        logging.debug("update_svg() - {} -> {}"
-                      .format(output_key, output_dict[output_key]))
-        output = output.replace(output_key, output_dict[output_key])
+    output = render_svg(template_svg_filename, output_dict)
 
     logging.debug("update_svg() - Write to SVG {}".format(output_svg_filename))
 
-    codecs.open(output_svg_filename, 'w', encoding='utf-8').write(output)
+    with codecs.open(output_svg_filename, 'w', encoding='utf-8') as output_file:
+        output_file.write(output)
+
+    return output
+
+
+# How old, in seconds, cached data can be and still be shown when it can't be fetched again
+max_stale = float(os.getenv("CACHE_MAX_STALE", 24 * 60 * 60))
+# How long, in seconds, to wait for stale data to be fetched again before showing it anyway
+stale_deadline = float(os.getenv("CACHE_STALE_DEADLINE", 10))
+
+# Set by a long running process, which fetches stale data again in the background
+background_revalidation = {"enabled": False, "on_revalidated": None}
+revalidating = set()
+revalidating_lock = threading.Lock()
+revalidation = threading.local()
+
+
+def enable_background_revalidation(on_revalidated=None):
+    """
+    Makes stale cached data be returned straight away while it's fetched again on another thread.
+    `on_revalidated` is called, on that thread, once new data has been cached.
+    """
+    background_revalidation["enabled"] = True
+    background_revalidation["on_revalidated"] = on_revalidated
+
+
+def revalidate(refresh):
+    """Calls `refresh` on this thread, letting nested cache lookups know they have to fetch"""
+    previous = getattr(revalidation, "active", False)
+    revalidation.active = True
+    try:
+        return refresh()
+    finally:
+        revalidation.active = previous
+
+
+def revalidate_in_background(name, refresh):
+    with revalidating_lock:
+        if name in revalidating:
+            return
+        revalidating.add(name)
 
+    def run():
+        try:
+            revalidate(refresh)
+            logging.info("Refreshed {} in the background".format(name))
+            if background_revalidation["on_revalidated"] is not None:
+                background_revalidation["on_revalidated"]()
+        except Exception as error:
+            logging.warning("Refreshing {} in the background failed: {}".format(name, error))
+        finally:
+            with revalidating_lock:
+                revalidating.discard(name)
 
-def is_stale(filepath, ttl):
+    threading.Thread(target=run, name="revalidate", daemon=True).start()
+
+
+def get_stale_or_fresh(name, stale_value, stored, refresh):
     """
-    Checks if the specified `filepath` is older than the `ttl` in seconds
-    Returns true if the file doesn't exist.
+    Stale-while-revalidate for cached data which is past its TTL, but no older than CACHE_MAX_STALE.
+    In a long running process `stale_value` is returned straight away and `refresh` is called in the background.
+    Otherwise `refresh` is given CACHE_STALE_DEADLINE seconds, and `stale_value` is returned if it fails or takes longer.
     """
+    if background_revalidation["enabled"]:
+        logging.info("Using the stale {} and refreshing it in the background".format(name))
+        revalidate_in_background(name, refresh)
+        return stale_value
 
-    verdict = True
-    if (os.path.isfile(filepath)):
-        verdict = time.time() - os.path.getmtime(filepath) > ttl
+    result = fetch_all({name: (lambda: revalidate(refresh), stale_deadline)})[name]
+    if result.error is not None:
+        logging.warning("Using the {} from {:.0f} minutes ago".format(name, (time.time() - stored) / 60))
+        return stale_value
+    return result.value
 
-    logging.debug(
-        "is_stale({}) - {}"
-        .format(filepath, str(verdict)))
 
-    return verdict
+def can_serve_stale(cached, ttl):
+    """Whether `cached` data, which is older than its `ttl`, is no more than CACHE_MAX_STALE seconds past it"""
+    return cached is not None and not cached.is_stale(ttl + max_stale) and not getattr(revalidation, "active", False)
 
 
-def get_json_from_url(url, headers, cache_file_name, ttl):
+def fetch_text_from_url(url, headers, key, cached, encoding=None, projection=None):
     """
-    Perform an HTTP GET for a `url` with optional `headers`.
-    Caches the response in `cache_file_name` for `ttl` seconds.
-    Returns the response as JSON
+    Fetches a `url`, revalidating the `cached` response if there is one, and caches the new response,
+    or what `projection` reduces it to.
+    Returns the response as text
     """
-    response_json = False
+    validators = {}
+    if cached and cached.etag:
+        validators["If-None-Match"] = cached.etag
+    if cached and cached.last_modified:
+        validators["If-Modified-Since"] = cached.last_modified
+    response = http_session.get(url, headers=dict(headers, **validators))
+
+    if response.status_code == 304 and validators:
+        logging.info("Not modified, using the cached response.")
+        cache_store.touch_response(key)
+        return cached.body
 
-    if (is_stale(cache_file_name, ttl)):
-        logging.info("Cache file is stale. Fetching from source.")
-        try:
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
-            response_data = response.text
-            response_json = json.loads(response_data)
-            with open(cache_file_name, 'w') as text_file:
-                json.dump(response_json, text_file, indent=4)
-        except Exception as error:
-            logging.error(error)
-            logging.error(response.text)
-            logging.error(response.headers)
-            raise
-    else:
+    try:
+        response.raise_for_status()
+    except Exception as error:
+        logging.error(error)
+        logging.error(response.text)
+        logging.error(response.headers)
+        raise
+
+    if encoding:
+        response.encoding = encoding
+    response_data = response.text
+    if projection:
+        response_data = projection(response_data)
+    cache_store.put_response(key, url, response_data, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+    return response_data
+
+
+def get_text_from_url(url, headers, ttl, encoding=None, projection=None):
+    """
+    Perform an HTTP GET for a `url` with optional `headers`.
+    Caches the response for `ttl` seconds, see cache_store.py.
+    Once it's stale, the cached response is revalidated with its ETag or Last-Modified,
+    and if the server says it hasn't changed it's used for another `ttl` seconds.
+    A stale response is shown while it's fetched again, see `get_stale_or_fresh`.
+    `encoding` overrides the encoding of the response.
+    `projection` is a function which reduces the response text to what the caller needs, which is
+    what's cached and returned instead.
+    Returns the response as text
+    """
+    headers = headers or {}
+    key = get_cache_key("GET", url, headers, getattr(projection, "__qualname__", ""))
+    cached = cache_store.get_response(key)
+    if cached and not cached.is_stale(ttl):
         logging.info("Found in cache.")
-        with open(cache_file_name, 'r') as file:
-            return json.loads(file.read())
-    return response_json
+        return cached.body
 
+    if can_serve_stale(cached, ttl):
+        return get_stale_or_fresh(urlsplit(url).netloc + " response", cached.body, cached.stored,
+                                  lambda: fetch_text_from_url(url, headers, key, cached, encoding, projection))
 
-def get_xml_from_url(url, headers, cache_file_name, ttl):
+    logging.info("Cache is stale. Fetching from source.")
+    return fetch_text_from_url(url, headers, key, cached, encoding, projection)
+
+
+def get_cached_result(name, ttl, fetch):
+    """
+    Returns the result cached under `name` if it's no older than `ttl` seconds, and otherwise
+    caches and returns what `fetch` returns.  A stale result is shown while it's fetched again.
+    """
+    def refresh():
+        value = fetch()
+        cache_store.put_result(name, value)
+        return value
+
+    cached = cache_store.get_result(name)
+    if cached and not cached.is_stale(ttl):
+        logging.info("Found in cache")
+        return cached.value
+
+    if can_serve_stale(cached, ttl):
+        return get_stale_or_fresh(name.split(":")[0], cached.value, cached.stored, refresh)
+
+    logging.debug("Cache is stale, fetching {}".format(name.split(":")[0]))
+    return refresh()
+
+
+def get_json_projection(projection):
+    """A projection of the response text, for `get_text_from_url`, from a projection of the parsed JSON"""
+    @functools.wraps(projection)
+    def project(text):
+        return json.dumps(projection(json.loads(text)), separators=(',', ':'))
+    return project
+
+
+def get_xml_projection(projection):
+    """A projection of the response text, for `get_text_from_url`, from a projection of the parsed XML"""
+    @functools.wraps(projection)
+    def project(text):
+        return ET.tostring(projection(ET.fromstring(text)), encoding='unicode')
+    return project
+
+
+def get_json_from_url(url, headers, ttl, projection=None):
     """
     Perform an HTTP GET for a `url` with optional `headers`.
-    Caches the response in `cache_file_name` for `ttl` seconds.
-    Returns the response as an XML ElementTree object
+    Caches the response for `ttl` seconds, or only what `projection` keeps of the parsed JSON.
+    Returns the response as JSON
     """
-    logging.info(url)
+    return json.loads(get_text_from_url(url, headers, ttl, projection=projection and get_json_projection(projection)))
 
-    if (is_stale(cache_file_name, ttl)):
-        logging.info("Cache file is stale. Fetching from source.")
-        try:
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
-            response_data = response.text
 
-            with open(cache_file_name, 'w') as text_file:
-                text_file.write(response_data)
-        except Exception as error:
-            logging.error(error)
-            logging.error(response.text)
-            logging.error(response.headers)
-            raise
-    else:
-        logging.info("Found in cache.")
-        with open(cache_file_name, 'r') as file:
-            response_data = file.read()
-    response_xml = ET.fromstring(response_data)
+def get_xml_from_url(url, headers, ttl, projection=None):
+    """
+    Perform an HTTP GET for a `url` with optional `headers`.
+    Caches the response for `ttl` seconds, or only what `projection` keeps of the parsed XML.
+    Returns the response as an XML ElementTree object
+    """
+    logging.info(url)
+    response_xml = ET.fromstring(get_text_from_url(url, headers, ttl, projection=projection and get_xml_projection(projection)))
     return response_xml
 
 
@@ -72,16 +72,29 @@ class AccuWeather(BaseWeatherProvider):
             self.location_key, self.accuweather_apikey, "true" if self.units == "metric" else "false", self.language
         )
 
-        response_data = self.get_response_json(url)
-        weather_data = response_data
-
         from datetime import datetime
         current_hour = datetime.now().hour
         
         daytime = 6 <= current_hour < 18
         
         logging.info(f"Current Hour: {current_hour}, Daytime: {daytime}")
-        
+
+        return self.get_weather_from_url(url, {}, (daytime,),
+                                         lambda response_data: self.parse_weather(response_data, daytime),
+                                         projection=self.project_response)
+
+    def project_response(self, response_data):
+        """Only today's temperatures, icons and phrases are used"""
+        today = response_data["DailyForecasts"][0]
+        return {"DailyForecasts": [{
+            "Temperature": today["Temperature"],
+            "Day": {"Icon": today["Day"]["Icon"], "ShortPhrase": today["Day"]["ShortPhrase"]},
+            "Night": {"Icon": today["Night"]["Icon"], "ShortPhrase": today["Night"]["ShortPhrase"]},
+        }]}
+
+    def parse_weather(self, response_data, daytime):
+        weather_data = response_data
+
         period = "Day" if daytime else "Night"
 
         accuweather_icon = weather_data["DailyForecasts"][0][period]["Icon"]
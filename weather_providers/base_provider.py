@@ -1,6 +1,12 @@
 import os
+import bisect
+import hashlib
+import json
+import time
+import xml.etree.ElementTree as ET
 from abc import ABC, abstractmethod
-from utility import get_xml_from_url, get_json_from_url
+from cache_store import cache_store
+from utility import get_xml_from_url, get_json_from_url, get_text_from_url, get_json_projection, get_xml_projection
 import logging
 from astral import LocationInfo
 from astral.sun import sun
@@ -8,6 +14,71 @@ import datetime
 import pytz
 
 
+def parse_time(timestamp):
+    """Seconds since the epoch of an ISO 8601 time such as 2024-01-01T12:00:00Z or 2024-01-01T00:00Z"""
+    return datetime.datetime.fromisoformat(timestamp.replace("Z", "+00:00")).timestamp()
+
+
+def get_current_hour():
+    """Seconds since the epoch of the start of the current hour"""
+    return int(time.time() // 3600 * 3600)
+
+
+class TimeSeries:
+    """
+    A forecast as a sorted list of times, in seconds since the epoch, and a list of values per field,
+    so that values can be looked up by bisecting instead of scanning the whole forecast.
+
+    It's converted once from a provider's response with `from_items`, and cached as the dictionary
+    `to_dict` returns.  A value which an item doesn't have is None.
+    """
+
+    def __init__(self, times, fields):
+        self.times = times
+        self.fields = fields
+
+    @classmethod
+    def from_items(cls, items, get_time, get_fields):
+        """
+        Takes the items of a provider's time series, with functions which return an item's ISO 8601
+        time and a dictionary of the fields that are needed from it.
+        """
+        rows = sorted(((parse_time(get_time(item)), get_fields(item)) for item in items), key=lambda row: row[0])
+        names = set(name for _, values in rows for name in values)
+        return cls([row[0] for row in rows], {name: [values.get(name) for _, values in rows] for name in names})
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["times"], data["fields"])
+
+    def to_dict(self):
+        return {"times": self.times, "fields": self.fields}
+
+    def get_values_at_or_after(self, t):
+        """The fields of the first item at or after `t`, or None if there are none"""
+        index = bisect.bisect_left(self.times, t)
+        if index == len(self.times):
+            return None
+        return {name: values[index] for name, values in self.fields.items()}
+
+    def get_value_at_or_after(self, name, t):
+        """The first value of the `name` field at or after `t`, or None if there are none"""
+        values = self.fields.get(name, [])
+        for index in range(bisect.bisect_left(self.times, t), len(self.times)):
+            if values[index] is not None:
+                return values[index]
+        return None
+
+    def get_min_max(self, name, start, end):
+        """The lowest and highest values of the `name` field from `start` up to, but not including, `end`"""
+        values = self.fields.get(name, [])
+        window = [value for value in values[bisect.bisect_left(self.times, start):bisect.bisect_left(self.times, end)]
+                  if value is not None]
+        if not window:
+            return None, None
+        return min(window), max(window)
+
+
 class BaseWeatherProvider(ABC):
 
     ttl = float(os.getenv("WEATHER_TTL", 1 * 60 * 60))
@@ -57,15 +128,47 @@ class BaseWeatherProvider(ABC):
     def get_response_json(self, url, headers={}):
         """
         Perform an HTTP GET for a `url` with optional `headers`.
-        Caches the response in `cache_file_name` for WEATHER_TTL seconds.
+        Caches the response for WEATHER_TTL seconds.
         Returns the response as JSON
         """
-        return get_json_from_url(url, headers, "cache_weather.json", self.ttl)
+        return get_json_from_url(url, headers, self.ttl)
 
     def get_response_xml(self, url, headers={}):
         """
         Perform an HTTP GET for a `url` with optional `headers`.
-        Caches the response in `cache_file_name` for WEATHER_TTL seconds.
+        Caches the response for WEATHER_TTL seconds.
         Returns the response as an XML ElementTree
         """
-        return get_xml_from_url(url, headers, "cache_weather.xml", self.ttl)
+        return get_xml_from_url(url, headers, self.ttl)
+
+    def get_weather_from_url(self, url, headers, parameters, parse, projection=None, response_format="json"):
+        """
+        Returns `parse(response)`, the weather dictionary for the response of `url`, parsed as "json" or "xml",
+        or left as "text" for `parse` to make sense of.
+        The response is cached for WEATHER_TTL seconds, with only what `projection` keeps of it.
+        The weather dictionary is cached by a hash of the response, the units and `parameters`,
+        which is everything else `parse` depends on, such as whether it's daytime, so a cached
+        response isn't parsed again until it or one of those changes.
+        """
+        if response_format == "xml":
+            projection = projection and get_xml_projection(projection)
+        elif response_format == "json":
+            projection = projection and get_json_projection(projection)
+        text = get_text_from_url(url, headers, self.ttl, projection=projection)
+
+        key = hashlib.sha1("{}\0{!r}\0{!r}".format(text, getattr(self, "units", None), parameters).encode('utf-8'))
+        name = "weather:{}:{}".format(type(self).__name__, key.hexdigest())
+        cached = cache_store.get_result(name)
+        if cached is not None:
+            logging.debug("get_weather_from_url() - {}".format(cached.value))
+            return cached.value
+
+        if response_format == "xml":
+            response = ET.fromstring(text)
+        elif response_format == "json":
+            response = json.loads(text)
+        else:
+            response = text
+        weather = parse(response)
+        cache_store.put_result(name, weather)
+        return weather
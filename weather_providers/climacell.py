@@ -102,11 +102,20 @@ class Climacell(BaseWeatherProvider):
                + "?location={}&units={}&fields=temperatureMin&fields=temperatureMax&fields=weatherCode&timesteps=1d&apikey={}"
                .format(location_latlong, self.units, self.climacell_apikey))
 
-        response_data = self.get_response_json(url)
+        daytime = self.is_daytime(self.location_lat, self.location_long)
+        return self.get_weather_from_url(url, {}, (daytime,),
+                                         lambda response_data: self.parse_weather(response_data, daytime),
+                                         projection=self.project_response)
+
+    def project_response(self, response_data):
+        """Only the first day is used"""
+        values = response_data["data"]['timelines'][0]['intervals'][0]['values']
+        return {"data": {"timelines": [{"intervals": [{"values": values}]}]}}
+
+    def parse_weather(self, response_data, daytime):
         weather_data = response_data["data"]['timelines'][0]['intervals'][0]['values']
         logging.debug("get_weather() - {}".format(weather_data))
 
-        daytime = self.is_daytime(self.location_lat, self.location_long)
         # { "temperatureMin": "2.0", "temperatureMax": "15.1", "icon": "mostly_cloudy", "description": "Cloudy with light breezes" }
         weather = {}
         weather["temperatureMin"] = weather_data["temperatureMin"]
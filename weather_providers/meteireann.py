@@ -1,5 +1,8 @@
+import io
+import json
 import logging
 import datetime
+import xml.etree.ElementTree as ET
 from datetime import timedelta
 from weather_providers.base_provider import BaseWeatherProvider
 
@@ -163,16 +166,50 @@ class MetEireann(BaseWeatherProvider):
         url = ("http://openaccess.pf.api.met.ie/metno-wdb2ts/locationforecast?lat={};long={}"
                .format(self.location_lat, self.location_long))
 
-        root = self.get_response_xml(url)
-
+        daytime = self.is_daytime(self.location_lat, self.location_long)
+        return self.get_weather_from_url(url, {}, (self.hour_offset_from_now(0), daytime),
+                                         lambda text: self.parse_weather(json.loads(text), daytime),
+                                         projection=self.index_forecast, response_format="text")
+
+    def index_forecast(self, text):
+        """
+        Reads the forecast document in a single pass, and returns the temperatures and symbols of the
+        next 48 hours, enough for a day even once the cached response is stale, by the hour they're from:
+        {"temperature": {"2024-01-01T10:00:00Z": 8.2, ...}, "symbol": {"2024-01-01T10:00:00Z": 3, ...}}
+        Everything else is dropped as it's read, and the rest of the document isn't read at all.
+        """
+        first_hour = self.hour_offset_from_now(-1)
+        last_hour = self.hour_offset_from_now(48)
+        # The times are in order, give or take the length of an interval, so nothing after this is needed
+        stop_hour = self.hour_offset_from_now(60)
+        forecast = {"temperature": {}, "symbol": {}}
+
+        for _, element in ET.iterparse(io.BytesIO(text.encode('utf-8'))):
+            if element.tag != "time":
+                continue
+            time_from = element.get("from", "")
+            if time_from > stop_hour:
+                break
+            if first_hour <= time_from <= last_hour:
+                # Where a time has more than one, the last one in the document is used, as before
+                for temperature in element.iterfind("location/temperature"):
+                    forecast["temperature"][time_from] = float(temperature.get("value"))
+                for symbol in element.iterfind("location/symbol"):
+                    forecast["symbol"][time_from] = int(symbol.get("number"))
+            # Nothing of a time is needed once it's been read
+            element.clear()
+
+        return json.dumps(forecast, separators=(',', ':'))
+
+    def parse_weather(self, forecast, daytime):
         # the document contains the next day's forecast, in 24 hour-offset datapoints (as
         # well as longer term forecasts, but we only want the next day).
 	    # scan across the next 24 hours looking for high and low temperatures
         temps = []
         for h in range(0, 23):
             hour_string = self.hour_offset_from_now(h)
-            for t in root.findall("./product/time[@from='%s']/location/temperature" % (hour_string)):
-                temps.append(float(t.get("value")))
+            if hour_string in forecast["temperature"]:
+                temps.append(forecast["temperature"][hour_string])
 
         temps.sort()
         temperatureMin = temps[0]
@@ -181,11 +218,8 @@ class MetEireann(BaseWeatherProvider):
         # unfortunately, there's no daily summary field in the document; instead,
 	    # get the symbol for just under 1 hour from now (so it's a very near-term
         # forecast!).  TODO: maybe more than 1 hour would be better?
-        hour_string = self.hour_offset_from_now(1)
-        for sym in root.findall("./product/time[@from='%s']/location/symbol" % (hour_string)):
-            weather_code = int(sym.get("number"))
+        weather_code = forecast["symbol"][self.hour_offset_from_now(1)]
 
-        daytime = self.is_daytime(self.location_lat, self.location_long)
         weather = {}
         weather["temperatureMin"] = temperatureMin if self.units == "metric" else self.c_to_f(temperatureMin)
         weather["temperatureMax"] = temperatureMax if self.units == "metric" else self.c_to_f(temperatureMax)
@@ -193,4 +227,3 @@ class MetEireann(BaseWeatherProvider):
         weather["description"] = self.get_description_from_met_eireann_weathercode(weather_code)
         logging.debug(weather)
         return weather
-
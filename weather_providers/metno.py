@@ -1,5 +1,5 @@
 import logging
-from weather_providers.base_provider import BaseWeatherProvider
+from weather_providers.base_provider import BaseWeatherProvider, TimeSeries, get_current_hour
 
 
 class MetNo(BaseWeatherProvider):
@@ -128,19 +128,35 @@ class MetNo(BaseWeatherProvider):
 
         headers = {"User-Agent": self.metno_self_id}
 
-        response_data = self.get_response_json(url, headers=headers)
-        logging.debug(response_data)
-        weather_data = response_data["properties"]["timeseries"][0]["data"]
+        hour = get_current_hour()
+        daytime = self.is_daytime(self.location_lat, self.location_long)
+        return self.get_weather_from_url(url, headers, (hour, daytime),
+                                         lambda response_data: self.parse_weather(response_data, hour, daytime),
+                                         projection=self.project_response)
+
+    def project_response(self, response_data):
+        """The summary of the next 6 hours of each time which has one, as a `TimeSeries`"""
+        def get_fields(item):
+            next_6_hours = item["data"]["next_6_hours"]
+            return {"symbol_code": next_6_hours["summary"]["symbol_code"],
+                    "air_temperature_min": next_6_hours["details"]["air_temperature_min"],
+                    "air_temperature_max": next_6_hours["details"]["air_temperature_max"]}
+
+        items = [item for item in response_data["properties"]["timeseries"] if "next_6_hours" in item["data"]]
+        return TimeSeries.from_items(items, lambda item: item["time"], get_fields).to_dict()
+
+    def parse_weather(self, response_data, hour, daytime):
+        # The forecast for the next 6 hours from the current hour
+        weather_data = TimeSeries.from_dict(response_data).get_values_at_or_after(hour)
         logging.debug("get_weather() - {}".format(weather_data))
 
         # Remove the _night or _day suffix from Met.no symbol code, so we can do some mapping.
-        weather_code = weather_data["next_6_hours"]["summary"]["symbol_code"].replace("_day", "").replace("_night", "")
-        daytime = self.is_daytime(self.location_lat, self.location_long)
+        weather_code = weather_data["symbol_code"].replace("_day", "").replace("_night", "")
 
         # { "temperatureMin": "2.0", "temperatureMax": "15.1", "icon": "mostly_cloudy", "description": "Cloudy with light breezes" }
         weather = {}
-        weather["temperatureMin"] = weather_data["next_6_hours"]["details"]["air_temperature_min"]
-        weather["temperatureMax"] = weather_data["next_6_hours"]["details"]["air_temperature_max"]
+        weather["temperatureMin"] = weather_data["air_temperature_min"]
+        weather["temperatureMax"] = weather_data["air_temperature_max"]
         weather["icon"] = self.get_icon_from_metno_weathercode(weather_code, daytime)
         weather["description"] = self.get_description_from_metno_weathercode(weather_code)
         logging.debug(weather)
@@ -1,6 +1,6 @@
 import logging
 import datetime
-from weather_providers.base_provider import BaseWeatherProvider
+from weather_providers.base_provider import BaseWeatherProvider, TimeSeries, parse_time
 
 
 class MetOffice(BaseWeatherProvider):
@@ -108,18 +108,26 @@ class MetOffice(BaseWeatherProvider):
             "accept": "application/json"
         }
 
-        response_data = self.get_response_json(url, headers=headers)
-        logging.debug(response_data)
-
         datahub_time = datetime.datetime.now().strftime("%Y-%m-%dT00:00Z")  # midnight of the current day
+        daytime = self.is_daytime(self.location_lat, self.location_long)
+
+        return self.get_weather_from_url(url, headers, (datahub_time, daytime),
+                                         lambda response_data: self.parse_weather(response_data, datahub_time, daytime),
+                                         projection=self.project_response)
 
-        for day_forecast in response_data["features"][0]["properties"]["timeSeries"]:
-            if day_forecast["time"] == datahub_time:
-                weather_data = day_forecast
+    def project_response(self, response_data):
+        """The temperatures and the weather codes of each day, as a `TimeSeries`"""
+        fields = ("daySignificantWeatherCode", "nightSignificantWeatherCode",
+                  "nightMinScreenTemperature", "dayMaxScreenTemperature")
+        return TimeSeries.from_items(response_data["features"][0]["properties"]["timeSeries"],
+                                     lambda day_forecast: day_forecast["time"],
+                                     lambda day_forecast: {field: day_forecast.get(field) for field in fields}).to_dict()
+
+    def parse_weather(self, response_data, datahub_time, daytime):
+        weather_data = TimeSeries.from_dict(response_data).get_values_at_or_after(parse_time(datahub_time))
 
         logging.debug("get_weather() - {}".format(weather_data))
 
-        daytime = self.is_daytime(self.location_lat, self.location_long)
         weather_code = weather_data["daySignificantWeatherCode"] if daytime else weather_data["nightSignificantWeatherCode"]
         # { "temperatureMin": "2.0", "temperatureMax": "15.1", "icon": "mostly_cloudy", "description": "Cloudy with light breezes" }
         weather = {}
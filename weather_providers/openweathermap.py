@@ -84,7 +84,18 @@ class OpenWeatherMap(BaseWeatherProvider):
 
         url = ("https://api.openweathermap.org/data/3.0/onecall?lat={}&lon={}&exclude=current,minutely,hourly&units={}&appid={}"
                .format(self.location_lat, self.location_long, self.units, self.openweathermap_apikey))
-        response_data = self.get_response_json(url)
+        daytime = self.is_daytime(self.location_lat, self.location_long)
+        return self.get_weather_from_url(url, {}, (daytime,),
+                                         lambda response_data: self.parse_weather(response_data, daytime),
+                                         projection=self.project_response)
+
+    def project_response(self, response_data):
+        """Only today's temperatures and weather are used"""
+        today = response_data["daily"][0]
+        return {"daily": [{"temp": {"min": today["temp"]["min"], "max": today["temp"]["max"]},
+                           "weather": today["weather"][:1]}]}
+
+    def parse_weather(self, response_data, daytime):
         logging.debug(response_data)
         weather_data = response_data["daily"][0]
         logging.debug("get_weather() - {}".format(weather_data))
@@ -93,7 +104,7 @@ class OpenWeatherMap(BaseWeatherProvider):
         weather = {}
         weather["temperatureMin"] = weather_data["temp"]["min"]
         weather["temperatureMax"] = weather_data["temp"]["max"]
-        weather["icon"] = self.get_icon_from_openweathermap_weathercode(weather_data["weather"][0]["id"], self.is_daytime(self.location_lat, self.location_long))
+        weather["icon"] = self.get_icon_from_openweathermap_weathercode(weather_data["weather"][0]["id"], daytime)
         weather["description"] = weather_data["weather"][0]["description"].title()
         logging.debug(weather)
         return weather
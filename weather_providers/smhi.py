@@ -1,5 +1,5 @@
 import logging
-from weather_providers.base_provider import BaseWeatherProvider
+from weather_providers.base_provider import BaseWeatherProvider, TimeSeries, get_current_hour
 
 
 class SMHI(BaseWeatherProvider):
@@ -105,32 +105,33 @@ class SMHI(BaseWeatherProvider):
 
         headers = {"User-Agent": self.smhi_self_id}
 
-        response_data = self.get_response_json(url, headers=headers)
-        logging.debug(response_data)
-        weather_data = response_data["timeSeries"]
-        logging.debug("get_weather() - {}".format(weather_data))
+        hour = get_current_hour()
+        daytime = self.is_daytime(self.location_lat, self.location_long)
+        return self.get_weather_from_url(url, headers, (hour, daytime),
+                                         lambda response_data: self.parse_weather(response_data, hour, daytime),
+                                         projection=self.project_response)
 
-        # Get the weather code of the first item.
-        for data in weather_data[0]["parameters"]:
-            if data["name"] == "Wsymb2":
-                weather_code = data["values"][0]
+    def project_response(self, response_data):
+        """The weather symbol and the temperature of each hour, as a `TimeSeries`"""
+        def get_fields(item):
+            return {param["name"]: param["values"][0] for param in item["parameters"] if param["name"] in ("Wsymb2", "t")}
 
-        daytime = self.is_daytime(self.location_lat, self.location_long)
+        return TimeSeries.from_items(response_data["timeSeries"], lambda item: item["validTime"], get_fields).to_dict()
+
+    def parse_weather(self, response_data, hour, daytime):
+        time_series = TimeSeries.from_dict(response_data)
+
+        # Get the weather code of the current hour.
+        weather_code = time_series.get_value_at_or_after("Wsymb2", hour)
 
         # { "temperatureMin": "2.0", "temperatureMax": "15.1", "icon": "mostly_cloudy", "description": "Cloudy with light breezes" }
         # No Min or Max here. We just get the estimated temperature for the hour.
         # Since we get the forecast for several hours and days, get the min/max for the next 12 hours?
         weather = {}
-        temp_list = []
-
-        for item in range(0, 12):
-            for param in weather_data[item]['parameters']:
-                if param['name'] == 't':
-                    temp = param['values'][0]
-                    temp_list.append(temp)
+        temperature_min, temperature_max = time_series.get_min_max("t", hour, hour + 12 * 60 * 60)
 
-        weather["temperatureMin"] = min(temp_list)
-        weather["temperatureMax"] = max(temp_list)
+        weather["temperatureMin"] = temperature_min
+        weather["temperatureMax"] = temperature_max
         weather["icon"] = self.get_icon_from_smhi_weathercode(weather_code, daytime)
         weather["description"] = self.get_description_from_smhi_weathercode(weather_code)
         logging.debug(weather)
@@ -42,16 +42,8 @@ class VisualCrossing(BaseWeatherProvider):
         url = ("https://weather.visualcrossing.com/VisualCrossingWebServices/rest/services/timeline/{},{}?unitGroup={}&key={}&include=fcst,alerts&lang={}"
                .format(self.location_lat, self.location_long, "us" if self.units != "metric" else "metric", self.visualcrossing_apikey, self.language))
 
-        response_data = self.get_response_json(url)
-
         current_day = datetime.datetime.now().strftime("%Y-%m-%d")
 
-        for day_forecast in response_data["days"]:
-            if day_forecast["datetime"] == current_day:
-                weather_data = day_forecast
-
-        logging.debug("get_weather() - {}".format(weather_data))
-
         current_hour_int = datetime.datetime.now().hour
         
         # 6時から18時までを「昼」とする
@@ -62,6 +54,22 @@ class VisualCrossing(BaseWeatherProvider):
 
 #        daytime = self.is_daytime(self.location_lat, self.location_long)
 
+        return self.get_weather_from_url(url, {}, (current_day, daytime),
+                                         lambda response_data: self.parse_weather(response_data, current_day, daytime),
+                                         projection=self.project_response)
+
+    def project_response(self, response_data):
+        """Only the date, the temperatures, the icon and the conditions of each day are used"""
+        fields = ("datetime", "tempmin", "tempmax", "icon", "conditions")
+        return {"days": [{field: day_forecast.get(field) for field in fields} for day_forecast in response_data["days"]]}
+
+    def parse_weather(self, response_data, current_day, daytime):
+        for day_forecast in response_data["days"]:
+            if day_forecast["datetime"] == current_day:
+                weather_data = day_forecast
+
+        logging.debug("get_weather() - {}".format(weather_data))
+
         # { "temperatureMin": "2.0", "temperatureMax": "15.1", "icon": "mostly_cloudy", "description": "Cloudy with light breezes" }
         weather = {}
         weather["temperatureMin"] = weather_data["tempmin"]
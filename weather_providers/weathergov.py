@@ -60,7 +60,7 @@ class WeatherGov(BaseWeatherProvider):
     def get_forecast_url(self, lat, long):
         logging.info("Using lat long to figure out the Weather.gov forecast URL")
         lookup_url = "https://api.weather.gov/points/{},{}".format(lat, long)
-        lookup_data = get_json_from_url(lookup_url, {'User-Agent':'({0})'.format(self.weathergov_self_id)}, "cache_weather_gov_lookup.json", 3600)
+        lookup_data = get_json_from_url(lookup_url, {'User-Agent':'({0})'.format(self.weathergov_self_id)}, 3600)
         logging.debug(lookup_data)
         return lookup_data["properties"]["forecast"]
 
@@ -72,12 +72,21 @@ class WeatherGov(BaseWeatherProvider):
         # https://api.weather.gov/gridpoints/TOP/31,80/forecast"
         logging.info(forecast_url)
 
-        response_data = self.get_response_json(forecast_url, {'User-Agent':'({0})'.format(self.weathergov_self_id)})
+        daytime = self.is_daytime(self.location_lat, self.location_long)
+        return self.get_weather_from_url(forecast_url, {'User-Agent':'({0})'.format(self.weathergov_self_id)}, (daytime,),
+                                         lambda response_data: self.parse_weather(response_data, daytime),
+                                         projection=self.project_response)
+
+    def project_response(self, response_data):
+        """Only the temperature, the forecast and the icon of the first two periods are used"""
+        fields = ("temperature", "shortForecast", "icon")
+        return {"properties": {"periods": [{field: period[field] for field in fields}
+                                           for period in response_data["properties"]["periods"][:2]]}}
+
+    def parse_weather(self, response_data, daytime):
         weather_data = response_data
         logging.debug("get_weather() - {}".format(weather_data))
 
-        daytime = self.is_daytime(self.location_lat, self.location_long)
-
         # Weather.gov doesn't provide a min max temperature.  It uses the current and upcoming temperatures as min max instead.  
         current_forecast = weather_data["properties"]["periods"][0]
         upcoming_forecast = weather_data["properties"]["periods"][1]
@@ -1,46 +1,76 @@
-import requests
+"""
+Shows the latest XKCD comic.
+
+The comic's number is looked up in info.0.json, which is cached for an hour and revalidated with its
+ETag, and the image is only downloaded when the number changes.  Each comic is kept in cache.db
+already scaled, dithered and packed for the screen, so most runs only send that frame to the screen.
+"""
 import logging
-import os
-from PIL import Image
-from utility import is_stale, configure_logging
 import sys
+import zlib
+from io import BytesIO
+from PIL import Image, ImageOps
+import display
+import framebuffer
+from utility import configure_logging, get_cached_result, get_json_from_url
+from http_client import session
+from pipeline import get_screen_size
+
+info_url = "https://xkcd.com/info.0.json"
+info_ttl = 3600
+
+
+def project_comic(comic):
+    """Only the number and the image of the comic are used"""
+    return {"num": comic["num"], "img": comic["img"]}
 
-configure_logging()
 
-def xkcd_get_img():
-    xkcd_file_name = "xkcd-comic-strip.png"
-    if not is_stale(xkcd_file_name, 3600):
-        logging.info("xkcd-comic-strip.png is still fresh. Skipping download.")
-        sys.exit(1)
+def get_screen():
+    """The size of the screen and whether its bits are inverted, which the packed frame depends on"""
+    width, height = get_screen_size()
+    return width, height, framebuffer.is_inverted(display.waveshare_epd75_version)
 
-    logging.info("Downloading xkcd-json")
-    response = requests.get("https://xkcd.com/info.0.json")
-    result = response.json()
 
+def fit_to_screen(im, width, height):
+    """Scales the comic to fit the screen without distorting it, centred on white"""
+    im = ImageOps.contain(im.convert('L'), (width, height), Image.LANCZOS)
+    screen = Image.new('L', (width, height), 255)
+    screen.paste(im, ((width - im.width) // 2, (height - im.height) // 2))
+    return screen
+
+
+def get_comic_frame(comic, screen):
+    """Downloads a comic and returns it packed for the screen, compressed"""
     logging.info("Downloading xkcd_img")
-    logging.info(result["img"])
+    logging.info(comic["img"])
+    image_response = session.get(comic["img"])
+    image_response.raise_for_status()
+
+    im = Image.open(BytesIO(image_response.content))
+    logging.debug("PNG size: {}".format(im.size))
 
-    path = os.path.dirname(os.path.realpath(__file__))
-    filename = path + '/' + os.path.basename(xkcd_file_name)
-    if os.path.exists(filename):
-        os.remove(filename)
-    image_response = requests.get(result["img"])
-    open(filename, 'wb').write(image_response.content)
+    width, height, inverted = screen
+    return zlib.compress(framebuffer.pack_image(fit_to_screen(im, width, height), width, height, inverted))
 
-    logging.info("Resizing the image to fit the screen. Disortions can happen.")
 
-    im = Image.open(filename)
-    logging.debug("PNG size: ",im.size)
+def xkcd_get_frame():
+    """The packed frame of the latest comic"""
+    comic = get_json_from_url(info_url, {}, info_ttl, projection=project_comic)
+    screen = get_screen()
+    logging.info("Latest xkcd is {}".format(comic["num"]))
 
-    width = int(os.environ.get('WAVESHARE_WIDTH'))
-    height = int(os.environ.get('WAVESHARE_HEIGHT'))
-    im = im.resize((width,height))
-    im.save(filename, "PNG")
+    # A comic never changes, so its frame is kept until it's evicted
+    frame = get_cached_result("xkcd:{}:{}x{}:{}".format(comic["num"], *screen), float("inf"),
+                              lambda: get_comic_frame(comic, screen))
+    return zlib.decompress(frame)
 
 
 def main():
-    xkcd_get_img()
+    frame = xkcd_get_frame()
+    display.display_frame(frame)
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    configure_logging()
+    sys.exit(main())